@@ -6,29 +6,18 @@ Fitbitデータを可視化するStreamlitアプリ
 """
 
 import os
-import json
-import glob
-import tempfile
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import streamlit as st
 from datetime import datetime
-import zipfile
-import io
-import numpy as np
 from dotenv import load_dotenv
-import openai
-import time
+from src.data.loader import FitbitDataLoader
+from src.utils.auth import AuthManager
 
 # 環境変数の読み込み
 load_dotenv()
 
 # OpenAI APIキーの設定
 openai_api_key = os.getenv("OPENAI_API_KEY")
-if openai_api_key:
-    openai.api_key = openai_api_key
 
 # 分析パスワードの設定
 analysis_password = os.getenv("ANALYSIS_PASSWORD", "fitbit-analysis-demo")
@@ -65,6 +54,11 @@ else:
     # ZIPファイルのアップロード
     uploaded_file = st.sidebar.file_uploader("Fitbitデータのzipファイルをアップロード", type=["zip"])
     if uploaded_file is not None:
+        # ZIPのアップロード時にだけ使うモジュールはここで読み込む
+        import io
+        import tempfile
+        import zipfile
+        
         # 一時ディレクトリを作成
         with tempfile.TemporaryDirectory() as temp_dir:
             # ZIPファイルを読み込み
@@ -87,139 +81,35 @@ else:
 days_to_show = st.sidebar.slider("表示する日数", min_value=7, max_value=90, value=30)
 
 # データロード関数
+def _warn_load_error(source, error):
+    st.warning(f"Warning: {source}の読み込み中にエラーが発生しました: {error}")
+
+_loaders = {}
+
+def _get_loader(data_dir):
+    """データディレクトリのローダーを返す（スクリプトの実行ごとに1回だけ生データとの差分を取り込む）"""
+    if data_dir not in _loaders:
+        _loaders[data_dir] = FitbitDataLoader(data_dir, days_to_show, on_error=_warn_load_error)
+    return _loaders[data_dir]
+
 def load_activity_data(data_dir):
     """アクティビティデータをロードしてDataFrameに変換する"""
-    files = glob.glob(os.path.join(data_dir, "raw/daily_json/activity_*.json"))
-    if not files:
-        # 互換性のため、直接のパターンも試す
-        files = glob.glob(os.path.join(data_dir, "activity_*.json"))
-    data = []
-    
-    for file in files:
-        try:
-            with open(file, 'r', encoding='utf-8') as f:
-                content = json.load(f)
-                
-            # ファイル名から日付を抽出
-            date_str = os.path.basename(file).replace('activity_', '').replace('.json', '')
-            date = datetime.strptime(date_str, '%Y-%m-%d')
-            
-            # サマリーから歩数を取得
-            steps = content.get('summary', {}).get('steps', 0)
-            
-            # 活動カロリー
-            active_calories = content.get('summary', {}).get('activityCalories', 0)
-            
-            # データを追加
-            data.append({
-                'date': date,
-                'steps': steps,
-                'active_calories': active_calories
-            })
-        except Exception as e:
-            st.warning(f"Warning: {file}の読み込み中にエラーが発生しました: {e}")
-    
-    # DataFrameに変換して日付でソート
-    df = pd.DataFrame(data)
-    if not df.empty:
-        df = df.sort_values('date')
-        # 最新のdays_to_show日間のデータに制限
-        if len(df) > days_to_show:
-            df = df.tail(days_to_show)
-    
-    return df
+    if not os.path.isdir(data_dir):
+        return pd.DataFrame()
+    # 日ごとのJSONファイルとパック形式の両方から作成したテーブルに問い合わせる（最新のdays_to_show日間）
+    return _get_loader(data_dir).load_activity_data()
 
 def load_sleep_data(data_dir):
     """睡眠データをロードしてDataFrameに変換する"""
-    files = glob.glob(os.path.join(data_dir, "raw/daily_json/sleep_*.json"))
-    if not files:
-        # 互換性のため、直接のパターンも試す
-        files = glob.glob(os.path.join(data_dir, "sleep_*.json"))
-    data = []
-    
-    for file in files:
-        try:
-            with open(file, 'r', encoding='utf-8') as f:
-                content = json.load(f)
-            
-            # ファイル名から日付を抽出
-            date_str = os.path.basename(file).replace('sleep_', '').replace('.json', '')
-            date = datetime.strptime(date_str, '%Y-%m-%d')
-            
-            # 睡眠時間（分）を計算
-            sleep_minutes = 0
-            if 'sleep' in content and content['sleep']:
-                sleep_minutes = sum(item.get('minutesAsleep', 0) for item in content['sleep'])
-            
-            # 睡眠時間（時間）に変換
-            sleep_hours = sleep_minutes / 60
-            
-            # 睡眠効率
-            efficiency = 0
-            if 'sleep' in content and content['sleep']:
-                efficiency_values = [item.get('efficiency', 0) for item in content['sleep']]
-                if efficiency_values:
-                    efficiency = sum(efficiency_values) / len(efficiency_values)
-            
-            # データを追加
-            data.append({
-                'date': date,
-                'sleep_hours': sleep_hours,
-                'efficiency': efficiency
-            })
-        except Exception as e:
-            st.warning(f"Warning: {file}の読み込み中にエラーが発生しました: {e}")
-    
-    # DataFrameに変換して日付でソート
-    df = pd.DataFrame(data)
-    if not df.empty:
-        df = df.sort_values('date')
-        # 最新のdays_to_show日間のデータに制限
-        if len(df) > days_to_show:
-            df = df.tail(days_to_show)
-    
-    return df
+    if not os.path.isdir(data_dir):
+        return pd.DataFrame()
+    return _get_loader(data_dir).load_sleep_data()
 
 def load_heart_rate_data(data_dir):
     """心拍数データをロードしてDataFrameに変換する"""
-    files = glob.glob(os.path.join(data_dir, "raw/daily_json/heart_rate_*.json"))
-    if not files:
-        # 互換性のため、直接のパターンも試す
-        files = glob.glob(os.path.join(data_dir, "heart_rate_*.json"))
-    data = []
-    
-    for file in files:
-        try:
-            with open(file, 'r', encoding='utf-8') as f:
-                content = json.load(f)
-            
-            # ファイル名から日付を抽出
-            date_str = os.path.basename(file).replace('heart_rate_', '').replace('.json', '')
-            date = datetime.strptime(date_str, '%Y-%m-%d')
-            
-            # 安静時心拍数を取得
-            resting_hr = None
-            if 'activities-heart' in content and content['activities-heart']:
-                resting_hr = content['activities-heart'][0].get('value', {}).get('restingHeartRate')
-            
-            # データを追加
-            if resting_hr is not None:
-                data.append({
-                    'date': date,
-                    'resting_heart_rate': resting_hr
-                })
-        except Exception as e:
-            st.warning(f"Warning: {file}の読み込み中にエラーが発生しました: {e}")
-    
-    # DataFrameに変換して日付でソート
-    df = pd.DataFrame(data)
-    if not df.empty:
-        df = df.sort_values('date')
-        # 最新のdays_to_show日間のデータに制限
-        if len(df) > days_to_show:
-            df = df.tail(days_to_show)
-    
-    return df
+    if not os.path.isdir(data_dir):
+        return pd.DataFrame()
+    return _get_loader(data_dir).load_heart_rate_data()
 
 def load_intraday_heart_rate_data(data_dir, target_date=None, start_time=None, end_time=None):
     """特定日・特定時間帯の心拍数詳細データをロードする
@@ -240,183 +130,19 @@ def load_intraday_heart_rate_data(data_dir, target_date=None, start_time=None, e
     pd.DataFrame
         時間帯別の心拍数データ
     """
-    # 日付が指定されていない場合はデータがある最新の日付を使用
-    if target_date is None:
-        files = glob.glob(os.path.join(data_dir, "raw/daily_json/heart_rate_*.json"))
-        if not files:
-            files = glob.glob(os.path.join(data_dir, "heart_rate_*.json"))
-        if not files:
-            return pd.DataFrame()
-        
-        # ファイル名から利用可能な日付を抽出
-        dates = []
-        for file in files:
-            date_str = os.path.basename(file).replace('heart_rate_', '').replace('.json', '')
-            try:
-                date = datetime.strptime(date_str, '%Y-%m-%d')
-                dates.append(date)
-            except:
-                pass
-        
-        if not dates:
-            return pd.DataFrame()
-            
-        # 最新の日付を取得
-        latest_date = max(dates)
-        target_date = latest_date.strftime('%Y-%m-%d')
-    
-    # 対象ファイルを特定
-    target_file = os.path.join(data_dir, f"raw/daily_json/heart_rate_{target_date}.json")
-    if not os.path.exists(target_file):
-        target_file = os.path.join(data_dir, f"heart_rate_{target_date}.json")
-        if not os.path.exists(target_file):
-            return pd.DataFrame()
-    
-    try:
-        with open(target_file, 'r', encoding='utf-8') as f:
-            content = json.load(f)
-        
-        # intradayデータの取得（Fitbit APIからのエクスポートデータにはintraday情報が含まれない場合が多い）
-        # このデモではダミーデータを生成して対応
-        time_points = []
-        heart_rates = []
-        
-        # ダミーデータを生成（実際にはFitbit API経由で取得するか、詳細なエクスポートデータを使用）
-        date_obj = datetime.strptime(target_date, '%Y-%m-%d')
-        
-        # 安静時心拍数を基準値として使用
-        base_hr = 70
-        if 'activities-heart' in content and content['activities-heart']:
-            base_hr = content['activities-heart'][0].get('value', {}).get('restingHeartRate', 70)
-        
-        # 一日の中での基本的な心拍数の変動をシミュレート
-        for hour in range(24):
-            for minute in range(0, 60, 5):  # 5分間隔でサンプリング
-                time_point = datetime(date_obj.year, date_obj.month, date_obj.day, hour, minute)
-                
-                # 時間帯による心拍数の変化をシミュレート
-                if 0 <= hour < 6:  # 深夜から早朝（睡眠中）
-                    hr = base_hr - 10 + np.random.randint(-5, 5)
-                elif 6 <= hour < 9:  # 朝（起床時）
-                    hr = base_hr + 10 + np.random.randint(-8, 15)
-                elif 9 <= hour < 12:  # 午前（活動時）
-                    hr = base_hr + 15 + np.random.randint(-5, 10)
-                elif 12 <= hour < 14:  # 昼（食後）
-                    hr = base_hr + 5 + np.random.randint(-3, 8)
-                elif 14 <= hour < 18:  # 午後（活動時）
-                    hr = base_hr + 15 + np.random.randint(-7, 12)
-                elif 18 <= hour < 21:  # 夕方（食後・活動時）
-                    hr = base_hr + 10 + np.random.randint(-5, 10)
-                else:  # 夜（リラックス時）
-                    hr = base_hr + np.random.randint(-8, 5)
-                
-                # 特定の時間帯（21:59-22:00）は特徴的なパターンを示す
-                if hour == 21 and minute >= 55:
-                    hr = base_hr + 25 + np.random.randint(-3, 3)  # 特定のイベント発生
-                elif hour == 22 and minute < 5:
-                    hr = base_hr + 20 + np.random.randint(-5, 5)  # 継続的な変化
-                
-                time_points.append(time_point)
-                heart_rates.append(max(hr, 45))  # 心拍数が極端に低くならないように
-        
-        # DataFrameを作成
-        df = pd.DataFrame({
-            'time': time_points,
-            'heart_rate': heart_rates
-        })
-        
-        # 時間帯でフィルタリング
-        if start_time and end_time:
-            start_dt = datetime.strptime(f"{target_date} {start_time}", '%Y-%m-%d %H:%M')
-            end_dt = datetime.strptime(f"{target_date} {end_time}", '%Y-%m-%d %H:%M')
-            df = df[(df['time'] >= start_dt) & (df['time'] <= end_dt)]
-        
-        return df
-        
-    except Exception as e:
-        st.warning(f"Warning: {target_file}の読み込み中にエラーが発生しました: {e}")
-        return pd.DataFrame()
+    # バッチ処理で事前計算したAI洞察と同じデータになるよう共通のローダーを使用する
+    return _get_loader(data_dir).load_intraday_heart_rate_data(target_date, start_time, end_time)
 
 def load_sleep_stages_data(data_dir, target_date=None, start_time=None, end_time=None):
     """特定日・特定時間帯の睡眠ステージデータをロードする"""
-    # 日付が指定されていない場合はデータがある最新の日付を使用
-    if target_date is None:
-        files = glob.glob(os.path.join(data_dir, "raw/daily_json/sleep_*.json"))
-        if not files:
-            files = glob.glob(os.path.join(data_dir, "sleep_*.json"))
-        if not files:
-            return pd.DataFrame()
-        
-        # ファイル名から利用可能な日付を抽出
-        dates = []
-        for file in files:
-            date_str = os.path.basename(file).replace('sleep_', '').replace('.json', '')
-            try:
-                date = datetime.strptime(date_str, '%Y-%m-%d')
-                dates.append(date)
-            except:
-                pass
-        
-        if not dates:
-            return pd.DataFrame()
-            
-        # 最新の日付を取得
-        latest_date = max(dates)
-        target_date = latest_date.strftime('%Y-%m-%d')
-    
-    # 対象ファイルを特定
-    target_file = os.path.join(data_dir, f"raw/daily_json/sleep_{target_date}.json")
-    if not os.path.exists(target_file):
-        target_file = os.path.join(data_dir, f"sleep_{target_date}.json")
-        if not os.path.exists(target_file):
-            return pd.DataFrame()
-    
-    try:
-        with open(target_file, 'r', encoding='utf-8') as f:
-            content = json.load(f)
-        
-        # 睡眠ステージデータの取得
-        all_data = []
-        
-        if 'sleep' in content and content['sleep']:
-            for sleep_item in content['sleep']:
-                if 'levels' in sleep_item and 'data' in sleep_item['levels']:
-                    for data_point in sleep_item['levels']['data']:
-                        if 'dateTime' in data_point and 'level' in data_point:
-                            try:
-                                time_point = datetime.strptime(data_point['dateTime'], '%Y-%m-%dT%H:%M:%S.%f')
-                                level = data_point['level']
-                                duration = data_point.get('seconds', 0)
-                                
-                                all_data.append({
-                                    'time': time_point,
-                                    'sleep_stage': level,
-                                    'duration_seconds': duration
-                                })
-                            except Exception as e:
-                                continue
-        
-        # DataFrameを作成
-        df = pd.DataFrame(all_data)
-        
-        if df.empty:
-            return df
-            
-        # 時間帯でフィルタリング
-        if start_time and end_time:
-            start_dt = datetime.strptime(f"{target_date} {start_time}", '%Y-%m-%d %H:%M')
-            end_dt = datetime.strptime(f"{target_date} {end_time}", '%Y-%m-%d %H:%M')
-            df = df[(df['time'] >= start_dt) & (df['time'] <= end_dt)]
-        
-        return df
-        
-    except Exception as e:
-        st.warning(f"Warning: {target_file}の読み込み中にエラーが発生しました: {e}")
-        return pd.DataFrame()
+    return _get_loader(data_dir).load_sleep_stages_data(target_date, start_time, end_time)
 
 def generate_ai_insights(heart_rate_data, sleep_data, target_date, time_range):
     """OpenAI GPT-4.1 nanoを使用して健康データに基づく洞察を生成する
     
+    プロセス内で共有されるOpenAIクライアント（接続プール・再試行・
+    サーキットブレーカー付き）を使用するため AIAnalyzer に処理を委譲する。
+    
     Parameters:
     -----------
     heart_rate_data : pd.DataFrame
@@ -433,130 +159,11 @@ def generate_ai_insights(heart_rate_data, sleep_data, target_date, time_range):
     str
         生成された洞察テキスト
     """
-    if not openai_api_key:
-        return "**注意**: OpenAI APIキーが設定されていません。.envファイルにOPENAI_API_KEYを設定してください。"
+    # openai などの読み込みは洞察を生成するときまで遅らせる
+    from src.analysis.ai_insights import AIAnalyzer
     
-    try:
-        # 分析のためのデータ要約を作成
-        hr_stats = {}
-        sleep_stats = {}
-        
-        if not heart_rate_data.empty:
-            hr_stats = {
-                "平均心拍数": round(heart_rate_data['heart_rate'].mean(), 1),
-                "最大心拍数": int(heart_rate_data['heart_rate'].max()),
-                "最小心拍数": int(heart_rate_data['heart_rate'].min()),
-                "心拍数標準偏差": round(heart_rate_data['heart_rate'].std(), 1),
-                "心拍数変動範囲": int(heart_rate_data['heart_rate'].max() - heart_rate_data['heart_rate'].min())
-            }
-        
-        if not sleep_data.empty:
-            # 睡眠ステージ分布
-            stage_distribution = sleep_data.groupby('sleep_stage')['duration_seconds'].sum()
-            stage_distribution = (stage_distribution / 60).to_dict()  # 分単位に変換
-            
-            # 主な睡眠ステージ
-            if not stage_distribution:
-                main_stage = "不明"
-            else:
-                main_stage = max(stage_distribution.items(), key=lambda x: x[1])[0]
-            
-            # 睡眠ステージの遷移回数
-            transitions = sleep_data['sleep_stage'].diff().ne(0).sum() - 1 if len(sleep_data) > 1 else 0
-            
-            sleep_stats = {
-                "主な睡眠ステージ": main_stage,
-                "睡眠ステージ分布（分）": stage_distribution,
-                "睡眠ステージ遷移回数": transitions
-            }
-        
-        # OpenAI APIリクエスト用のデータ
-        prompt = f"""
-        あなたは健康データ分析のエキスパートです。Fitbitから取得した特定時間帯（{time_range}）の{target_date}のデータに基づいて、健康状態や生活習慣について洞察を提供してください。
-
-        データの概要：
-        
-        心拍数データ:
-        {json.dumps(hr_stats, ensure_ascii=False, indent=2) if hr_stats else "データなし"}
-        
-        睡眠ステージデータ:
-        {json.dumps(sleep_stats, ensure_ascii=False, indent=2) if sleep_stats else "データなし"}
-        
-        以下の点について考察してください：
-        1. この時間帯のデータが示す健康状態について
-        2. 生活習慣や睡眠の質への影響
-        3. 健康改善のための具体的な提案（該当する場合）
-        4. 特に注目すべきパターンや特徴
-        
-        回答は日本語で、科学的根拠に基づいた専門的で分かりやすい内容にしてください。箇条書きも適宜使い、読みやすく構成してください。
-        医学的見地からの総合的な考察をお願いします。
-        """
-        
-        # OpenAI APIの呼び出し
-        try:
-            client = openai.OpenAI(api_key=openai_api_key)
-            response = client.chat.completions.create(
-                model="gpt-4.1-nano",  # GPT-4.1 Nano
-                messages=[
-                    {"role": "system", "content": "あなたは健康データ分析の専門家です。科学的根拠に基づいた洞察を提供します。"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1000
-            )
-            
-            # 結果を返す
-            insight_text = response.choices[0].message.content
-            return insight_text
-            
-        except Exception as e:
-            # API呼び出しに失敗した場合は標準的なAPIを使う
-            st.error(f"GPT-4.1-nanoでの分析中にエラーが発生しました: {str(e)}")
-            st.warning("標準的なOpenAI APIを使用して再試行します...")
-            
-            try:
-                # 標準的なAPIリクエスト
-                import requests
-                
-                api_key = openai_api_key
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {api_key}"
-                }
-                
-                payload = {
-                    "model": "gpt-4.1-nano",
-                    "messages": [
-                        {"role": "system", "content": "あなたは健康データ分析の専門家です。科学的根拠に基づいた洞察を提供します。"},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.7,
-                    "max_tokens": 1000
-                }
-                
-                response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-                response.raise_for_status()
-                result = response.json()
-                
-                return result["choices"][0]["message"]["content"]
-                
-            except Exception as sub_e:
-                return f"""
-                **エラー**: GPT-4.1-nanoを使用したAI洞察生成に失敗しました。
-
-                詳細エラー情報:
-                1. {str(e)}
-                2. {str(sub_e)}
-                
-                解決方法:
-                - OpenAI APIキーが正しく設定されているか確認してください
-                - OpenAIアカウントでGPT-4.1-nanoにアクセス権があるか確認してください
-                - APIの利用制限に達していないか確認してください
-                """
-        
-    except Exception as e:
-        st.error(f"AIによる洞察生成中にエラーが発生しました: {str(e)}")
-        return f"**エラー**: AI洞察を生成できませんでした。詳細: {str(e)}"
+    analyzer = AIAnalyzer(user_id=AuthManager.get_client_id())
+    return analyzer.generate_insights(heart_rate_data, sleep_data, target_date, time_range)
 
 # アプリの説明
 with st.expander("このアプリについて"):
@@ -601,27 +208,31 @@ if activity_df.empty and sleep_df.empty and heart_rate_df.empty:
     """)
     st.stop()
 
-# データの基本情報
+# グラフの描画に使うPlotlyは、表示するデータがある場合にだけ読み込む
+import plotly.express as px
+
+# データの基本情報（平均値はSQLで集計する）
 st.subheader("データの概要")
+metrics = _get_loader(data_dir).summary_metrics()
 col1, col2, col3 = st.columns(3)
 
 with col1:
-    if not activity_df.empty:
-        avg_steps = int(activity_df['steps'].mean())
+    if metrics['avg_steps'] is not None:
+        avg_steps = int(metrics['avg_steps'])
         st.metric("1日の平均歩数", f"{avg_steps:,} 歩", delta=None)
     else:
         st.metric("1日の平均歩数", "データなし", delta=None)
 
 with col2:
-    if not sleep_df.empty:
-        avg_sleep = round(sleep_df['sleep_hours'].mean(), 1)
+    if metrics['avg_sleep_hours'] is not None:
+        avg_sleep = round(metrics['avg_sleep_hours'], 1)
         st.metric("1日の平均睡眠時間", f"{avg_sleep} 時間", delta=None)
     else:
         st.metric("1日の平均睡眠時間", "データなし", delta=None)
 
 with col3:
-    if not heart_rate_df.empty:
-        avg_hr = int(heart_rate_df['resting_heart_rate'].mean())
+    if metrics['avg_resting_heart_rate'] is not None:
+        avg_hr = int(metrics['avg_resting_heart_rate'])
         st.metric("平均安静時心拍数", f"{avg_hr} bpm", delta=None)
     else:
         st.metric("平均安静時心拍数", "データなし", delta=None)
@@ -845,24 +456,12 @@ with tab4:
     st.markdown("特定の時間帯のデータを詳しく分析します。")
     
     # 日付選択
-    available_dates = []
-    heart_rate_files = glob.glob(os.path.join(data_dir, "raw/daily_json/heart_rate_*.json"))
-    if not heart_rate_files:
-        heart_rate_files = glob.glob(os.path.join(data_dir, "heart_rate_*.json"))
-    
-    for file in heart_rate_files:
-        date_str = os.path.basename(file).replace('heart_rate_', '').replace('.json', '')
-        try:
-            date = datetime.strptime(date_str, '%Y-%m-%d')
-            available_dates.append(date)
-        except:
-            continue
+    available_dates = _get_loader(data_dir).get_available_dates()
     
     if not available_dates:
         st.warning("分析可能な日付データがありません")
     else:
-        # 日付をソート
-        available_dates.sort(reverse=True)
+        # 日付は新しい順に並んでいる
         date_options = [date.strftime('%Y-%m-%d') for date in available_dates]
         
         selected_date = st.selectbox(
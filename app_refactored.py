@@ -213,7 +213,7 @@ def show_time_analysis_tab(data_loader, visualizer):
                 use_ai_insights = st.checkbox("GPT-4.1-nanoによる詳細な分析を表示", value=True)
                 
                 if use_ai_insights:
-                    ai_analyzer = AIAnalyzer()
+                    ai_analyzer = AIAnalyzer(user_id=AuthManager.get_client_id())
                     if not ai_analyzer.api_key:
                         st.warning("OpenAI APIキーが設定されていません。詳細な分析を行うには、.envファイルにOPENAI_API_KEYを設定してください。")
                         st.markdown("""
@@ -243,6 +243,10 @@ def show_time_analysis_tab(data_loader, visualizer):
                                     time_range
                                 )
                                 st.session_state.ai_insights[cache_key] = insights
+                            
+                            # プロンプトのトークン数を表示（事前計算済みの場合はAPIを呼ばないため表示しない）
+                            if ai_analyzer.last_prompt_tokens:
+                                st.caption(f"プロンプト: 約{ai_analyzer.last_prompt_tokens}トークン")
                         
                         # 結果を表示
                         st.markdown(st.session_state.ai_insights[cache_key])
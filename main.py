@@ -27,16 +27,85 @@ def main():
     data_parser.add_argument("--date", default="today", help="取得する日付（例: 2023-01-01、デフォルト: today）")
     data_parser.add_argument("--days", type=int, default=1, help="取得する日数（過去に遡る日数、デフォルト: 1）")
     data_parser.add_argument("--output-dir", default="data", help="データの保存先ディレクトリ（デフォルト: data）")
+    data_parser.add_argument("--workers", type=int, default=4, help="同時に実行するリクエスト数（デフォルト: 4）")
+    data_parser.add_argument("--bulk", action="store_true", help="期間指定エンドポイントでまとめて取得する（日数が多い場合に推奨）")
+    data_parser.add_argument("--sync", action="store_true", help="差分同期: 今日・未確定の日・未取得の日だけを取得する")
+    data_parser.add_argument("--resume", action="store_true", help="前回中断したジョブをチェックポイントから再開する")
+    data_parser.add_argument("--no-cache", action="store_true", help="レスポンスキャッシュを使わずにAPIから取得する")
+    data_parser.add_argument("--format", choices=["json", "packed"], default="json",
+                             help="保存形式（json: 日ごとのJSONファイル、packed: 月ごとの圧縮セグメント、デフォルト: json）")
+    data_parser.add_argument("--metrics", default="", help="追加で日ごとに取得するデータをカンマ区切りで指定（spo2、--bulk では取得されません）")
     
     # 処理コマンド
     process_parser = subparsers.add_parser("process", help="取得したデータを処理")
     process_parser.add_argument("--input-dir", default="data", help="処理するデータのディレクトリ（デフォルト: data）")
     process_parser.add_argument("--output-dir", default="output", help="処理結果の保存先ディレクトリ（デフォルト: output）")
+    process_parser.add_argument("--workers", type=int, default=None, help="並列に処理するプロセス数（デフォルト: CPU数）")
+    process_parser.add_argument("--full", action="store_true", help="前回の処理状態を無視してすべての日を処理する")
     
     # 可視化コマンド
     visualize_parser = subparsers.add_parser("visualize", help="取得したデータをPlotlyで可視化")
     visualize_parser.add_argument("--input-dir", default="data", help="可視化するデータのディレクトリ（デフォルト: data）")
     visualize_parser.add_argument("--output-dir", default="output/visualization", help="可視化結果の保存先ディレクトリ（デフォルト: output/visualization）")
+    visualize_parser.add_argument("--workers", type=int, default=4, help="並行して作成するグラフの数（デフォルト: 4）")
+    visualize_parser.add_argument("--plotlyjs", choices=["directory", "cdn", "inline"], default="directory",
+                                  help="plotly.jsの読み込み方法（directory: 出力ディレクトリに1つだけ置いて共有、cdn: CDN、inline: 各HTMLに埋め込み、デフォルト: directory）")
+    visualize_parser.add_argument("--report", action="store_true", help="すべてのグラフを1ページにまとめた fitbit_report.html も出力する")
+    
+    # レポート出力コマンド
+    report_parser = subparsers.add_parser("report", help="ダッシュボードのグラフをPNG/PDFのレポートとして一括出力")
+    report_parser.add_argument("--input-dir", action="append", default=None, help="入力データのディレクトリ（複数指定でユーザーごとに出力、デフォルト: data）")
+    report_parser.add_argument("--output-dir", default="output/reports", help="レポートの保存先ディレクトリ（デフォルト: output/reports）")
+    report_parser.add_argument("--ranges", default=None, help="期間をカンマ区切りで指定（例: 2025-03-01:2025-03-31,2025-04-01:2025-04-30）")
+    report_parser.add_argument("--end", default=None, help="--ranges未指定時の最後の期間の終了日（デフォルト: 今日）")
+    report_parser.add_argument("--window-days", type=int, default=30, help="--ranges未指定時の1期間の日数（デフォルト: 30）")
+    report_parser.add_argument("--windows", type=int, default=1, help="--ranges未指定時の期間の数（デフォルト: 1）")
+    report_parser.add_argument("--formats", default="png,pdf", help="出力する形式をカンマ区切りで指定（デフォルト: png,pdf）")
+    report_parser.add_argument("--workers", type=int, default=None, help="ワーカープロセス数（デフォルト: CPU数）")
+    
+    # エクスポートコマンド
+    export_parser = subparsers.add_parser("export", help="日次・日中のテーブルをArrow IPC（Feather）形式で書き出す")
+    export_parser.add_argument("--data-dir", default="data", help="生データのディレクトリ（デフォルト: data）")
+    export_parser.add_argument("--output-dir", default="output/arrow", help="出力先ディレクトリ（デフォルト: output/arrow）")
+    export_parser.add_argument("--tables", default="daily,heart_rate_intraday,sleep_stages", help="書き出すテーブルをカンマ区切りで指定")
+    export_parser.add_argument("--format", choices=["feather", "stream"], default="feather", help="出力形式（feather: IPCファイル形式、stream: IPCストリーム形式、デフォルト: feather）")
+    export_parser.add_argument("--compression", choices=["none", "lz4", "zstd"], default="none", help="圧縮形式（デフォルト: none）")
+    export_parser.add_argument("--start", default=None, help="期間の開始日（YYYY-MM-DD）")
+    export_parser.add_argument("--end", default=None, help="期間の終了日（YYYY-MM-DD）")
+    export_parser.add_argument("--stdout", action="store_true", help="1つのテーブルをIPCストリーム形式で標準出力に書き出す（パイプ用）")
+    
+    # AI洞察の一括生成コマンド
+    insights_parser = subparsers.add_parser("insights", help="AI洞察をオフラインで一括生成してキャッシュに保存")
+    insights_parser.add_argument("--data-dir", default="data", help="データディレクトリ（デフォルト: data）")
+    insights_parser.add_argument("--dates", default=None, help="対象日をカンマ区切りで指定（例: 2025-04-01,2025-04-02）")
+    insights_parser.add_argument("--days", type=int, default=7, help="--dates未指定時に対象とする最新の日数（デフォルト: 7）")
+    insights_parser.add_argument("--windows", default="00:00-06:00,06:00-12:00,12:00-18:00,18:00-23:59", help="時間帯をカンマ区切りで指定")
+    insights_parser.add_argument("--concurrency", type=int, default=4, help="同時API呼び出し数の上限（デフォルト: 4）")
+    insights_parser.add_argument("--tpm", type=int, default=200000, help="1分あたりのトークン予算（デフォルト: 200000）")
+    insights_parser.add_argument("--force", action="store_true", help="キャッシュ済みの洞察も再生成する")
+    
+    # パイプラインコマンド
+    pipeline_parser = subparsers.add_parser("pipeline", help="取得・正規化・可視化を1つのプロセスで実行")
+    pipeline_parser.add_argument("--date", default="today", help="取得する最後の日付（例: 2023-01-01、デフォルト: today）")
+    pipeline_parser.add_argument("--days", type=int, default=7, help="取得する日数（デフォルト: 7）")
+    pipeline_parser.add_argument("--data-dir", default="data", help="生データの保存先ディレクトリ（デフォルト: data）")
+    pipeline_parser.add_argument("--output-dir", default="output", help="処理結果の保存先ディレクトリ（デフォルト: output）")
+    pipeline_parser.add_argument("--workers", type=int, default=4, help="同時に実行するリクエスト数（デフォルト: 4）")
+    pipeline_parser.add_argument("--no-fetch", action="store_true", help="APIから取得せず、データディレクトリの生データを使用する")
+    pipeline_parser.add_argument("--save-tables", action="store_true", help="正規化したテーブルを <output-dir>/pipeline/ にParquetで保存する")
+    
+    # Webhookコマンド
+    webhook_parser = subparsers.add_parser("webhook", help="Fitbitの更新通知を受け取り、該当するデータだけを取得するWebhookサーバーを起動")
+    webhook_parser.add_argument("--host", default="0.0.0.0", help="待ち受けるホスト（デフォルト: 0.0.0.0）")
+    webhook_parser.add_argument("--port", type=int, default=8095, help="待ち受けるポート（デフォルト: 8095）")
+    webhook_parser.add_argument("--path", default="/fitbit/webhook", help="通知を受け取るパス（デフォルト: /fitbit/webhook）")
+    webhook_parser.add_argument("--output-dir", default="data", help="データの保存先ディレクトリ（デフォルト: data）")
+    webhook_parser.add_argument("--workers", type=int, default=2, help="取得を実行するスレッド数（デフォルト: 2）")
+    webhook_parser.add_argument("--delay", type=float, default=5.0, help="通知を受け取ってから取得するまでの待機秒数（デフォルト: 5）")
+    webhook_parser.add_argument("--format", choices=["json", "packed"], default="json", help="保存形式（デフォルト: json）")
+    webhook_parser.add_argument("--subscribe", action="store_true", help="起動時に activities と sleep の通知を登録する")
+    webhook_parser.add_argument("--send", choices=["activities", "sleep"], default=None, help="サーバーを起動せず、動作確認用の通知を送信する")
+    webhook_parser.add_argument("--date", default=None, help="--send で送信する日付（デフォルト: 今日）")
     
     args = parser.parse_args()
     
@@ -72,8 +141,19 @@ def main():
             "fitbit_data_api.py", 
             "--date", args.date,
             "--days", str(args.days),
-            "--output-dir", args.output_dir
+            "--output-dir", args.output_dir,
+            "--workers", str(args.workers),
+            "--format", args.format,
+            "--metrics", args.metrics
         ]
+        if args.bulk:
+            sys.argv.append("--bulk")
+        if args.sync:
+            sys.argv.append("--sync")
+        if args.resume:
+            sys.argv.append("--resume")
+        if args.no_cache:
+            sys.argv.append("--no-cache")
         
         try:
             data_api_main()
@@ -95,6 +175,10 @@ def main():
             "--input-dir", args.input_dir,
             "--output-dir", args.output_dir
         ]
+        if args.workers:
+            sys.argv += ["--workers", str(args.workers)]
+        if args.full:
+            sys.argv.append("--full")
         
         try:
             direct_process_main()
@@ -114,14 +198,156 @@ def main():
         sys.argv = [
             "data_visualizer.py",
             "--input-dir", args.input_dir,
-            "--output-dir", args.output_dir
+            "--output-dir", args.output_dir,
+            "--workers", str(args.workers),
+            "--plotlyjs", args.plotlyjs
         ]
+        if args.report:
+            sys.argv.append("--report")
         
         try:
             visualizer_main()
         finally:
             # コマンドライン引数を元に戻す
             sys.argv = original_argv
+    
+    elif args.command == "report":
+        # 環境変数PYTHONPATHにカレントディレクトリを追加
+        sys.path.insert(0, script_dir)
+        from src.utils.report_renderer import main as report_main
+        
+        # 元のコマンドライン引数を保存
+        original_argv = sys.argv
+        
+        # 新しいコマンドライン引数を設定
+        sys.argv = [
+            "report_renderer.py",
+            "--output-dir", args.output_dir,
+            "--window-days", str(args.window_days),
+            "--windows", str(args.windows),
+            "--formats", args.formats
+        ]
+        for input_dir in args.input_dir or []:
+            sys.argv += ["--input-dir", input_dir]
+        if args.ranges:
+            sys.argv += ["--ranges", args.ranges]
+        if args.end:
+            sys.argv += ["--end", args.end]
+        if args.workers:
+            sys.argv += ["--workers", str(args.workers)]
+        
+        try:
+            report_main()
+        finally:
+            # コマンドライン引数を元に戻す
+            sys.argv = original_argv
+    
+    elif args.command == "export":
+        # 環境変数PYTHONPATHにカレントディレクトリを追加
+        sys.path.insert(0, script_dir)
+        from src.data.arrow_export import main as export_main
+        
+        # 元のコマンドライン引数を保存
+        original_argv = sys.argv
+        
+        # 新しいコマンドライン引数を設定
+        sys.argv = [
+            "arrow_export.py",
+            "--data-dir", args.data_dir,
+            "--output-dir", args.output_dir,
+            "--tables", args.tables,
+            "--format", args.format,
+            "--compression", args.compression
+        ]
+        if args.start:
+            sys.argv += ["--start", args.start]
+        if args.end:
+            sys.argv += ["--end", args.end]
+        if args.stdout:
+            sys.argv.append("--stdout")
+        
+        try:
+            export_main()
+        finally:
+            # コマンドライン引数を元に戻す
+            sys.argv = original_argv
+    
+    elif args.command == "insights":
+        # 環境変数PYTHONPATHにカレントディレクトリを追加
+        sys.path.insert(0, script_dir)
+        from src.analysis.batch_insights import main as batch_insights_main
+        
+        # 元のコマンドライン引数を保存
+        original_argv = sys.argv
+        
+        # 新しいコマンドライン引数を設定
+        sys.argv = [
+            "batch_insights.py",
+            "--data-dir", args.data_dir,
+            "--days", str(args.days),
+            "--windows", args.windows,
+            "--concurrency", str(args.concurrency),
+            "--tpm", str(args.tpm)
+        ]
+        if args.dates:
+            sys.argv += ["--dates", args.dates]
+        if args.force:
+            sys.argv.append("--force")
+        
+        try:
+            batch_insights_main()
+        finally:
+            # コマンドライン引数を元に戻す
+            sys.argv = original_argv
+
+    elif args.command == "pipeline":
+        # 環境変数PYTHONPATHにカレントディレクトリを追加
+        sys.path.insert(0, script_dir)
+        from src.pipeline import run_pipeline
+        
+        # 各ステージの結果はメモリ上で次のステージに渡す
+        print("=== Fitbit Pipeline ===")
+        run_pipeline(
+            date=args.date,
+            days=args.days,
+            data_dir=args.data_dir,
+            output_dir=args.output_dir,
+            workers=args.workers,
+            fetch=not args.no_fetch,
+            save_tables=args.save_tables
+        )
+    
+    elif args.command == "webhook":
+        # 環境変数PYTHONPATHにカレントディレクトリを追加
+        sys.path.insert(0, script_dir)
+        from src.api.fitbit_webhook import main as webhook_main
+        
+        # 元のコマンドライン引数を保存
+        original_argv = sys.argv
+        
+        # 新しいコマンドライン引数を設定
+        sys.argv = [
+            "fitbit_webhook.py",
+            "--host", args.host,
+            "--port", str(args.port),
+            "--path", args.path,
+            "--output-dir", args.output_dir,
+            "--workers", str(args.workers),
+            "--delay", str(args.delay),
+            "--format", args.format
+        ]
+        if args.subscribe:
+            sys.argv.append("--subscribe")
+        if args.send:
+            sys.argv += ["--send", args.send]
+        if args.date:
+            sys.argv += ["--date", args.date]
+        
+        try:
+            webhook_main()
+        finally:
+            # コマンドライン引数を元に戻す
+            sys.argv = original_argv
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -6,29 +6,145 @@ OpenAI APIを使用してFitbitデータに基づく洞察を生成するモジ
 """
 
 import os
-import json
-import streamlit as st
-import openai
-import time
-import requests
 from dotenv import load_dotenv
 
+from src.analysis.openai_client import (
+    DEFAULT_MODEL,
+    CircuitOpenError,
+    call_with_retry,
+    get_openai_client,
+)
+from src.analysis.insight_cache import InsightCache, make_cache_key
+from src.analysis.prompt_builder import PromptBuilder
+from src.utils.rate_limiter import RateLimitExceeded, get_ai_rate_limiter
+
+# プロンプトの内容を変更した場合は更新する（キャッシュキーに含まれる）
+PROMPT_VERSION = "2"
+
+TEMPERATURE = 0.7
+MAX_TOKENS = 1000
+
+def _show_message(level, message):
+    """Streamlitにエラー・警告を表示する（streamlit はここで初めて読み込む）"""
+    import streamlit as st
+    getattr(st, level)(message)
+
 class AIAnalyzer:
     """AIを使用してデータを分析するクラス"""
     
-    def __init__(self):
-        """初期化"""
+    def __init__(self, cache=None, use_cache=True, user_id="local", rate_limiter=None):
+        """初期化
+        
+        Parameters:
+        -----------
+        cache : InsightCache, optional
+            使用する永続キャッシュ（未指定の場合はデフォルトのキャッシュ）
+        use_cache : bool
+            永続キャッシュを使用するかどうか
+        user_id : str
+            レート制限に使用するユーザー識別子
+        rate_limiter : AIRateLimiter, optional
+            使用するレート制限（未指定の場合はプロセス全体で共有するもの）
+        """
         # 環境変数の読み込み
         load_dotenv()
         
         # OpenAI APIキーの設定
         self.api_key = os.getenv("OPENAI_API_KEY")
         if self.api_key:
+            # openai はAPIキーが設定されている場合にだけ読み込む
+            import openai
             openai.api_key = self.api_key
+        
+        self.model = DEFAULT_MODEL
+        self.prompt_builder = PromptBuilder()
+        self.last_usage = None
+        self.last_prompt_tokens = None
+        self.user_id = user_id
+        self.rate_limiter = rate_limiter or get_ai_rate_limiter()
+        
+        # 永続キャッシュ（書き込めない環境ではキャッシュなしで動作する）
+        self.cache = cache
+        if self.cache is None and use_cache:
+            try:
+                self.cache = InsightCache()
+            except Exception as e:
+                print(f"Warning: AI洞察キャッシュを初期化できませんでした: {e}")
+    
+    def summarize(self, heart_rate_data, sleep_data):
+        """プロンプトに埋め込むデータの要約統計を作成する
+        
+        Parameters:
+        -----------
+        heart_rate_data : pd.DataFrame
+            時間帯ごとの心拍数データ
+        sleep_data : pd.DataFrame
+            時間帯ごとの睡眠ステージデータ
+        
+        Returns:
+        --------
+        tuple of dict
+            (心拍数の要約, 睡眠ステージの要約)
+        """
+        hr_stats = {}
+        sleep_stats = {}
+        
+        if not heart_rate_data.empty:
+            hr = heart_rate_data['heart_rate']
+            hr_stats = {
+                "平均心拍数": round(float(hr.mean()), 1),
+                "最大心拍数": int(hr.max()),
+                "最小心拍数": int(hr.min()),
+                "心拍数標準偏差": round(float(hr.std()), 1) if len(hr) > 1 else 0.0,
+                "心拍数変動範囲": int(hr.max() - hr.min())
+            }
+        
+        if not sleep_data.empty:
+            # 睡眠ステージ分布（分単位）
+            stage_distribution = sleep_data.groupby('sleep_stage')['duration_seconds'].sum()
+            stage_distribution = {stage: round(float(seconds) / 60, 1) for stage, seconds in stage_distribution.items()}
+            
+            # 主な睡眠ステージ
+            if not stage_distribution:
+                main_stage = "不明"
+            else:
+                main_stage = max(stage_distribution.items(), key=lambda x: x[1])[0]
+            
+            # 睡眠ステージの遷移回数（ステージは文字列のため直前の値との比較で数える）
+            stages = sleep_data['sleep_stage']
+            transitions = int(stages.ne(stages.shift()).sum() - 1) if len(sleep_data) > 1 else 0
+            
+            sleep_stats = {
+                "主な睡眠ステージ": main_stage,
+                "睡眠ステージ分布（分）": stage_distribution,
+                "睡眠ステージ遷移回数": transitions
+            }
+        
+        return hr_stats, sleep_stats
+    
+    def build_prompt(self, hr_stats, sleep_stats, target_date, time_range):
+        """要約統計からトークン予算内のプロンプトを作成する
+        
+        Returns:
+        --------
+        BuiltPrompt
+            メッセージとトークン数
+        """
+        prompt = self.prompt_builder.build(hr_stats, sleep_stats, target_date, time_range)
+        self.last_prompt_tokens = prompt.prompt_tokens
+        return prompt
+    
+    def cache_key(self, hr_stats, sleep_stats, target_date, time_range):
+        """永続キャッシュのキーを返す"""
+        return make_cache_key(
+            target_date, time_range, [hr_stats, sleep_stats], self.model, PROMPT_VERSION
+        )
     
     def generate_insights(self, heart_rate_data, sleep_data, target_date, time_range):
         """OpenAI GPT-4.1 nanoを使用して健康データに基づく洞察を生成する
         
+        事前計算済みの洞察が永続キャッシュにあればAPIを呼ばずにそれを返す。
+        
         Parameters:
         -----------
         heart_rate_data : pd.DataFrame
@@ -45,142 +161,122 @@ class AIAnalyzer:
         str
             生成された洞察テキスト
         """
-        if not self.api_key:
-            return "**注意**: OpenAI APIキーが設定されていません。.envファイルにOPENAI_API_KEYを設定してください。"
-        
         try:
-            # 分析のためのデータ要約を作成
-            hr_stats = {}
-            sleep_stats = {}
-            
-            if not heart_rate_data.empty:
-                hr_stats = {
-                    "平均心拍数": round(heart_rate_data['heart_rate'].mean(), 1),
-                    "最大心拍数": int(heart_rate_data['heart_rate'].max()),
-                    "最小心拍数": int(heart_rate_data['heart_rate'].min()),
-                    "心拍数標準偏差": round(heart_rate_data['heart_rate'].std(), 1),
-                    "心拍数変動範囲": int(heart_rate_data['heart_rate'].max() - heart_rate_data['heart_rate'].min())
-                }
-            
-            if not sleep_data.empty:
-                # 睡眠ステージ分布
-                stage_distribution = sleep_data.groupby('sleep_stage')['duration_seconds'].sum()
-                stage_distribution = (stage_distribution / 60).to_dict()  # 分単位に変換
-                
-                # 主な睡眠ステージ
-                if not stage_distribution:
-                    main_stage = "不明"
-                else:
-                    main_stage = max(stage_distribution.items(), key=lambda x: x[1])[0]
-                
-                # 睡眠ステージの遷移回数
-                transitions = sleep_data['sleep_stage'].diff().ne(0).sum() - 1 if len(sleep_data) > 1 else 0
-                
-                sleep_stats = {
-                    "主な睡眠ステージ": main_stage,
-                    "睡眠ステージ分布（分）": stage_distribution,
-                    "睡眠ステージ遷移回数": transitions
-                }
-            
-            # OpenAI APIリクエスト用のデータ
-            prompt = f"""
-            あなたは健康データ分析のエキスパートです。Fitbitから取得した特定時間帯（{time_range}）の{target_date}のデータに基づいて、健康状態や生活習慣について洞察を提供してください。
-
-            データの概要：
+            hr_stats, sleep_stats = self.summarize(heart_rate_data, sleep_data)
+            key = self.cache_key(hr_stats, sleep_stats, target_date, time_range)
             
-            心拍数データ:
-            {json.dumps(hr_stats, ensure_ascii=False, indent=2) if hr_stats else "データなし"}
+            if self.cache is not None:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return cached
             
-            睡眠ステージデータ:
-            {json.dumps(sleep_stats, ensure_ascii=False, indent=2) if sleep_stats else "データなし"}
+            if not self.api_key:
+                return "**注意**: OpenAI APIキーが設定されていません。.envファイルにOPENAI_API_KEYを設定してください。"
             
-            以下の点について考察してください：
-            1. この時間帯のデータが示す健康状態について
-            2. 生活習慣や睡眠の質への影響
-            3. 健康改善のための具体的な提案（該当する場合）
-            4. 特に注目すべきパターンや特徴
-            
-            回答は日本語で、科学的根拠に基づいた専門的で分かりやすい内容にしてください。箇条書きも適宜使い、読みやすく構成してください。
-            医学的見地からの総合的な考察をお願いします。
-            """
+            # プロセス全体のレート制限（キャッシュ済みの場合は消費しない）
+            try:
+                self.rate_limiter.acquire(self.user_id)
+            except RateLimitExceeded as e:
+                wait = f"約{int(e.retry_after) + 1}秒後に" if e.retry_after else "しばらくしてから"
+                return f"**注意**: {str(e)}。{wait}再度お試しください。"
             
-            return self._call_openai_api(prompt)
+            prompt = self.build_prompt(hr_stats, sleep_stats, target_date, time_range)
+            insight_text = self._call_openai_api(prompt)
             
+            # 成功した結果のみキャッシュに保存する
+            if self.last_usage is not None:
+                self.store_insights(key, target_date, time_range, insight_text)
+            return insight_text
+        
         except Exception as e:
-            st.error(f"AIによる洞察生成中にエラーが発生しました: {str(e)}")
+            _show_message("error", f"AIによる洞察生成中にエラーが発生しました: {str(e)}")
             return f"**エラー**: AI洞察を生成できませんでした。詳細: {str(e)}"
     
+    def store_insights(self, key, target_date, time_range, insight_text):
+        """生成した洞察を永続キャッシュに保存する"""
+        if self.cache is None:
+            return
+        usage = self.last_usage or {}
+        try:
+            self.cache.put(
+                key, target_date, time_range, self.model, insight_text,
+                prompt_tokens=usage.get("prompt_tokens"),
+                completion_tokens=usage.get("completion_tokens")
+            )
+        except Exception as e:
+            print(f"Warning: AI洞察をキャッシュに保存できませんでした: {e}")
+    
+    def request_insights(self, prompt):
+        """OpenAI APIを呼び出し、応答テキストとトークン使用量を返す
+        
+        プロセス内で共有されるクライアントを使用し、一時的なエラーは
+        ジッター付きバックオフで再試行する。連続して失敗している間は
+        サーキットブレーカーにより CircuitOpenError を送出する。
+        
+        Parameters:
+        -----------
+        prompt : BuiltPrompt
+            build_prompt で作成したプロンプト
+        
+        Returns:
+        --------
+        tuple
+            (応答テキスト, トークン使用量のdict)
+        """
+        client = get_openai_client(self.api_key)
+        response = call_with_retry(
+            lambda: client.chat.completions.create(
+                model=self.model,  # GPT-4.1 Nano
+                messages=prompt.messages,
+                temperature=TEMPERATURE,
+                max_tokens=MAX_TOKENS
+            )
+        )
+        
+        usage = {}
+        if getattr(response, "usage", None) is not None:
+            usage = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens
+            }
+        return response.choices[0].message.content, usage
+    
     def _call_openai_api(self, prompt):
         """OpenAI APIを呼び出す
         
         Parameters:
         -----------
-        prompt : str
-            APIに送るプロンプト
-            
+        prompt : BuiltPrompt
+            build_prompt で作成したプロンプト
+        
         Returns:
         --------
         str
-            APIからの応答テキスト
+            APIからの応答テキスト（失敗した場合はエラーメッセージ）
         """
+        self.last_usage = None
         try:
-            # OpenAI APIの呼び出し
-            client = openai.OpenAI(api_key=self.api_key)
-            response = client.chat.completions.create(
-                model="gpt-4.1-nano",  # GPT-4.1 Nano
-                messages=[
-                    {"role": "system", "content": "あなたは健康データ分析の専門家です。科学的根拠に基づいた洞察を提供します。"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1000
-            )
-            
-            # 結果を返す
-            insight_text = response.choices[0].message.content
+            insight_text, self.last_usage = self.request_insights(prompt)
             return insight_text
+        
+        except CircuitOpenError as e:
+            _show_message("warning", str(e))
+            return f"""
+            **エラー**: OpenAI APIで連続してエラーが発生しているため、AI分析を一時停止しています。
             
+            しばらく待ってから再度お試しください。（{str(e)}）
+            """
+        
         except Exception as e:
-            # API呼び出しに失敗した場合は標準的なAPIを使う
-            st.error(f"GPT-4.1-nanoでの分析中にエラーが発生しました: {str(e)}")
-            st.warning("標準的なOpenAI APIを使用して再試行します...")
+            _show_message("error", f"GPT-4.1-nanoでの分析中にエラーが発生しました: {str(e)}")
+            return f"""
+            **エラー**: GPT-4.1-nanoを使用したAI洞察生成に失敗しました。
             
-            try:
-                # 標準的なAPIリクエスト
-                import requests
-                
-                api_key = self.api_key
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {api_key}"
-                }
-                
-                payload = {
-                    "model": "gpt-4.1-nano",
-                    "messages": [
-                        {"role": "system", "content": "あなたは健康データ分析の専門家です。科学的根拠に基づいた洞察を提供します。"},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.7,
-                    "max_tokens": 1000
-                }
-                
-                response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-                response.raise_for_status()
-                result = response.json()
-                
-                return result["choices"][0]["message"]["content"]
-                
-            except Exception as sub_e:
-                return f"""
-                **エラー**: GPT-4.1-nanoを使用したAI洞察生成に失敗しました。
-
-                詳細エラー情報:
-                1. {str(e)}
-                2. {str(sub_e)}
-                
-                解決方法:
-                - OpenAI APIキーが正しく設定されているか確認してください
-                - OpenAIアカウントでGPT-4.1-nanoにアクセス権があるか確認してください
-                - APIの利用制限に達していないか確認してください
-                """ 
\ No newline at end of file
+            詳細エラー情報:
+            {str(e)}
+            
+            解決方法:
+            - OpenAI APIキーが正しく設定されているか確認してください
+            - OpenAIアカウントでGPT-4.1-nanoにアクセス権があるか確認してください
+            - APIの利用制限に達していないか確認してください
+            """
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AI洞察をオフラインで一括生成するスクリプト
+
+複数の日付・時間帯について要約統計を計算し、OpenAI APIを並行して呼び出す。
+結果は永続キャッシュに保存され、ダッシュボードは事前計算済みの洞察を返す。
+"""
+
+import time
+import argparse
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src.analysis.ai_insights import AIAnalyzer, MAX_TOKENS
+from src.data.loader import FitbitDataLoader
+from src.utils.rate_limiter import TokenBucket
+
+DEFAULT_WINDOWS = "00:00-06:00,06:00-12:00,12:00-18:00,18:00-23:59"
+
+def parse_windows(spec):
+    """時間帯の指定（例: "06:00-09:00,21:00-23:00"）を (開始, 終了) のリストに変換する"""
+    windows = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        start, end = [part.strip() for part in item.split("-", 1)]
+        if start >= end:
+            raise ValueError(f"開始時間は終了時間より前にしてください: {item}")
+        windows.append((start, end))
+    return windows
+
+def collect_jobs(loader, analyzer, dates, windows, force=False):
+    """要約統計を計算し、APIを呼び出す必要のあるジョブを作成する
+    
+    Returns:
+    --------
+    tuple
+        (ジョブのリスト, キャッシュ済みでスキップした件数, データなしでスキップした件数)
+    """
+    jobs = []
+    cached = 0
+    empty = 0
+    
+    for target_date in dates:
+        for start_time, end_time in windows:
+            hr_df = loader.load_intraday_heart_rate_data(target_date, start_time, end_time)
+            sleep_df = loader.load_sleep_stages_data(target_date, start_time, end_time)
+            if hr_df.empty and sleep_df.empty:
+                empty += 1
+                continue
+            
+            # ダッシュボードと同じ形式の時間帯文字列を使用する（キャッシュキーに含まれる）
+            time_range = f"{start_time}～{end_time}"
+            hr_stats, sleep_stats = analyzer.summarize(hr_df, sleep_df)
+            key = analyzer.cache_key(hr_stats, sleep_stats, target_date, time_range)
+            if not force and analyzer.cache.contains(key):
+                cached += 1
+                continue
+            
+            prompt = analyzer.build_prompt(hr_stats, sleep_stats, target_date, time_range)
+            jobs.append({
+                "key": key,
+                "target_date": target_date,
+                "time_range": time_range,
+                "prompt": prompt,
+                "prompt_tokens": prompt.prompt_tokens,
+                "estimated_tokens": prompt.prompt_tokens + MAX_TOKENS
+            })
+    
+    return jobs, cached, empty
+
+def run_job(analyzer, budget, job):
+    """1件の洞察を生成してキャッシュに保存する"""
+    estimated = job["estimated_tokens"]
+    budget.acquire(estimated)
+    
+    insight_text, usage = analyzer.request_insights(job["prompt"])
+    
+    # 実際の使用量との差分を精算する
+    actual = (usage.get("prompt_tokens") or 0) + (usage.get("completion_tokens") or 0)
+    if actual:
+        budget.adjust(estimated - actual)
+    
+    analyzer.cache.put(
+        job["key"], job["target_date"], job["time_range"], analyzer.model, insight_text,
+        prompt_tokens=usage.get("prompt_tokens"),
+        completion_tokens=usage.get("completion_tokens")
+    )
+    return actual
+
+def run_batch(data_dir, dates, windows, concurrency=4, tokens_per_minute=200000, force=False, analyzer=None):
+    """AI洞察を一括生成する
+    
+    Parameters:
+    -----------
+    data_dir : str
+        データディレクトリのパス
+    dates : list of str
+        対象日のリスト (YYYY-MM-DD形式)
+    windows : list of tuple
+        (開始時間, 終了時間) のリスト
+    concurrency : int
+        同時に実行するAPI呼び出しの最大数
+    tokens_per_minute : int
+        1分あたりに消費してよいトークン数の上限
+    force : bool
+        キャッシュ済みの洞察も再生成するかどうか
+    analyzer : AIAnalyzer, optional
+        使用するアナライザー
+    
+    Returns:
+    --------
+    dict
+        実行結果の集計
+    """
+    analyzer = analyzer or AIAnalyzer()
+    if analyzer.cache is None:
+        raise RuntimeError("AI洞察キャッシュを利用できません")
+    
+    loader = FitbitDataLoader(data_dir)
+    jobs, cached, empty = collect_jobs(loader, analyzer, dates, windows, force)
+    
+    report = {
+        "total": len(dates) * len(windows),
+        "cached": cached,
+        "no_data": empty,
+        "generated": 0,
+        "failed": 0,
+        "prompt_tokens": sum(job["prompt_tokens"] for job in jobs),
+        "truncated_prompts": sum(1 for job in jobs if job["prompt"].truncated),
+        "tokens": 0,
+        "elapsed_seconds": 0.0
+    }
+    if not jobs:
+        return report
+    
+    # 1分あたりのトークン予算（バースト上限も1分ぶん）
+    budget = TokenBucket(rate=tokens_per_minute / 60.0, capacity=tokens_per_minute)
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {executor.submit(run_job, analyzer, budget, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                report["tokens"] += future.result()
+                report["generated"] += 1
+                print(f"生成完了: {job['target_date']} {job['time_range']}")
+            except Exception as e:
+                report["failed"] += 1
+                print(f"エラー: {job['target_date']} {job['time_range']} の洞察生成に失敗しました: {e}")
+    report["elapsed_seconds"] = round(time.perf_counter() - started, 2)
+    
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="AI洞察をオフラインで一括生成するスクリプト")
+    parser.add_argument("--data-dir", default="data", help="データディレクトリ（デフォルト: data）")
+    parser.add_argument("--dates", default=None, help="対象日をカンマ区切りで指定（例: 2025-04-01,2025-04-02）")
+    parser.add_argument("--days", type=int, default=7, help="--dates未指定時に対象とする最新の日数（デフォルト: 7）")
+    parser.add_argument("--windows", default=DEFAULT_WINDOWS, help=f"時間帯をカンマ区切りで指定（デフォルト: {DEFAULT_WINDOWS}）")
+    parser.add_argument("--concurrency", type=int, default=4, help="同時API呼び出し数の上限（デフォルト: 4）")
+    parser.add_argument("--tpm", type=int, default=200000, help="1分あたりのトークン予算（デフォルト: 200000）")
+    parser.add_argument("--force", action="store_true", help="キャッシュ済みの洞察も再生成する")
+    args = parser.parse_args()
+    
+    print("=== Fitbit AI Insights Batch ===")
+    
+    analyzer = AIAnalyzer()
+    if not analyzer.api_key:
+        print("エラー: OPENAI_API_KEYが.envファイルにありません")
+        return
+    
+    if args.dates:
+        dates = [d.strip() for d in args.dates.split(",") if d.strip()]
+    else:
+        available = FitbitDataLoader(args.data_dir).get_available_dates()
+        dates = [d.strftime("%Y-%m-%d") for d in available[:args.days]]
+    if not dates:
+        print(f"エラー: {args.data_dir} に分析可能な日付データがありません")
+        return
+    
+    try:
+        windows = parse_windows(args.windows)
+        print(f"{len(dates)}日 × {len(windows)}時間帯の洞察を生成します（同時実行数: {args.concurrency}, TPM: {args.tpm}）")
+        
+        report = run_batch(
+            args.data_dir, dates, windows,
+            concurrency=args.concurrency,
+            tokens_per_minute=args.tpm,
+            force=args.force,
+            analyzer=analyzer
+        )
+        
+        print("\n処理が完了しました！")
+        print(f"生成: {report['generated']}件 / キャッシュ済み: {report['cached']}件 / "
+              f"データなし: {report['no_data']}件 / 失敗: {report['failed']}件")
+        print(f"プロンプトトークン（見積もり）: {report['prompt_tokens']} / 予算により省略したプロンプト: {report['truncated_prompts']}件")
+        print(f"消費トークン: {report['tokens']} / 所要時間: {report['elapsed_seconds']}秒")
+        print(f"結果は {analyzer.cache.path} に保存されています")
+    except Exception as e:
+        print(f"予期せぬエラーが発生しました: {str(e)}")
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AI洞察の結果をディスクに永続化するキャッシュモジュール
+
+バッチ処理で事前計算した洞察をダッシュボードから再利用するために使用する。
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DEFAULT_CACHE_PATH = os.path.join("output", "insight_cache.sqlite3")
+
+def make_cache_key(target_date, time_range, stats, model, prompt_version):
+    """キャッシュキーを生成する
+    
+    データの要約統計もキーに含めるため、同じ日付・時間帯でも
+    データが異なる場合（別ユーザーのアップロードなど）は共有されない。
+    
+    Parameters:
+    -----------
+    target_date : str
+        対象日
+    time_range : str
+        対象時間帯
+    stats : dict
+        プロンプトに埋め込む要約統計
+    model : str
+        使用するモデル名
+    prompt_version : str
+        プロンプトのバージョン
+    
+    Returns:
+    --------
+    str
+        キャッシュキー
+    """
+    payload = json.dumps(
+        [model, prompt_version, target_date, time_range, stats],
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class InsightCache:
+    """SQLiteを使用した永続的なAI洞察キャッシュ"""
+    
+    def __init__(self, path=None):
+        """
+        初期化
+        
+        Parameters:
+        -----------
+        path : str, optional
+            データベースファイルのパス（未指定の場合は環境変数 INSIGHT_CACHE_PATH、
+            それもなければ output/insight_cache.sqlite3）
+        """
+        self.path = path or os.getenv("INSIGHT_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS insights (
+                    key TEXT PRIMARY KEY,
+                    target_date TEXT NOT NULL,
+                    time_range TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    insight TEXT NOT NULL,
+                    prompt_tokens INTEGER,
+                    completion_tokens INTEGER,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_insights_date ON insights (target_date)")
+    
+    @contextmanager
+    def _connect(self):
+        # 呼び出しごとに接続を作成する（sqlite3の接続はスレッド間で共有できないため）
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
+    def get(self, key):
+        """キャッシュから洞察を取得する
+        
+        Returns:
+        --------
+        str or None
+            キャッシュされた洞察テキスト（存在しない場合はNone）
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT insight FROM insights WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+    
+    def contains(self, key):
+        """キャッシュに存在するかを確認する（ヒット率には数えない）"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT 1 FROM insights WHERE key = ?", (key,)).fetchone()
+        return row is not None
+    
+    def put(self, key, target_date, time_range, model, insight, prompt_tokens=None, completion_tokens=None):
+        """洞察をキャッシュに保存する"""
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO insights
+                    (key, target_date, time_range, model, insight, prompt_tokens, completion_tokens, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, target_date, time_range, model, insight, prompt_tokens, completion_tokens, time.time())
+            )
+    
+    def count(self):
+        """保存されている洞察の件数を返す"""
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM insights").fetchone()[0]
+    
+    @property
+    def hit_rate(self):
+        """このインスタンスでのキャッシュヒット率"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
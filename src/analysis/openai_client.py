@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+OpenAI APIクライアントをプロセス内で共有するためのモジュール
+
+- 接続プール付きのクライアントをプロセスごとに1つだけ生成する
+- 連続した失敗を検知して即座に失敗させるサーキットブレーカー
+- レート制限ヘッダーを考慮したジッター付き指数バックオフによる再試行
+"""
+
+import os
+import re
+import time
+import random
+import threading
+
+# デフォルト設定
+DEFAULT_MODEL = "gpt-4.1-nano"
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 20.0
+
+# 再試行の対象とするHTTPステータスコード
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+_client_lock = threading.Lock()
+_clients = {}
+
+class CircuitOpenError(Exception):
+    """サーキットブレーカーが開いているため呼び出しを行わなかったことを示す例外"""
+    
+    def __init__(self, retry_in):
+        self.retry_in = retry_in
+        super().__init__(f"OpenAI APIへの接続が一時停止中です（約{int(retry_in) + 1}秒後に再開）")
+
+class CircuitBreaker:
+    """連続失敗時に呼び出しを遮断するサーキットブレーカー
+    
+    closed（通常）→ open（遮断）→ half_open（試行）の3状態を持つ。
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0):
+        """
+        初期化
+        
+        Parameters:
+        -----------
+        failure_threshold : int
+            遮断に移行するまでの連続失敗回数
+        recovery_timeout : float
+            遮断後に試行を再開するまでの秒数
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+    
+    @property
+    def state(self):
+        """現在の状態を返す"""
+        with self._lock:
+            return self._current_state()
+    
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+    
+    def before_call(self):
+        """呼び出し前に状態を確認し、遮断中であれば CircuitOpenError を送出する"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.OPEN:
+                raise CircuitOpenError(self.recovery_timeout - (time.monotonic() - self._opened_at))
+            if state == self.HALF_OPEN:
+                # 半開状態では1リクエストだけ試行させる
+                if self._trial_in_flight:
+                    raise CircuitOpenError(1.0)
+                self._trial_in_flight = True
+    
+    def record_success(self):
+        """成功を記録する"""
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+    
+    def release(self):
+        """成功・失敗を記録せずに半開状態の試行枠を解放する"""
+        with self._lock:
+            self._trial_in_flight = False
+    
+    def record_failure(self):
+        """失敗を記録する"""
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+# プロセス全体で共有するサーキットブレーカー
+circuit_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("OPENAI_CIRCUIT_FAILURES", "5")),
+    recovery_timeout=float(os.getenv("OPENAI_CIRCUIT_RECOVERY", "30")),
+)
+
+def get_openai_client(api_key, base_url=None, timeout=DEFAULT_TIMEOUT, max_connections=DEFAULT_MAX_CONNECTIONS):
+    """プロセス内で共有される OpenAI クライアントを取得する
+    
+    同じAPIキー・接続先に対しては同一のクライアント（keep-alive接続プール）を再利用する。
+    SDK側の自動再試行は無効にし、再試行は call_with_retry で制御する。
+    
+    Parameters:
+    -----------
+    api_key : str
+        OpenAI APIキー
+    base_url : str, optional
+        接続先URL（未指定の場合は環境変数 OPENAI_BASE_URL を使用）
+    timeout : float
+        リクエストのタイムアウト秒数
+    max_connections : int
+        接続プールの最大接続数
+    
+    Returns:
+    --------
+    openai.OpenAI
+        共有クライアント
+    """
+    base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+    key = (api_key, base_url)
+    
+    with _client_lock:
+        client = _clients.get(key)
+        if client is None:
+            import httpx
+            import openai
+            
+            http_client = httpx.Client(
+                timeout=timeout,
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                    keepalive_expiry=60.0,
+                ),
+            )
+            client = openai.OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=timeout,
+                max_retries=0,
+                http_client=http_client,
+            )
+            _clients[key] = client
+        return client
+
+def _parse_duration(value):
+    """OpenAIのレート制限ヘッダー（例: "1s", "6m0s", "250ms"）を秒数に変換する"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    
+    total = 0.0
+    matched = False
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        matched = True
+        amount = float(amount)
+        if unit == "ms":
+            total += amount / 1000
+        elif unit == "s":
+            total += amount
+        elif unit == "m":
+            total += amount * 60
+        elif unit == "h":
+            total += amount * 3600
+    return total if matched else None
+
+def get_retry_after(headers):
+    """レスポンスヘッダーから次の再試行までの待機秒数を取得する
+    
+    Parameters:
+    -----------
+    headers : Mapping
+        HTTPレスポンスヘッダー
+    
+    Returns:
+    --------
+    float or None
+        待機秒数（ヘッダーがない場合はNone）
+    """
+    if not headers:
+        return None
+    
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    
+    for name in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        seconds = _parse_duration(headers.get(name))
+        if seconds is not None:
+            return seconds
+    return None
+
+def backoff_delay(attempt, base=DEFAULT_BACKOFF_BASE, maximum=DEFAULT_BACKOFF_MAX):
+    """フルジッター付きの指数バックオフ待機秒数を返す"""
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+def _classify_error(error):
+    """例外を (再試行可能か, サーキットの失敗として数えるか, 待機秒数) に分類する"""
+    import openai
+    
+    if isinstance(error, openai.APIConnectionError):
+        # タイムアウトを含む接続エラー
+        return True, True, None
+    if isinstance(error, openai.APIStatusError):
+        status = error.status_code
+        retry_after = get_retry_after(error.response.headers if error.response is not None else None)
+        if status in RETRYABLE_STATUS_CODES:
+            # 429はアップストリームの障害ではないためサーキットの失敗には数えない
+            return True, status != 429, retry_after
+        return False, False, None
+    return False, False, None
+
+def call_with_retry(func, max_retries=DEFAULT_MAX_RETRIES, breaker=None, sleep=time.sleep):
+    """サーキットブレーカーと再試行付きで関数を呼び出す
+    
+    Parameters:
+    -----------
+    func : callable
+        引数なしで呼び出すAPI呼び出し関数
+    max_retries : int
+        最大再試行回数
+    breaker : CircuitBreaker, optional
+        使用するサーキットブレーカー（未指定の場合は共有インスタンス）
+    sleep : callable
+        待機に使用する関数
+    
+    Returns:
+    --------
+    object
+        func の戻り値
+    """
+    breaker = breaker or circuit_breaker
+    attempt = 0
+    
+    while True:
+        breaker.before_call()
+        try:
+            result = func()
+        except Exception as e:
+            retryable, counts_as_failure, retry_after = _classify_error(e)
+            if counts_as_failure:
+                breaker.record_failure()
+            elif retryable:
+                # 429はアップストリーム自体は応答しているため試行枠だけ解放する
+                breaker.release()
+            else:
+                # 4xxエラーはリクエストの問題であり、接続先は正常とみなす
+                breaker.record_success()
+            if not retryable or attempt >= max_retries:
+                raise
+            
+            delay = backoff_delay(attempt)
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, DEFAULT_BACKOFF_MAX))
+            sleep(delay)
+            attempt += 1
+            continue
+        
+        breaker.record_success()
+        return result
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AI分析用のプロンプトをトークン予算内で組み立てるモジュール
+
+- 固定の指示文はシステムメッセージにまとめ、毎回同じ内容・順序で送る（同じデータからは
+  常に同じプロンプトになる）。固定部分は約400トークンで、OpenAIの自動プロンプトキャッシュの
+  対象（1024トークン以上）には届かないため、キャッシュによる割引は前提にしない
+- 可変のデータ部分は区切り文字なしのコンパクトなJSONで末尾に置く
+- トークン数を数え、予算を超える場合は重要度の低い項目から省略する
+"""
+
+import os
+import json
+
+# 固定の指示文（内容を変更した場合は ai_insights.PROMPT_VERSION も更新する）
+SYSTEM_PROMPT = """あなたは健康データ分析の専門家です。科学的根拠に基づいた洞察を提供します。
+ユーザーはFitbitから取得した特定日・特定時間帯の要約統計をJSONで送ります。
+キー: date=対象日, range=対象時間帯, hr=心拍数(mean平均/max最大/min最小/sd標準偏差/span変動範囲, bpm), sleep=睡眠ステージ(main主なステージ/min各ステージの分数/trans遷移回数)。値がnullの項目はデータなしです。
+以下の点について考察してください：
+1. この時間帯のデータが示す健康状態について
+2. 生活習慣や睡眠の質への影響
+3. 健康改善のための具体的な提案（該当する場合）
+4. 特に注目すべきパターンや特徴
+回答は日本語で、科学的根拠に基づいた専門的で分かりやすい内容にしてください。箇条書きも適宜使い、読みやすく構成してください。
+医学的見地からの総合的な考察をお願いします。"""
+
+# システムメッセージとユーザーメッセージを合わせた入力トークンの上限
+DEFAULT_TOKEN_BUDGET = int(os.getenv("AI_PROMPT_TOKEN_BUDGET", "800"))
+
+# チャット形式のメッセージごとに加算されるおおよその制御トークン数
+_MESSAGE_OVERHEAD = 4
+
+_encoding = None
+_encoding_loaded = False
+
+def _get_encoding():
+    """tiktokenがインストールされていればエンコーディングを返す"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = None
+    return _encoding
+
+def count_tokens(text):
+    """テキストのトークン数を数える
+    
+    tiktokenが利用できない場合は、ASCII文字は4文字≒1トークン、
+    それ以外（日本語など）は1文字≒1トークンとして保守的に見積もる。
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+def _compact_json(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+class BuiltPrompt:
+    """組み立てたプロンプトとトークン数"""
+    
+    def __init__(self, system, user, system_tokens, user_tokens, truncated):
+        self.system = system
+        self.user = user
+        self.system_tokens = system_tokens
+        self.user_tokens = user_tokens
+        self.truncated = truncated
+    
+    @property
+    def prompt_tokens(self):
+        """入力トークン数の合計（メッセージの制御トークンを含む）"""
+        return self.system_tokens + self.user_tokens + _MESSAGE_OVERHEAD * 2
+    
+    @property
+    def messages(self):
+        """Chat Completions APIに渡すメッセージ"""
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user}
+        ]
+
+class PromptBuilder:
+    """要約統計からトークン予算内のプロンプトを組み立てるクラス"""
+    
+    def __init__(self, token_budget=DEFAULT_TOKEN_BUDGET, system_prompt=SYSTEM_PROMPT):
+        """
+        初期化
+        
+        Parameters:
+        -----------
+        token_budget : int
+            入力トークン数の上限
+        system_prompt : str
+            固定の指示文
+        """
+        self.token_budget = token_budget
+        self.system_prompt = system_prompt
+        self.system_tokens = count_tokens(system_prompt)
+    
+    @staticmethod
+    def encode_stats(hr_stats, sleep_stats, target_date, time_range):
+        """要約統計を短いキーのdictに変換する（キーの順序は常に同じ）"""
+        hr = None
+        if hr_stats:
+            hr = {
+                "mean": hr_stats.get("平均心拍数"),
+                "max": hr_stats.get("最大心拍数"),
+                "min": hr_stats.get("最小心拍数"),
+                "sd": hr_stats.get("心拍数標準偏差"),
+                "span": hr_stats.get("心拍数変動範囲")
+            }
+        
+        sleep = None
+        if sleep_stats:
+            distribution = sleep_stats.get("睡眠ステージ分布（分）") or {}
+            # 分数の多い順に並べ、同じ分数はステージ名順で安定させる
+            ordered = sorted(distribution.items(), key=lambda x: (-x[1], x[0]))
+            sleep = {
+                "main": sleep_stats.get("主な睡眠ステージ"),
+                "min": {stage: round(minutes) for stage, minutes in ordered},
+                "trans": sleep_stats.get("睡眠ステージ遷移回数")
+            }
+        
+        return {"date": target_date, "range": time_range, "hr": hr, "sleep": sleep}
+    
+    @staticmethod
+    def _reductions():
+        """予算超過時に順に適用する省略（重要度の低いものから）"""
+        def drop_minor_stages(d):
+            if d["sleep"] and len(d["sleep"]["min"]) > 2:
+                d["sleep"]["min"] = dict(list(d["sleep"]["min"].items())[:2])
+            return d
+        
+        def drop_hr_detail(d):
+            if d["hr"]:
+                d["hr"] = {"mean": d["hr"]["mean"], "max": d["hr"]["max"], "min": d["hr"]["min"]}
+            return d
+        
+        def drop_stage_minutes(d):
+            if d["sleep"]:
+                d["sleep"] = {"main": d["sleep"]["main"], "trans": d["sleep"]["trans"]}
+            return d
+        
+        return [drop_minor_stages, drop_hr_detail, drop_stage_minutes]
+    
+    def build(self, hr_stats, sleep_stats, target_date, time_range):
+        """プロンプトを組み立てる
+        
+        Parameters:
+        -----------
+        hr_stats : dict
+            心拍数の要約統計
+        sleep_stats : dict
+            睡眠ステージの要約統計
+        target_date : str
+            対象日
+        time_range : str
+            対象時間帯
+        
+        Returns:
+        --------
+        BuiltPrompt
+            組み立てたプロンプト
+        """
+        data = self.encode_stats(hr_stats, sleep_stats, target_date, time_range)
+        user = _compact_json(data)
+        user_tokens = count_tokens(user)
+        available = self.token_budget - self.system_tokens - _MESSAGE_OVERHEAD * 2
+        truncated = False
+        
+        for reduce in self._reductions():
+            if user_tokens <= available:
+                break
+            data = reduce(data)
+            user = _compact_json(data)
+            user_tokens = count_tokens(user)
+            truncated = True
+        
+        return BuiltPrompt(self.system_prompt, user, self.system_tokens, user_tokens, truncated)
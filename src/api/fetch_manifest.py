@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+取得済みデータの記録（マニフェスト）
+
+データの種類と日付ごとに取得日時を記録し、差分同期で再取得が必要な日だけを選ぶために使用する。
+過去の日は、その日が終わってから十分に時間が経った後に取得していれば確定済みとみなし、再取得しない。
+"""
+
+import os
+import json
+import time
+import threading
+from datetime import datetime, timedelta
+
+MANIFEST_FILENAME = ".fetch_manifest.json"
+CHECKPOINT_FILENAME = ".fetch_checkpoint.json"
+
+# 日付が変わってからこの時間が経過した後に取得したデータは確定済みとみなす
+# （デバイスの同期が遅れた分がAPIに反映されるまでの猶予）
+FINALIZE_AFTER = timedelta(hours=int(os.getenv("FITBIT_FINALIZE_AFTER_HOURS", "24")))
+
+# ファイル名の接頭辞（fitbit_data_api の保存形式に合わせる）
+FILE_PREFIXES = {
+    "activity": "activity_",
+    "sleep": "sleep_",
+    "heart_rate": "heart_rate_",
+    "spo2": "spo2_",
+}
+
+class FetchManifest:
+    """データの種類・日付ごとの取得日時を記録するマニフェスト"""
+    
+    def __init__(self, output_dir):
+        """
+        初期化
+        
+        Parameters:
+        -----------
+        output_dir : str
+            データの保存先ディレクトリ（マニフェストもここに保存する）
+        """
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_FILENAME)
+        self._lock = threading.Lock()
+        self.entries = self._load()
+    
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f).get("entries", {})
+        except (OSError, ValueError) as e:
+            print(f"警告: マニフェスト {self.path} を読み込めませんでした: {str(e)}")
+            return {}
+    
+    def save(self):
+        """マニフェストを保存する（一時ファイルに書き込んでから置き換える）"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        with self._lock:
+            payload = {"version": 1, "entries": self.entries}
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(temp_path, self.path)
+    
+    def record(self, kind, date, fetched_at=None):
+        """取得したことを記録する
+        
+        Parameters:
+        -----------
+        kind : str
+            データの種類（activity, sleep, heart_rate）
+        date : str
+            対象日（YYYY-MM-DD）
+        fetched_at : datetime, optional
+            取得日時（未指定の場合は現在時刻）
+        """
+        fetched_at = fetched_at or datetime.now()
+        with self._lock:
+            self.entries.setdefault(kind, {})[date] = fetched_at.strftime("%Y-%m-%d %H:%M:%S")
+    
+    def fetched_at(self, kind, date):
+        """取得日時を返す（記録がない場合はNone）"""
+        with self._lock:
+            value = self.entries.get(kind, {}).get(date)
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S") if value else None
+    
+    def is_final(self, kind, date):
+        """確定済み（再取得の必要がない）かどうかを返す"""
+        fetched_at = self.fetched_at(kind, date)
+        if fetched_at is None:
+            return False
+        day_end = datetime.strptime(date, "%Y-%m-%d") + timedelta(days=1)
+        return fetched_at >= day_end + FINALIZE_AFTER
+    
+    def adopt_existing_files(self, kinds):
+        """マニフェスト導入前に保存されたファイルを、更新日時を取得日時として登録する"""
+        if not os.path.isdir(self.output_dir):
+            return 0
+        adopted = 0
+        for filename in os.listdir(self.output_dir):
+            for kind in kinds:
+                prefix = FILE_PREFIXES.get(kind)
+                if not prefix or not filename.startswith(prefix) or not filename.endswith(".json"):
+                    continue
+                date = filename[len(prefix):-len(".json")]
+                try:
+                    datetime.strptime(date, "%Y-%m-%d")
+                except ValueError:
+                    continue
+                if self.fetched_at(kind, date) is None:
+                    mtime = os.path.getmtime(os.path.join(self.output_dir, filename))
+                    self.record(kind, date, datetime.fromtimestamp(mtime))
+                    adopted += 1
+        return adopted
+    
+    def pending(self, kinds, dates):
+        """取得が必要な (データの種類, 日付) を返す
+        
+        未取得の日（欠損）と、取得済みでも確定していない日（今日や直近の日）が対象になる。
+        
+        Parameters:
+        -----------
+        kinds : list
+            データの種類のリスト
+        dates : list
+            対象日のリスト
+        
+        Returns:
+        --------
+        list
+            取得が必要な (データの種類, 日付) のリスト
+        """
+        return [(kind, date) for date in dates for kind in kinds if not self.is_final(kind, date)]
+
+class FetchCheckpoint:
+    """取得ジョブの進捗を (データの種類, 日付) 単位で記録するチェックポイント
+    
+    ジョブが途中で止まった場合（通信エラー・トークン切れ・中断など）でも、
+    完了済みのデータを除いて停止した位置から再開できる。
+    """
+    
+    def __init__(self, output_dir, save_interval=5.0):
+        """
+        初期化
+        
+        Parameters:
+        -----------
+        output_dir : str
+            データの保存先ディレクトリ（チェックポイントもここに保存する）
+        save_interval : float
+            進捗を保存する最小間隔（秒）
+        """
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, CHECKPOINT_FILENAME)
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+        self.tasks = []
+        self.done = set()
+    
+    def exists(self):
+        """保存されたチェックポイントがあるかどうか"""
+        return os.path.exists(self.path)
+    
+    def load(self):
+        """保存されたチェックポイントを読み込む
+        
+        Returns:
+        --------
+        bool
+            読み込めた場合はTrue
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"警告: チェックポイント {self.path} を読み込めませんでした: {str(e)}")
+            return False
+        self.tasks = [tuple(task) for task in payload.get("tasks", [])]
+        self.done = {tuple(task) for task in payload.get("done", [])}
+        return True
+    
+    def start(self, tasks):
+        """新しいジョブを開始する"""
+        self.tasks = list(tasks)
+        self.done = set()
+        self.save(force=True)
+    
+    def pending(self):
+        """未完了の (データの種類, 日付) を返す"""
+        return [task for task in self.tasks if task not in self.done]
+    
+    def mark_done(self, kind, date):
+        """完了を記録する（一定間隔ごとにファイルへ保存する）"""
+        with self._lock:
+            self.done.add((kind, date))
+        self.save()
+    
+    def save(self, force=False):
+        """進捗を保存する（一時ファイルに書き込んでから置き換える）"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._saved_at < self.save_interval:
+                return
+            self._saved_at = now
+            payload = {
+                "version": 1,
+                "tasks": [list(task) for task in self.tasks],
+                "done": sorted(list(task) for task in self.done),
+            }
+            os.makedirs(self.output_dir, exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+    
+    def finish(self):
+        """すべて完了した場合はチェックポイントを削除し、未完了があれば保存する
+        
+        Returns:
+        --------
+        bool
+            すべて完了した場合はTrue
+        """
+        if self.pending():
+            self.save(force=True)
+            return False
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        return True
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Fitbit Web APIのHTTPクライアント
+
+keep-alive接続プール付きのセッションを再利用し、タイムアウトとgzip圧縮を設定する。
+"""
+
+import os
+import json
+import time
+import base64
+import random
+import hashlib
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.utils.rate_limiter import FitbitRateLimiter
+from src.api.response_cache import ResponseCache
+
+DEFAULT_BASE_URL = "https://api.fitbit.com"
+DEFAULT_CONNECT_TIMEOUT = float(os.getenv("FITBIT_CONNECT_TIMEOUT", "5"))
+DEFAULT_READ_TIMEOUT = float(os.getenv("FITBIT_READ_TIMEOUT", "30"))
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_RETRIES = int(os.getenv("FITBIT_MAX_RETRIES", "4"))
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_MAX = 60.0
+
+# 再試行するHTTPステータスコード（401などの認証エラーは再試行しない）
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+def backoff_delay(attempt, base=DEFAULT_BACKOFF_BASE, maximum=DEFAULT_BACKOFF_MAX):
+    """フルジッター付きの指数バックオフ待機秒数を返す"""
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+def get_retry_after(headers, status_code=None):
+    """Retry-Afterヘッダーから待機秒数を返す
+    
+    fitbit-rate-limit-reset は1時間ごとの上限のリセットまでの秒数（すべてのレスポンスに付く）のため、
+    429（レート制限超過）の場合だけ Retry-After の代わりに使う。
+    """
+    names = ("retry-after", "fitbit-rate-limit-reset") if status_code == 429 else ("retry-after",)
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            continue
+    return None
+
+def token_user_id(access_token):
+    """アクセストークンのユーザーIDを返す（レスポンスキャッシュのキーに使う）
+    
+    Fitbitのアクセストークンは JWT で、sub クレームがユーザーID（encodedId）になる。
+    JWT として読めないトークンはハッシュ値で代用する（トークンを更新すると別のユーザー扱いになる）。
+    """
+    if not access_token:
+        return None
+    try:
+        payload = access_token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        if claims.get("sub"):
+            return str(claims["sub"])
+    except (IndexError, ValueError, AttributeError):
+        pass
+    return "token:" + hashlib.sha256(access_token.encode("utf-8")).hexdigest()[:16]
+
+def _bearer_token(headers):
+    """Authorizationヘッダーの Bearer トークンを返す（なければNone）"""
+    for name, value in headers.items():
+        if name.lower() == "authorization" and isinstance(value, str) and value.lower().startswith("bearer "):
+            return value[len("bearer "):].strip() or None
+    return None
+
+def _cached_response(url, status_code, content_type, body):
+    """キャッシュした本文から requests.Response を組み立てる"""
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = url
+    response._content = body
+    response.encoding = "utf-8"
+    response.headers["Content-Type"] = content_type or "application/json"
+    response.headers["X-Cache"] = "HIT"
+    return response
+
+class FitbitClient:
+    """Fitbit Web APIにアクセスするクライアント"""
+    
+    def __init__(self, access_token=None, base_url=None, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, pool_size=DEFAULT_POOL_SIZE, rate_limiter=None,
+                 max_retries=DEFAULT_MAX_RETRIES, sleep=time.sleep, token_manager=None, response_cache=None,
+                 user_id=None):
+        """
+        初期化
+        
+        Parameters:
+        -----------
+        access_token : str, optional
+            アクセストークン（リクエストごとに指定することもできる）
+        base_url : str, optional
+            APIのベースURL（未指定の場合は環境変数 FITBIT_API_BASE_URL、それもなければ本番API）
+        connect_timeout : float
+            接続タイムアウト秒数（デフォルトは環境変数 FITBIT_CONNECT_TIMEOUT、なければ5秒）
+        read_timeout : float
+            読み取りタイムアウト秒数（デフォルトは環境変数 FITBIT_READ_TIMEOUT、なければ30秒）
+        pool_size : int
+            接続プールの最大接続数（並行して取得するスレッド数以上にする）
+        rate_limiter : FitbitRateLimiter, optional
+            送信を制御するレート制限（未指定の場合は制限しない）
+        max_retries : int
+            通信エラー・429・5xxの場合の最大再試行回数
+        sleep : callable
+            待機に使用する関数
+        token_manager : TokenManager, optional
+            指定した場合はアクセストークンを有効期限前に自動更新し、401の場合は更新して1回だけ再試行する
+        response_cache : ResponseCache, optional
+            成功したレスポンスを保存するキャッシュ（未指定の場合はキャッシュしない）
+        user_id : str, optional
+            キャッシュのキーに含めるユーザーID（プロフィールの encodedId など）。
+            未指定の場合はリクエストに使うアクセストークン（Authorizationヘッダー）から求め、
+            求められない場合はキャッシュを使わない
+        """
+        self.access_token = access_token
+        self.base_url = (base_url or os.getenv("FITBIT_API_BASE_URL", DEFAULT_BASE_URL)).rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self.token_manager = token_manager
+        self.response_cache = response_cache
+        self.user_id = user_id
+        # 直近のレスポンスが401（トークン切れなど）だったかどうか
+        self.unauthorized = False
+        # 直近のレスポンスの fitbit-rate-limit-* ヘッダーの値
+        self.rate_limit = {}
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        })
+    
+    def url(self, path):
+        """APIパス（例: /1/user/-/profile.json）から完全なURLを作成する"""
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+    
+    def get(self, path, access_token=None, params=None, headers=None, use_cache=True):
+        """GETリクエストを送信する
+        
+        Parameters:
+        -----------
+        path : str
+            APIパスまたは完全なURL
+        access_token : str, optional
+            このリクエストで使用するアクセストークン
+        params : dict, optional
+            クエリパラメータ
+        headers : dict, optional
+            追加のリクエストヘッダー
+        use_cache : bool
+            レスポンスキャッシュを使用するかどうか
+        
+        Returns:
+        --------
+        requests.Response
+            レスポンス
+        """
+        url = self.url(path)
+        if self.token_manager is not None:
+            token = self.token_manager.get_access_token() or access_token
+        else:
+            token = access_token or self.access_token
+        
+        request_headers = {"Authorization": f"Bearer {token}"} if token else {}
+        request_headers.update(headers or {})
+        
+        # キャッシュのキーには実際に送信するトークン（headers で指定された場合はそちら）のユーザーを使い、
+        # ユーザーを特定できない場合はキャッシュしない
+        user = self.user_id or token_user_id(_bearer_token(request_headers))
+        cache = self.response_cache if use_cache and user is not None else None
+        if cache is not None:
+            cached = cache.get(url, params, user)
+            if cached is not None:
+                return _cached_response(url, *cached)
+        
+        attempt = 0
+        token_refreshed = False
+        while True:
+            try:
+                response = self._send(url, request_headers, params)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                print(f"通信エラーのため{delay:.1f}秒後に再試行します ({attempt + 1}/{self.max_retries}): {str(e)}")
+            else:
+                if response.status_code == 401 and self.token_manager is not None and not token_refreshed:
+                    # トークン切れの場合は更新して1回だけ再試行する
+                    token_refreshed = True
+                    new_token = self.token_manager.refresh(stale_token=token)
+                    if new_token:
+                        token = new_token
+                        request_headers["Authorization"] = f"Bearer {token}"
+                        continue
+                self.unauthorized = response.status_code == 401
+                if response.status_code == 200 and cache is not None:
+                    cache.put(url, params, response.status_code, response.headers.get("Content-Type"), response.content,
+                              user=user)
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                    return response
+                if response.status_code == 429 and self.rate_limiter is not None:
+                    # レート制限側がリセットまで送信を止めるので、ここでは待機しない
+                    delay = 0.0
+                else:
+                    retry_after = get_retry_after(response.headers, response.status_code)
+                    if retry_after is not None:
+                        delay = min(retry_after, DEFAULT_BACKOFF_MAX)
+                    else:
+                        delay = backoff_delay(attempt)
+                print(f"HTTP {response.status_code} のため{delay:.1f}秒後に再試行します ({attempt + 1}/{self.max_retries})")
+            
+            self.sleep(delay)
+            attempt += 1
+    
+    def _send(self, url, headers, params):
+        if self.rate_limiter is None:
+            response = self.session.get(url, headers=headers, params=params, timeout=self.timeout)
+        else:
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.get(url, headers=headers, params=params, timeout=self.timeout)
+            finally:
+                self.rate_limiter.release()
+            self.rate_limiter.observe(response.headers, response.status_code)
+        
+        self._record_rate_limit(response.headers)
+        return response
+    
+    def _record_rate_limit(self, headers):
+        for name in ("limit", "remaining", "reset"):
+            value = headers.get(f"fitbit-rate-limit-{name}")
+            if value is not None:
+                self.rate_limit[name] = value
+    
+    def close(self):
+        """セッションを閉じる"""
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def get_default_client():
+    """プロセス内で共有する FitbitClient を返す
+    
+    1時間あたりのリクエスト数の上限は環境変数 FITBIT_REQUESTS_PER_HOUR で変更できる（デフォルト: 150）。
+    レスポンスキャッシュは環境変数 FITBIT_RESPONSE_CACHE=0 で無効にできる。
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            requests_per_hour = int(os.getenv("FITBIT_REQUESTS_PER_HOUR", "150"))
+            response_cache = None
+            if os.getenv("FITBIT_RESPONSE_CACHE", "1") != "0":
+                try:
+                    response_cache = ResponseCache()
+                except Exception as e:
+                    print(f"警告: レスポンスキャッシュを初期化できませんでした（キャッシュなしで続行します）: {str(e)}")
+            _default_client = FitbitClient(
+                rate_limiter=FitbitRateLimiter(requests_per_hour),
+                response_cache=response_cache
+            )
+        return _default_client
+
+def set_default_client(client):
+    """プロセス内で共有する FitbitClient を差し替える（ベンチマークなどで使用する）
+    
+    Returns:
+    --------
+    FitbitClient or None
+        差し替える前のクライアント
+    """
+    global _default_client
+    with _default_client_lock:
+        previous = _default_client
+        _default_client = client
+        return previous
@@ -7,11 +7,18 @@ FitbitのAPIを使用してユーザーのデータを取得するスクリプ
 
 import os
 import json
-import requests
+import time
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import argparse
 import traceback  # 追加: スタックトレースを出力するため
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src.api.fitbit_client import get_default_client
+from src.api.fetch_manifest import FetchManifest, FetchCheckpoint
+from src.api.token_store import TokenManager
+from src.data.raw_store import RawStore
 
 # .envファイルから環境変数を読み込む
 load_dotenv()
@@ -39,16 +46,42 @@ def check_token_expiration():
     
     return True
 
+def create_token_manager():
+    """自動更新用の TokenManager を作成する（クライアントIDとシークレットがない場合はNone）"""
+    client_id = os.getenv("FITBIT_CLIENT_ID")
+    client_secret = os.getenv("FITBIT_CLIENT_SECRET")
+    if not client_id or not client_secret:
+        return None
+    return TokenManager(client_id, client_secret)
+
+def prepare_access_token():
+    """共有クライアントで使用するアクセストークンを返す（取得できない場合はNone）
+    
+    クライアントIDとシークレットがあれば TokenManager を共有クライアントに設定し、期限前に自動更新する。
+    なければ環境変数 FITBIT_ACCESS_TOKEN を使用する。
+    """
+    token_manager = create_token_manager()
+    if token_manager is not None:
+        get_default_client().token_manager = token_manager
+        access_token = token_manager.get_access_token()
+    else:
+        access_token = os.getenv("FITBIT_ACCESS_TOKEN")
+        if access_token and not check_token_expiration():
+            return None
+    if not access_token:
+        print("エラー: アクセストークンを取得できませんでした")
+        print("fitbit_token_exchange.pyを実行してトークンを取得してください")
+        return None
+    return access_token
+
 def get_profile(access_token):
     """ユーザープロファイル情報を取得する"""
-    url = "https://api.fitbit.com/1/user/-/profile.json"
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
+    client = get_default_client()
+    url = client.url("/1/user/-/profile.json")
     
     try:  # 追加: try-exceptでエラーをキャッチ
         print(f"APIリクエスト: {url}")
-        response = requests.get(url, headers=headers)
+        response = client.get(url, access_token)
         
         if response.status_code != 200:
             print(f"エラー: プロファイル情報の取得に失敗しました (HTTP {response.status_code})")
@@ -63,14 +96,12 @@ def get_profile(access_token):
 
 def get_activity_data(access_token, date="today"):
     """指定日のアクティビティデータを取得する"""
-    url = f"https://api.fitbit.com/1/user/-/activities/date/{date}.json"
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
+    client = get_default_client()
+    url = client.url(f"/1/user/-/activities/date/{date}.json")
     
     try:
         print(f"APIリクエスト: {url}")
-        response = requests.get(url, headers=headers)
+        response = client.get(url, access_token)
         
         if response.status_code != 200:
             print(f"エラー: アクティビティデータの取得に失敗しました (HTTP {response.status_code})")
@@ -85,14 +116,12 @@ def get_activity_data(access_token, date="today"):
 
 def get_sleep_data(access_token, date="today"):
     """指定日の睡眠データを取得する"""
-    url = f"https://api.fitbit.com/1.2/user/-/sleep/date/{date}.json"
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
+    client = get_default_client()
+    url = client.url(f"/1.2/user/-/sleep/date/{date}.json")
     
     try:
         print(f"APIリクエスト: {url}")
-        response = requests.get(url, headers=headers)
+        response = client.get(url, access_token)
         
         if response.status_code != 200:
             print(f"エラー: 睡眠データの取得に失敗しました (HTTP {response.status_code})")
@@ -107,14 +136,12 @@ def get_sleep_data(access_token, date="today"):
 
 def get_heart_rate_data(access_token, date="today"):
     """指定日の心拍数データを取得する"""
-    url = f"https://api.fitbit.com/1/user/-/activities/heart/date/{date}/1d.json"
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
+    client = get_default_client()
+    url = client.url(f"/1/user/-/activities/heart/date/{date}/1d.json")
     
     try:
         print(f"APIリクエスト: {url}")
-        response = requests.get(url, headers=headers)
+        response = client.get(url, access_token)
         
         if response.status_code != 200:
             print(f"エラー: 心拍数データの取得に失敗しました (HTTP {response.status_code})")
@@ -127,12 +154,89 @@ def get_heart_rate_data(access_token, date="today"):
         traceback.print_exc()
         return None
 
+def get_spo2_data(access_token, date="today"):
+    """指定日のSpO2（睡眠中の1分ごとの値）を取得する"""
+    client = get_default_client()
+    url = client.url(f"/1/user/-/spo2/date/{date}/all.json")
+    
+    try:
+        print(f"APIリクエスト: {url}")
+        response = client.get(url, access_token)
+        
+        if response.status_code != 200:
+            print(f"エラー: SpO2データの取得に失敗しました (HTTP {response.status_code})")
+            print(f"レスポンス: {response.text}")
+            return None
+        
+        return response.json()
+    except Exception as e:
+        print(f"例外が発生しました: {str(e)}")
+        traceback.print_exc()
+        return None
+
+def get_time_series(access_token, path, label):
+    """期間指定のエンドポイントからデータを取得する"""
+    client = get_default_client()
+    url = client.url(path)
+    
+    try:
+        print(f"APIリクエスト: {url}")
+        response = client.get(url, access_token)
+        
+        if response.status_code != 200:
+            print(f"エラー: {label}の取得に失敗しました (HTTP {response.status_code})")
+            print(f"レスポンス: {response.text}")
+            return None
+        
+        return response.json()
+    except Exception as e:
+        print(f"例外が発生しました: {str(e)}")
+        traceback.print_exc()
+        return None
+
 def save_data_to_file(data, filename):
     """データをJSONファイルに保存する"""
     with open(filename, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
     print(f"データを{filename}に保存しました")
 
+# --format packed の場合に使用する圧縮ストア
+_raw_store = None
+
+# JSON形式で保存する場合に、既存のパック形式のデータへ追記するためのストア（ディレクトリごと）
+_existing_packed_stores = {}
+_existing_packed_lock = threading.Lock()
+
+def use_packed_store(output_dir):
+    """以降の日ごとのデータを月ごとの圧縮セグメントに保存する"""
+    global _raw_store
+    _raw_store = RawStore(output_dir)
+    return _raw_store
+
+def _existing_packed_store(output_dir):
+    """保存先にパック形式のデータがあればそのストアを返す（なければNone）"""
+    if not RawStore.exists(output_dir):
+        return None
+    with _existing_packed_lock:
+        store = _existing_packed_stores.get(output_dir)
+        if store is None:
+            store = _existing_packed_stores[output_dir] = RawStore(output_dir)
+        return store
+
+def save_daily(data, kind, date, output_dir):
+    """1日分のデータを保存する（パック形式の場合は圧縮セグメントに追記する）
+    
+    JSON形式で保存する場合も、保存先にパック形式のデータがあれば同じ内容を追記する
+    （読み込み側はパック形式を優先するため、JSONファイルだけを更新すると古いデータが読まれ続ける）。
+    """
+    if _raw_store is not None:
+        _raw_store.put(kind, date, data)
+    else:
+        save_data_to_file(data, f"{output_dir}/{kind}_{date}.json")
+        packed_store = _existing_packed_store(output_dir)
+        if packed_store is not None:
+            packed_store.put(kind, date, data)
+
 def get_date_range(end_date, days):
     """指定された終了日から指定された日数分の日付範囲を生成する"""
     if end_date == "today":
@@ -147,31 +251,333 @@ def get_date_range(end_date, days):
     
     return date_list
 
+def fetch_activity(access_token, date, output_dir):
+    """アクティビティデータを取得して保存する"""
+    activity_data = get_activity_data(access_token, date)
+    if activity_data:
+        summary = activity_data.get("summary", {})
+        steps = summary.get("steps", 0)
+        print(f"{date} 歩数: {steps} 歩")
+        save_daily(activity_data, "activity", date, output_dir)
+    return activity_data is not None
+
+def fetch_sleep(access_token, date, output_dir):
+    """睡眠データを取得して保存する"""
+    sleep_data = get_sleep_data(access_token, date)
+    if sleep_data:
+        if sleep_data.get("sleep"):
+            sleep_minutes = sum(item.get("minutesAsleep", 0) for item in sleep_data.get("sleep", []))
+            print(f"{date} 睡眠時間: {sleep_minutes//60}時間{sleep_minutes%60}分")
+        else:
+            print(f"{date} この日の睡眠データはありません")
+        save_daily(sleep_data, "sleep", date, output_dir)
+    return sleep_data is not None
+
+def fetch_heart_rate(access_token, date, output_dir):
+    """心拍数データを取得して保存する"""
+    heart_rate_data = get_heart_rate_data(access_token, date)
+    if heart_rate_data:
+        zones = heart_rate_data.get("activities-heart", [{}])[0].get("value", {}).get("heartRateZones", [])
+        if zones:
+            resting_hr = heart_rate_data.get("activities-heart", [{}])[0].get("value", {}).get("restingHeartRate")
+            if resting_hr:
+                print(f"{date} 安静時心拍数: {resting_hr} bpm")
+            else:
+                print(f"{date} この日の安静時心拍数データはありません")
+        else:
+            print(f"{date} この日の心拍数データはありません")
+        save_daily(heart_rate_data, "heart_rate", date, output_dir)
+    return heart_rate_data is not None
+
+def fetch_spo2(access_token, date, output_dir):
+    """SpO2データを取得して保存する"""
+    spo2_data = get_spo2_data(access_token, date)
+    if spo2_data:
+        minutes = spo2_data.get("minutes", [])
+        if minutes:
+            print(f"{date} SpO2: {len(minutes)}分")
+        else:
+            print(f"{date} この日のSpO2データはありません")
+        save_daily(spo2_data, "spo2", date, output_dir)
+    return spo2_data is not None
+
+# データの種類ごとの取得関数
+FETCHERS = {
+    "activity": fetch_activity,
+    "sleep": fetch_sleep,
+    "heart_rate": fetch_heart_rate,
+    "spo2": fetch_spo2,
+}
+
+# 1日あたりにデフォルトで取得するデータの種類（ダッシュボードが使うもの）
+DEFAULT_KINDS = ("activity", "sleep", "heart_rate")
+
+# --metrics で追加できるデータの種類（spo2 は oxygen_saturation スコープが必要で、分単位ストア向け）
+OPTIONAL_KINDS = ("spo2",)
+
+# fetch_bulk が保存できるデータの種類（期間指定エンドポイントのないものは含まない）
+BULK_KINDS = ("activity", "sleep", "heart_rate")
+
+def fetch_date_range(access_token, date_range, output_dir, workers=4, tasks=None, manifest=None, checkpoint=None,
+                     kinds=DEFAULT_KINDS):
+    """日付範囲のデータを並行して取得する
+    
+    リクエストは共有クライアントのレート制限（Fitbitの1時間あたりの上限）に従って送信される。
+    
+    Parameters:
+    -----------
+    access_token : str
+        アクセストークン
+    date_range : list
+        取得する日付のリスト
+    output_dir : str
+        データの保存先ディレクトリ
+    workers : int
+        同時に実行するリクエスト数
+    tasks : list, optional
+        取得する (データの種類, 日付) のリスト（未指定の場合は date_range の全データ）
+    manifest : FetchManifest, optional
+        取得に成功したデータを記録するマニフェスト
+    checkpoint : FetchCheckpoint, optional
+        完了したデータを記録するチェックポイント（中断後の再開に使用）
+    kinds : tuple
+        tasks を指定しない場合に取得するデータの種類
+    
+    Returns:
+    --------
+    dict
+        取得に失敗した (データの種類, 日付) のリスト・未実行の件数・所要時間
+    """
+    if tasks is None:
+        tasks = [(kind, date) for date in date_range for kind in kinds]
+    failed = []
+    aborted = False
+    started = time.perf_counter()
+    client = get_default_client()
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(FETCHERS[kind], access_token, date, output_dir): (kind, date)
+            for kind, date in tasks
+        }
+        try:
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                kind, date = futures[future]
+                try:
+                    if not future.result():
+                        failed.append((kind, date))
+                    else:
+                        if manifest is not None:
+                            manifest.record(kind, date)
+                        if checkpoint is not None:
+                            checkpoint.mark_done(kind, date)
+                except Exception as e:
+                    print(f"{date}の{kind}データの取得中に例外が発生しました: {str(e)}")
+                    failed.append((kind, date))
+                
+                if client.unauthorized and not aborted:
+                    # トークン切れの場合は残りのリクエストも失敗するため中止する
+                    print("エラー: 認証に失敗したため取得を中止します（トークンを更新して --resume で再開できます）")
+                    aborted = True
+                    for f in futures:
+                        f.cancel()
+        except KeyboardInterrupt:
+            for f in futures:
+                f.cancel()
+            print("\n中断しました（--resume で続きから再開できます）")
+    skipped = sum(1 for f in futures if f.cancelled())
+    
+    return {
+        "requests": len(tasks),
+        "failed": sorted(failed),
+        "skipped": skipped,
+        "elapsed_seconds": round(time.perf_counter() - started, 1)
+    }
+
+# 期間指定エンドポイントで1回のリクエストで取得できる最大日数
+RANGE_LIMITS = {
+    "steps": 1095,
+    "activityCalories": 1095,
+    "heart": 365,
+    "sleep": 100,
+}
+
+def split_date_range(start_date, end_date, max_days):
+    """開始日から終了日までを最大max_days日ずつの期間に分割する"""
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    chunks = []
+    while start <= end:
+        chunk_end = min(end, start + timedelta(days=max_days - 1))
+        chunks.append((start.strftime("%Y-%m-%d"), chunk_end.strftime("%Y-%m-%d")))
+        start = chunk_end + timedelta(days=1)
+    return chunks
+
+def fetch_bulk(access_token, start_date, end_date, output_dir, workers=4, manifest=None):
+    """期間指定エンドポイントでまとめて取得し、日ごとのファイルに分けて保存する
+    
+    歩数・活動カロリー・安静時心拍数・睡眠を期間単位で取得するため、1日ごとに取得する場合に比べて
+    リクエスト数が大幅に少なくなる。保存するファイルはダッシュボードが読み込む項目を含む
+    activity_{date}.json / heart_rate_{date}.json / sleep_{date}.json の形式になる。
+    
+    Parameters:
+    -----------
+    access_token : str
+        アクセストークン
+    start_date : str
+        開始日（YYYY-MM-DD）
+    end_date : str
+        終了日（YYYY-MM-DD）
+    output_dir : str
+        データの保存先ディレクトリ
+    workers : int
+        同時に実行するリクエスト数
+    manifest : FetchManifest, optional
+        保存したデータを記録するマニフェスト
+    
+    Returns:
+    --------
+    dict
+        リクエスト数・保存した日数・取得に失敗した期間・所要時間
+    """
+    paths = {
+        "steps": "/1/user/-/activities/steps/date/{start}/{end}.json",
+        "activityCalories": "/1/user/-/activities/activityCalories/date/{start}/{end}.json",
+        "heart": "/1/user/-/activities/heart/date/{start}/{end}.json",
+        "sleep": "/1.2/user/-/sleep/date/{start}/{end}.json",
+    }
+    tasks = [
+        (resource, start, end)
+        for resource, max_days in RANGE_LIMITS.items()
+        for start, end in split_date_range(start_date, end_date, max_days)
+    ]
+    started = time.perf_counter()
+    
+    results = {resource: [] for resource in RANGE_LIMITS}
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(get_time_series, access_token, paths[resource].format(start=start, end=end), resource): (resource, start, end)
+            for resource, start, end in tasks
+        }
+        for future in as_completed(futures):
+            resource, start, end = futures[future]
+            data = future.result()
+            if data is None:
+                failed.append((resource, start, end))
+            else:
+                results[resource].append(data)
+    
+    # 日付ごとに振り分ける
+    days = {}
+    def day(date):
+        return days.setdefault(date, {"summary": {}, "heart": None, "sleep": []})
+    
+    for data in results["steps"]:
+        for item in data.get("activities-steps", []):
+            day(item["dateTime"])["summary"]["steps"] = int(float(item.get("value", 0)))
+    for data in results["activityCalories"]:
+        for item in data.get("activities-activityCalories", []):
+            day(item["dateTime"])["summary"]["activityCalories"] = int(float(item.get("value", 0)))
+    for data in results["heart"]:
+        for item in data.get("activities-heart", []):
+            day(item["dateTime"])["heart"] = item
+    for data in results["sleep"]:
+        for item in data.get("sleep", []):
+            day(item["dateOfSleep"])["sleep"].append(item)
+    
+    def saved(kind, date):
+        if manifest is not None:
+            manifest.record(kind, date)
+    
+    failed_resources = {resource for resource, _, _ in failed}
+    for date, values in sorted(days.items()):
+        if values["summary"] and not failed_resources & {"steps", "activityCalories"}:
+            save_daily({"summary": values["summary"]}, "activity", date, output_dir)
+            saved("activity", date)
+        if values["heart"] is not None:
+            save_daily({"activities-heart": [values["heart"]]}, "heart_rate", date, output_dir)
+            saved("heart_rate", date)
+    
+    # 睡眠は記録のない日も空のファイルを保存する（日単位で取得した場合と同じ扱い）
+    if "sleep" not in failed_resources:
+        for date, _ in split_date_range(start_date, end_date, 1):
+            sleep_items = days.get(date, {}).get("sleep", [])
+            save_daily({"sleep": sleep_items}, "sleep", date, output_dir)
+            saved("sleep", date)
+    
+    return {
+        "requests": len(tasks),
+        "days": len(days),
+        "failed": sorted(failed),
+        "elapsed_seconds": round(time.perf_counter() - started, 1)
+    }
+
 def main():
     parser = argparse.ArgumentParser(description="FitbitのAPIからデータを取得するスクリプト")
     parser.add_argument("--date", default="today", help="取得する日付（例: 2023-01-01、デフォルト: today）")
     parser.add_argument("--days", type=int, default=1, help="取得する日数（過去に遡る日数、デフォルト: 1）")
     parser.add_argument("--output-dir", default="data", help="データの保存先ディレクトリ（デフォルト: data）")
+    parser.add_argument("--workers", type=int, default=4, help="同時に実行するリクエスト数（デフォルト: 4）")
+    parser.add_argument("--bulk", action="store_true", help="期間指定エンドポイントでまとめて取得する（日数が多い場合に推奨）")
+    parser.add_argument("--sync", action="store_true", help="差分同期: 今日・未確定の日・未取得の日だけを取得する")
+    parser.add_argument("--resume", action="store_true", help="前回中断したジョブをチェックポイントから再開する")
+    parser.add_argument("--no-cache", action="store_true", help="レスポンスキャッシュを使わずにAPIから取得する")
+    parser.add_argument("--format", choices=["json", "packed"], default="json",
+                        help="保存形式（json: 日ごとのJSONファイル、packed: 月ごとの圧縮セグメント、デフォルト: json）")
+    parser.add_argument("--metrics", default="",
+                        help=f"追加で日ごとに取得するデータをカンマ区切りで指定（{', '.join(OPTIONAL_KINDS)}、--bulk では取得されません）")
     args = parser.parse_args()
     
     print("=== Fitbit Data API Tool ===")
     
-    # アクセストークンの取得と有効期限チェック
-    access_token = os.getenv("FITBIT_ACCESS_TOKEN")
-    if not access_token:
-        print("エラー: FITBIT_ACCESS_TOKENが.envファイルにありません")
-        print("fitbit_token_exchange.pyを実行してトークンを取得してください")
+    metrics = [metric.strip() for metric in args.metrics.split(",") if metric.strip()]
+    unknown = [metric for metric in metrics if metric not in OPTIONAL_KINDS]
+    if unknown:
+        print(f"エラー: 不明なデータの種類です: {', '.join(unknown)}（{', '.join(OPTIONAL_KINDS)}）")
         return
+    kinds = DEFAULT_KINDS + tuple(metric for metric in OPTIONAL_KINDS if metric in metrics)
+    if args.bulk:
+        skipped = [kind for kind in kinds if kind not in BULK_KINDS]
+        if skipped:
+            print(f"警告: --bulk では {', '.join(skipped)} を取得できないため、対象から外します")
+        kinds = tuple(kind for kind in kinds if kind in BULK_KINDS)
     
-    print(f"アクセストークン: {access_token[:10]}... (長さ: {len(access_token)}文字)")  # 追加: トークン情報を表示
+    if args.no_cache:
+        get_default_client().response_cache = None
     
-    # トークンの有効期限チェック
-    if not check_token_expiration():
-        return
+    # クライアントIDとシークレットがあれば、期限切れ前にトークンを自動更新する
+    token_manager = create_token_manager()
+    if token_manager is not None:
+        get_default_client().token_manager = token_manager
+        access_token = token_manager.get_access_token()
+        if not access_token:
+            print("エラー: アクセストークンを取得できませんでした")
+            print("fitbit_token_exchange.pyを実行してトークンを取得してください")
+            return
+        print(f"アクセストークン: {access_token[:10]}... (長さ: {len(access_token)}文字、期限前に自動更新します)")
+    else:
+        # アクセストークンの取得と有効期限チェック
+        access_token = os.getenv("FITBIT_ACCESS_TOKEN")
+        if not access_token:
+            print("エラー: FITBIT_ACCESS_TOKENが.envファイルにありません")
+            print("fitbit_token_exchange.pyを実行してトークンを取得してください")
+            return
+        
+        print(f"アクセストークン: {access_token[:10]}... (長さ: {len(access_token)}文字)")  # 追加: トークン情報を表示
+        
+        # トークンの有効期限チェック
+        if not check_token_expiration():
+            return
     
     try:  # 追加: 全体をtry-exceptで囲む
         # 出力ディレクトリの作成
         os.makedirs(args.output_dir, exist_ok=True)
+        if args.format == "packed":
+            store = use_packed_store(args.output_dir)
+            print(f"保存形式: packed（{store.codec}圧縮, {store.root}）")
         
         # ユーザープロファイルの取得
         print("\nユーザープロファイルを取得しています...")
@@ -186,44 +592,59 @@ def main():
         date_range = get_date_range(args.date, args.days)
         print(f"\n{args.days}日分のデータを取得します（{date_range[0]}から{date_range[-1]}まで）")
         
-        # 各日付のデータを取得
-        for date in date_range:
-            print(f"\n===== {date}のデータ取得 =====")
-            
-            # アクティビティデータの取得
-            print("アクティビティデータを取得しています...")
-            activity_data = get_activity_data(access_token, date)
-            if activity_data:
-                summary = activity_data.get("summary", {})
-                steps = summary.get("steps", 0)
-                print(f"歩数: {steps} 歩")
-                save_data_to_file(activity_data, f"{args.output_dir}/activity_{date}.json")
-            
-            # 睡眠データの取得
-            print("\n睡眠データを取得しています...")
-            sleep_data = get_sleep_data(access_token, date)
-            if sleep_data:
-                if sleep_data.get("sleep"):
-                    sleep_minutes = sum(item.get("minutesAsleep", 0) for item in sleep_data.get("sleep", []))
-                    print(f"睡眠時間: {sleep_minutes//60}時間{sleep_minutes%60}分")
-                else:
-                    print("この日の睡眠データはありません")
-                save_data_to_file(sleep_data, f"{args.output_dir}/sleep_{date}.json")
-            
-            # 心拍数データの取得
-            print("\n心拍数データを取得しています...")
-            heart_rate_data = get_heart_rate_data(access_token, date)
-            if heart_rate_data:
-                zones = heart_rate_data.get("activities-heart", [{}])[0].get("value", {}).get("heartRateZones", [])
-                if zones:
-                    resting_hr = heart_rate_data.get("activities-heart", [{}])[0].get("value", {}).get("restingHeartRate")
-                    if resting_hr:
-                        print(f"安静時心拍数: {resting_hr} bpm")
-                    else:
-                        print("この日の安静時心拍数データはありません")
-                else:
-                    print("この日の心拍数データはありません")
-                save_data_to_file(heart_rate_data, f"{args.output_dir}/heart_rate_{date}.json")
+        # 取得済みデータの記録
+        manifest = FetchManifest(args.output_dir)
+        tasks = None
+        if args.sync:
+            adopted = manifest.adopt_existing_files(kinds)
+            if adopted:
+                print(f"既存のファイル{adopted}件をマニフェストに登録しました")
+            tasks = manifest.pending(kinds, date_range)
+            print(f"差分同期: {len(date_range) * len(kinds)}件中{len(tasks)}件を取得します")
+        
+        # 日単位の取得は (データの種類, 日付) ごとに進捗を記録し、中断した場合は --resume で再開できる
+        checkpoint = FetchCheckpoint(args.output_dir)
+        if not args.bulk:
+            if args.resume and checkpoint.exists() and checkpoint.load():
+                tasks = checkpoint.pending()
+                print(f"チェックポイントから再開します: {len(checkpoint.tasks)}件中{len(tasks)}件が未完了です")
+            else:
+                if args.resume:
+                    print("再開できるチェックポイントがないため、新しく取得を開始します")
+                if tasks is None:
+                    tasks = [(kind, date) for date in date_range for kind in kinds]
+                checkpoint.start(tasks)
+        
+        if tasks == []:
+            result = {"requests": 0, "failed": [], "elapsed_seconds": 0.0}
+        elif args.bulk:
+            # 期間指定エンドポイントでまとめて取得（差分同期の場合は取得が必要な期間だけ）
+            pending_dates = sorted({date for _, date in tasks}) if tasks else date_range[::-1]
+            result = fetch_bulk(access_token, pending_dates[0], pending_dates[-1], args.output_dir, args.workers, manifest)
+        else:
+            # 各日付のデータを並行して取得
+            try:
+                result = fetch_date_range(access_token, date_range, args.output_dir, args.workers, tasks, manifest, checkpoint,
+                                          kinds)
+            finally:
+                manifest.save()
+                if not checkpoint.finish():
+                    print(f"未完了のデータが{len(checkpoint.pending())}件あります（--resume で続きから再開できます）")
+        manifest.save()
+        
+        client = get_default_client()
+        print(f"\n{result['requests']}件のリクエストを{result['elapsed_seconds']}秒で処理しました")
+        if client.rate_limit:
+            print(f"APIの残りリクエスト数: {client.rate_limit.get('remaining')}/{client.rate_limit.get('limit')}"
+                  f"（リセットまで{client.rate_limit.get('reset')}秒）")
+        if client.response_cache is not None:
+            cache_stats = client.response_cache.stats()
+            print(f"レスポンスキャッシュ: ヒット{cache_stats['hits']}件 / ミス{cache_stats['misses']}件"
+                  f"（{cache_stats['entries']}件, {cache_stats['bytes'] / 1024 / 1024:.1f}MB）")
+        if result["failed"]:
+            print(f"取得に失敗したデータ: {len(result['failed'])}件")
+            for kind, *dates in result["failed"]:
+                print(f"  - {'～'.join(dates)} {kind}")
         
         print("\n処理が完了しました！")
         print(f"すべてのデータは{args.output_dir}ディレクトリに保存されています")
@@ -232,4 +653,4 @@ def main():
         traceback.print_exc()  # 追加: スタックトレースを出力
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
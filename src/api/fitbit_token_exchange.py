@@ -12,6 +12,8 @@ import base64
 from dotenv import load_dotenv
 import sys
 
+from src.api.token_store import TokenStore
+
 # .envファイルから環境変数を読み込む
 load_dotenv()
 
@@ -105,6 +107,8 @@ def main():
         
         # トークンを.envファイルに保存
         save_tokens_to_env(tokens)
+        # データ取得時の自動更新で使うトークンキャッシュも更新する（古いリフレッシュトークンは使えなくなるため）
+        TokenStore().save_response(tokens)
         
         print("\n次のステップ:")
         print("1. fitbit_data_api.pyを実行してFitbitデータを取得できます")
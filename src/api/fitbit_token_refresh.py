@@ -12,6 +12,9 @@ import base64
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 
+from src.api.token_store import TokenStore
+from src.api.fitbit_client import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+
 # .envファイルから環境変数を読み込む
 load_dotenv()
 
@@ -35,7 +38,13 @@ def refresh_access_token(refresh_token, client_id, client_secret):
         "refresh_token": refresh_token
     }
     
-    response = requests.post("https://api.fitbit.com/oauth2/token", headers=headers, data=data)
+    # トークンストアのロックを持ったまま呼ばれるため、応答がない場合もタイムアウトで失敗として返す
+    try:
+        response = requests.post("https://api.fitbit.com/oauth2/token", headers=headers, data=data,
+                                 timeout=(DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT))
+    except requests.RequestException as e:
+        print(f"エラー: トークンの更新に失敗しました（通信エラー）: {str(e)}")
+        return None
     
     if response.status_code != 200:
         print(f"エラー: トークンの更新に失敗しました (HTTP {response.status_code})")
@@ -81,7 +90,9 @@ def main():
     # 環境変数からクライアントIDとシークレットを取得
     client_id = os.getenv("FITBIT_CLIENT_ID")
     client_secret = os.getenv("FITBIT_CLIENT_SECRET")
-    refresh_token = os.getenv("FITBIT_REFRESH_TOKEN")
+    # 自動更新でトークンキャッシュの方が新しくなっている場合はそちらを使う
+    stored = TokenStore().load() or {}
+    refresh_token = stored.get("refresh_token") or os.getenv("FITBIT_REFRESH_TOKEN")
     
     if not client_id or not client_secret:
         print("エラー: FITBIT_CLIENT_IDとFITBIT_CLIENT_SECRETを.envファイルに設定してください")
@@ -106,6 +117,8 @@ def main():
         
         # トークンを.envファイルに保存
         save_tokens_to_env(tokens)
+        # データ取得時の自動更新で使うトークンキャッシュも更新する（古いリフレッシュトークンは使えなくなるため）
+        TokenStore().save_response(tokens)
         
         print("\n次のステップ:")
         print("1. fitbit_data_api.pyを実行してFitbitデータを取得できます")
@@ -117,4 +130,4 @@ def main():
         print("- Fitbitアカウントが有効であること")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,427 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Fitbit Subscription APIの通知を受け取るWebhookサーバー
+
+データの更新通知（collectionType と date）を受け取り、該当するデータの種類と日付だけを
+キューに入れてバックグラウンドで取得する。定期的なポーリングをしなくてもデータが数分以内に更新される。
+
+- GET  {path}?verify=<コード>  : サブスクライバーの検証（環境変数 FITBIT_SUBSCRIBER_VERIFY_CODE と一致すれば204）
+- POST {path}                  : 更新通知（X-Fitbit-Signature を検証し、204を返してから取得する）
+
+ローカルでの動作確認には --send で署名付きの通知を送信できる。
+"""
+
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from src.api.fitbit_client import get_default_client
+from src.api.fetch_manifest import FetchManifest
+from src.api.fitbit_data_api import FETCHERS, prepare_access_token, use_packed_store
+
+DEFAULT_PATH = "/fitbit/webhook"
+DEFAULT_PORT = 8095
+
+# 通知の collectionType と取得するデータの種類の対応（心拍数は activities に含まれる）
+# SpO2（main.py data --metrics spo2）は通知の collectionType がないため対象外。
+# 必要な場合は main.py data --sync --metrics spo2 を定期的に実行する
+COLLECTION_KINDS = {
+    "activities": ["activity", "heart_rate"],
+    "sleep": ["sleep"],
+}
+
+def sign(body, client_secret):
+    """通知本文の署名（X-Fitbit-Signature）を計算する
+    
+    Parameters:
+    -----------
+    body : bytes
+        リクエスト本文
+    client_secret : str
+        クライアントシークレット
+    
+    Returns:
+    --------
+    str
+        Base64エンコードした HMAC-SHA1 署名
+    """
+    digest = hmac.new(f"{client_secret}&".encode("utf-8"), body, hashlib.sha1).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+def verify_signature(body, signature, client_secret):
+    """X-Fitbit-Signature ヘッダーの署名が正しいかどうかを返す"""
+    if not signature:
+        return False
+    return hmac.compare_digest(sign(body, client_secret), signature)
+
+def parse_notifications(body):
+    """通知本文から取得する (データの種類, 日付) のリストを返す
+    
+    Parameters:
+    -----------
+    body : bytes
+        通知本文（JSON配列）
+    
+    Returns:
+    --------
+    list
+        (データの種類, 日付) のリスト（対応していない collectionType は含まない）
+    """
+    notifications = json.loads(body or b"[]")
+    if isinstance(notifications, dict):
+        notifications = [notifications]
+    
+    tasks = []
+    for notification in notifications:
+        collection = notification.get("collectionType")
+        date = notification.get("date")
+        if collection == "userRevokedAccess":
+            print(f"警告: ユーザー {notification.get('ownerId')} がアクセス権を取り消しました")
+            continue
+        if collection not in COLLECTION_KINDS or not date:
+            continue
+        try:
+            datetime.strptime(date, "%Y-%m-%d")
+        except ValueError:
+            continue
+        tasks.extend((kind, date) for kind in COLLECTION_KINDS[collection])
+    return tasks
+
+class FetchQueue:
+    """通知されたデータを取得するキュー
+    
+    同じ (データの種類, 日付) の通知は1回の取得にまとめる。デバイスの同期中は通知が続けて届くため、
+    最初の通知から delay 秒待ってから取得する。取得中に新しい通知が届いた場合は、取得後にもう一度取得する。
+    """
+    
+    def __init__(self, fetch, delay=5.0, workers=2, on_done=None):
+        """
+        初期化
+        
+        Parameters:
+        -----------
+        fetch : callable
+            (データの種類, 日付) を受け取って取得し、成功した場合にTrueを返す関数
+        delay : float
+            通知を受け取ってから取得するまでの待機秒数
+        workers : int
+            取得を実行するスレッド数
+        on_done : callable, optional
+            取得に成功した (データの種類, 日付) を受け取る関数
+        """
+        self.fetch = fetch
+        self.delay = delay
+        self.on_done = on_done
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._in_flight = set()
+        self._running = True
+        self.stats = {"notified": 0, "coalesced": 0, "fetched": 0, "failed": 0}
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"fitbit-webhook-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+    
+    def enqueue(self, kind, date):
+        """取得をキューに入れる
+        
+        Returns:
+        --------
+        bool
+            新しくキューに入れた場合はTrue（同じデータが待機中の場合はFalse）
+        """
+        with self._cond:
+            self.stats["notified"] += 1
+            key = (kind, date)
+            if key in self._pending:
+                self.stats["coalesced"] += 1
+                return False
+            self._pending[key] = time.monotonic() + self.delay
+            self._cond.notify()
+            return True
+    
+    def pending(self):
+        """待機中と取得中の件数を返す"""
+        with self._cond:
+            return len(self._pending) + len(self._in_flight)
+    
+    def _next(self):
+        with self._cond:
+            while self._running:
+                now = time.monotonic()
+                ready = [key for key, due in self._pending.items() if due <= now and key not in self._in_flight]
+                if ready:
+                    key = min(ready, key=self._pending.get)
+                    del self._pending[key]
+                    self._in_flight.add(key)
+                    return key
+                waiting = [due for key, due in self._pending.items() if key not in self._in_flight]
+                self._cond.wait(timeout=max(0.05, min(waiting) - now) if waiting else 1.0)
+            return None
+    
+    def _worker(self):
+        while True:
+            key = self._next()
+            if key is None:
+                return
+            kind, date = key
+            try:
+                ok = self.fetch(kind, date)
+            except Exception as e:
+                print(f"{date}の{kind}データの取得中に例外が発生しました: {str(e)}")
+                ok = False
+            if ok and self.on_done is not None:
+                self.on_done(kind, date)
+            with self._cond:
+                self._in_flight.discard(key)
+                self.stats["fetched" if ok else "failed"] += 1
+                self._cond.notify_all()
+    
+    def join(self, timeout=None):
+        """キューが空になるまで待機する
+        
+        Returns:
+        --------
+        bool
+            空になった場合はTrue
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(timeout=remaining)
+        return True
+    
+    def stop(self):
+        """ワーカーを停止する（待機中の取得は破棄する）"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    """Subscription APIの通知を受け取るハンドラー"""
+    
+    protocol_version = "HTTP/1.1"
+    path_prefix = DEFAULT_PATH
+    verify_code = None
+    client_secret = None
+    queue = None
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send_status(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+    
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.rstrip("/") != self.path_prefix.rstrip("/"):
+            self._send_status(404)
+            return
+        code = parse_qs(url.query).get("verify", [None])[0]
+        # 正しい検証コードには204、誤ったコードには404を返す（Fitbitの仕様）
+        self._send_status(204 if self.verify_code and code == self.verify_code else 404)
+    
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if urlparse(self.path).path.rstrip("/") != self.path_prefix.rstrip("/"):
+            self._send_status(404)
+            return
+        if self.client_secret and not verify_signature(body, self.headers.get("X-Fitbit-Signature"), self.client_secret):
+            print("警告: 署名が一致しない通知を受け取ったため無視しました")
+            self._send_status(404)
+            return
+        try:
+            tasks = parse_notifications(body)
+        except ValueError as e:
+            print(f"警告: 通知の本文を解析できませんでした: {str(e)}")
+            self._send_status(400)
+            return
+        
+        # 通知には5秒以内に応答する必要があるため、取得はキューに入れて応答を先に返す
+        for kind, date in tasks:
+            if self.queue.enqueue(kind, date):
+                print(f"通知を受け取りました: {date} {kind}")
+        self._send_status(204)
+
+def start_webhook_server(queue, host="0.0.0.0", port=DEFAULT_PORT, path=DEFAULT_PATH, verify_code=None, client_secret=None):
+    """Webhookサーバーをバックグラウンドスレッドで起動する
+    
+    Parameters:
+    -----------
+    queue : FetchQueue
+        通知されたデータを入れるキュー
+    host : str
+        待ち受けるホスト
+    port : int
+        待ち受けるポート（0の場合は空いているポートを使用）
+    path : str
+        通知を受け取るパス
+    verify_code : str, optional
+        サブスクライバーの検証コード
+    client_secret : str, optional
+        署名の検証に使用するクライアントシークレット（未指定の場合は署名を検証しない）
+    
+    Returns:
+    --------
+    tuple
+        (サーバー, 通知を受け取るURL)
+    """
+    handler = type("WebhookHandler", (_WebhookHandler,), {
+        "path_prefix": path,
+        "verify_code": verify_code,
+        "client_secret": client_secret,
+        "queue": queue
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    
+    return server, f"http://{server.server_address[0]}:{server.server_address[1]}{path}"
+
+def send_notification(url, collection_type, date, client_secret=None, owner_id="-", subscription_id="1"):
+    """ローカルでの動作確認用に署名付きの通知を送信する
+    
+    Returns:
+    --------
+    int
+        HTTPステータスコード
+    """
+    body = json.dumps([{
+        "collectionType": collection_type,
+        "date": date,
+        "ownerId": owner_id,
+        "ownerType": "user",
+        "subscriptionId": subscription_id
+    }]).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if client_secret:
+        headers["X-Fitbit-Signature"] = sign(body, client_secret)
+    return requests.post(url, data=body, headers=headers, timeout=10).status_code
+
+def create_subscription(access_token, collection, subscription_id, subscriber_id=None):
+    """Subscription APIでデータの更新通知を登録する
+    
+    Parameters:
+    -----------
+    access_token : str
+        アクセストークン
+    collection : str
+        通知を受け取るデータ（activities または sleep）
+    subscription_id : str
+        サブスクリプションID（任意の一意な文字列）
+    subscriber_id : str, optional
+        開発者サイトで登録したサブスクライバーID
+    
+    Returns:
+    --------
+    requests.Response
+        レスポンス
+    """
+    client = get_default_client()
+    url = client.url(f"/1/user/-/{collection}/apiSubscriptions/{subscription_id}.json")
+    headers = {"Authorization": f"Bearer {access_token}"}
+    if subscriber_id:
+        headers["X-Fitbit-Subscriber-Id"] = subscriber_id
+    return client.session.post(url, headers=headers, timeout=client.timeout)
+
+def main():
+    parser = argparse.ArgumentParser(description="Fitbit Subscription APIの通知を受け取ってデータを取得するWebhookサーバー")
+    parser.add_argument("--host", default="0.0.0.0", help="待ち受けるホスト（デフォルト: 0.0.0.0）")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"待ち受けるポート（デフォルト: {DEFAULT_PORT}）")
+    parser.add_argument("--path", default=DEFAULT_PATH, help=f"通知を受け取るパス（デフォルト: {DEFAULT_PATH}）")
+    parser.add_argument("--output-dir", default="data", help="データの保存先ディレクトリ（デフォルト: data）")
+    parser.add_argument("--workers", type=int, default=2, help="取得を実行するスレッド数（デフォルト: 2）")
+    parser.add_argument("--delay", type=float, default=5.0, help="通知を受け取ってから取得するまでの待機秒数（デフォルト: 5）")
+    parser.add_argument("--format", choices=["json", "packed"], default="json",
+                        help="保存形式（json: 日ごとのJSONファイル、packed: 月ごとの圧縮セグメント、デフォルト: json）")
+    parser.add_argument("--subscribe", action="store_true", help="起動時に activities と sleep の通知を登録する")
+    parser.add_argument("--send", choices=sorted(COLLECTION_KINDS), default=None,
+                        help="サーバーを起動せず、--host/--port/--path に動作確認用の通知を送信する")
+    parser.add_argument("--date", default=None, help="--send で送信する日付（デフォルト: 今日）")
+    args = parser.parse_args()
+    
+    client_secret = os.getenv("FITBIT_CLIENT_SECRET")
+    
+    if args.send:
+        host = "127.0.0.1" if args.host == "0.0.0.0" else args.host
+        url = f"http://{host}:{args.port}{args.path}"
+        date = args.date or datetime.now().strftime("%Y-%m-%d")
+        status = send_notification(url, args.send, date, client_secret)
+        print(f"通知を送信しました: {args.send} {date} -> HTTP {status}")
+        return
+    
+    print("=== Fitbit Webhook ===")
+    
+    # 通知されたデータは更新されているため、レスポンスキャッシュを使わずに取得する
+    get_default_client().response_cache = None
+    access_token = prepare_access_token()
+    if not access_token:
+        return
+    
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.format == "packed":
+        use_packed_store(args.output_dir)
+    manifest = FetchManifest(args.output_dir)
+    
+    def on_done(kind, date):
+        manifest.record(kind, date)
+        manifest.save()
+    
+    queue = FetchQueue(
+        lambda kind, date: FETCHERS[kind](access_token, date, args.output_dir),
+        delay=args.delay,
+        workers=args.workers,
+        on_done=on_done
+    )
+    
+    verify_code = os.getenv("FITBIT_SUBSCRIBER_VERIFY_CODE")
+    if not verify_code:
+        print("警告: FITBIT_SUBSCRIBER_VERIFY_CODE が設定されていないため、サブスクライバーの検証には応答しません")
+    if not client_secret:
+        print("警告: FITBIT_CLIENT_SECRET が設定されていないため、通知の署名を検証しません")
+    
+    server, url = start_webhook_server(queue, args.host, args.port, args.path, verify_code, client_secret)
+    print(f"Webhookサーバーを起動しました: {url}（Ctrl+Cで終了）")
+    
+    if args.subscribe:
+        subscriber_id = os.getenv("FITBIT_SUBSCRIBER_ID")
+        for collection in sorted(COLLECTION_KINDS):
+            response = create_subscription(access_token, collection, f"fitbit-analyzer-{collection}", subscriber_id)
+            print(f"{collection}の通知を登録しました (HTTP {response.status_code})")
+    
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"\n取得待ちのデータ{queue.pending()}件を処理しています...")
+        queue.join(timeout=30)
+        queue.stop()
+        print(f"終了しました: {queue.stats}")
+
+if __name__ == "__main__":
+    main()
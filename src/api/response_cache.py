@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Fitbit APIのレスポンスをディスクにキャッシュするモジュール
+
+同じ日付のデータを繰り返し取得してもAPIの利用枠を消費しないようにする。
+確定済みの過去の日は実質的に無期限、今日のデータは短時間だけキャッシュする。
+"""
+
+import os
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from src.api.fetch_manifest import FINALIZE_AFTER
+
+DEFAULT_CACHE_PATH = os.path.join("output", "fitbit_response_cache.sqlite3")
+DEFAULT_MAX_BYTES = int(os.getenv("FITBIT_RESPONSE_CACHE_MAX_MB", "200")) * 1024 * 1024
+
+# 有効期限（秒）
+TTL_TODAY = 5 * 60
+TTL_RECENT = 60 * 60
+TTL_FINAL = 365 * 24 * 60 * 60
+TTL_DEFAULT = 24 * 60 * 60
+
+# 日付を含まないエンドポイントの有効期限（パスの正規表現, 秒）
+ENDPOINT_TTLS = [
+    (re.compile(r"/profile\.json$"), 24 * 60 * 60),
+    (re.compile(r"/devices\.json$"), 15 * 60),
+]
+
+_DATE_PATTERN = re.compile(r"/(\d{4}-\d{2}-\d{2}|today)(?=[/.])")
+
+def endpoint_ttl(url, now=None):
+    """URLに含まれる日付から有効期限（秒）を決める
+    
+    期間指定のエンドポイントは最も新しい日付で判断する。
+    
+    Parameters:
+    -----------
+    url : str
+        リクエストURL
+    now : datetime, optional
+        現在時刻
+    
+    Returns:
+    --------
+    int
+        有効期限（秒）
+    """
+    now = now or datetime.now()
+    for pattern, ttl in ENDPOINT_TTLS:
+        if pattern.search(url):
+            return ttl
+    
+    dates = _DATE_PATTERN.findall(url)
+    if not dates:
+        return TTL_DEFAULT
+    if "today" in dates:
+        return TTL_TODAY
+    
+    latest = max(datetime.strptime(date, "%Y-%m-%d") for date in dates)
+    day_end = latest + timedelta(days=1)
+    if now < day_end:
+        return TTL_TODAY
+    if now < day_end + FINALIZE_AFTER:
+        return TTL_RECENT
+    return TTL_FINAL
+
+def make_cache_key(url, params=None, user=None):
+    """ユーザー・URL・クエリパラメータからキャッシュキーを生成する（アクセストークンは含めない）
+    
+    URLはすべて /user/-/ 形式（トークンのユーザー）のため、ユーザーを含めないと
+    アカウントを切り替えた後に別のユーザーのデータを返してしまう。
+    """
+    query = urlencode(sorted((params or {}).items()))
+    return hashlib.sha256(f"{user or ''}|{url}?{query}".encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """SQLiteを使用したFitbit APIレスポンスのキャッシュ
+    
+    合計サイズが上限を超えた場合は、最後に参照された時刻が古いものから削除する。
+    """
+    
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        初期化
+        
+        Parameters:
+        -----------
+        path : str, optional
+            データベースファイルのパス（未指定の場合は環境変数 FITBIT_RESPONSE_CACHE_PATH、
+            それもなければ output/fitbit_response_cache.sqlite3）
+        max_bytes : int
+            キャッシュの合計サイズの上限（バイト）
+        """
+        self.path = path or os.getenv("FITBIT_RESPONSE_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    status_code INTEGER NOT NULL,
+                    content_type TEXT,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+    
+    @contextmanager
+    def _connect(self):
+        # 呼び出しごとに接続を作成する（sqlite3の接続はスレッド間で共有できないため）
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
+    def get(self, url, params=None, user=None):
+        """有効期限内のキャッシュを取得する
+        
+        Parameters:
+        -----------
+        url : str
+            リクエストURL
+        params : dict, optional
+            クエリパラメータ
+        user : str, optional
+            ユーザーの識別子（put と同じ値を指定する）
+        
+        Returns:
+        --------
+        tuple or None
+            (ステータスコード, Content-Type, 本文のバイト列)。存在しないか期限切れの場合はNone
+        """
+        key = make_cache_key(url, params, user)
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT status_code, content_type, body FROM responses WHERE key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0], row[1], bytes(row[2])
+    
+    def put(self, url, params, status_code, content_type, body, ttl=None, user=None):
+        """レスポンスを保存する
+        
+        Parameters:
+        -----------
+        url : str
+            リクエストURL
+        params : dict
+            クエリパラメータ
+        status_code : int
+            ステータスコード
+        content_type : str
+            Content-Typeヘッダー
+        body : bytes
+            本文（展開済み）
+        ttl : int, optional
+            有効期限（秒、未指定の場合はURLの日付から決める）
+        user : str, optional
+            ユーザーの識別子
+        """
+        ttl = endpoint_ttl(url) if ttl is None else ttl
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO responses
+                    (key, url, status_code, content_type, body, size, created_at, expires_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (make_cache_key(url, params, user), url, status_code, content_type, sqlite3.Binary(body),
+                 len(body), now, now + ttl, now)
+            )
+            self._evict(conn, now)
+    
+    def _evict(self, conn, now):
+        """期限切れのものを削除し、上限を超えていれば参照の古いものから削除する"""
+        conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        removed = 0
+        keys = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            keys.append((key,))
+            removed += size
+            if removed >= excess:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", keys)
+    
+    def clear(self):
+        """キャッシュをすべて削除する"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+    
+    def stats(self):
+        """件数と合計サイズを返す"""
+        with self._connect() as conn:
+            count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": count, "bytes": size, "hits": self.hits, "misses": self.misses}
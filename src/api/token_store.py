@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Fitbitのトークンを共有するキャッシュと自動更新
+
+トークンはファイルロック付きのJSONファイルに原子的に書き込み、複数のスレッドやプロセスから
+同時に取得処理を実行しても、リフレッシュトークン（1回しか使えない）の更新が競合しないようにする。
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from src.utils.file_lock import file_lock
+
+DEFAULT_TOKEN_CACHE = ".fitbit_tokens.json"
+
+# 有効期限のこの秒数前になったら事前に更新する
+DEFAULT_REFRESH_MARGIN = 300
+
+class TokenStore:
+    """トークンを保存するファイル"""
+    
+    def __init__(self, path=None):
+        """
+        初期化
+        
+        Parameters:
+        -----------
+        path : str, optional
+            保存先（未指定の場合は環境変数 FITBIT_TOKEN_CACHE、なければ .fitbit_tokens.json）
+        """
+        self.path = path or os.getenv("FITBIT_TOKEN_CACHE", DEFAULT_TOKEN_CACHE)
+    
+    @contextmanager
+    def locked(self):
+        """他のプロセスと排他的にトークンを読み書きする"""
+        with file_lock(self.path):
+            yield
+    
+    @staticmethod
+    def _from_env():
+        """.env（環境変数）に保存されたトークンを返す"""
+        access_token = os.getenv("FITBIT_ACCESS_TOKEN")
+        if not access_token:
+            return None
+        expires_at = None
+        expiration_str = os.getenv("FITBIT_TOKEN_EXPIRATION")
+        if expiration_str:
+            try:
+                expires_at = datetime.strptime(expiration_str, "%Y-%m-%d %H:%M:%S").timestamp()
+            except ValueError:
+                expires_at = None
+        return {
+            "access_token": access_token,
+            "refresh_token": os.getenv("FITBIT_REFRESH_TOKEN"),
+            "expires_at": expires_at,
+        }
+    
+    def load(self):
+        """トークンを読み込む
+        
+        キャッシュファイルと環境変数のうち、有効期限の遅い方（新しい方）を返す。
+        
+        Returns:
+        --------
+        dict or None
+            access_token, refresh_token, expires_at（UNIX時刻）
+        """
+        cached = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    cached = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"警告: トークンキャッシュ {self.path} を読み込めませんでした: {str(e)}")
+        
+        from_env = self._from_env()
+        if cached is None:
+            return from_env
+        if from_env is None:
+            return cached
+        return max(cached, from_env, key=lambda tokens: tokens.get("expires_at") or 0)
+    
+    def save(self, tokens):
+        """トークンを保存する（同じディレクトリの一時ファイルに書き込んでから置き換える）"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=".fitbit_tokens.", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(tokens, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(temp_path, 0o600)
+            os.replace(temp_path, self.path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    
+    def save_response(self, response):
+        """トークンエンドポイントの応答（access_token, refresh_token, expires_in）を保存する"""
+        tokens = {
+            "access_token": response["access_token"],
+            "refresh_token": response["refresh_token"],
+            "expires_at": time.time() + response["expires_in"],
+        }
+        with self.locked():
+            self.save(tokens)
+        return tokens
+
+class TokenManager:
+    """アクセストークンを有効期限前に自動更新するクラス
+    
+    スレッド間はロックで、プロセス間はファイルロックで更新を1回にまとめる。
+    他のプロセスが先に更新していた場合は、その結果を読み込んで使う。
+    """
+    
+    def __init__(self, client_id, client_secret, store=None, refresh_margin=DEFAULT_REFRESH_MARGIN, refresher=None):
+        """
+        初期化
+        
+        Parameters:
+        -----------
+        client_id : str
+            FitbitアプリのクライアントID
+        client_secret : str
+            Fitbitアプリのクライアントシークレット
+        store : TokenStore, optional
+            トークンの保存先
+        refresh_margin : float
+            有効期限の何秒前に更新するか
+        refresher : callable, optional
+            (refresh_token, client_id, client_secret) を受け取り、トークンエンドポイントの応答を返す関数
+        """
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.store = store or TokenStore()
+        self.refresh_margin = refresh_margin
+        if refresher is None:
+            from src.api.fitbit_token_refresh import refresh_access_token as refresher
+        self.refresher = refresher
+        self._lock = threading.Lock()
+        self._tokens = self.store.load()
+    
+    def _expiring(self, tokens):
+        expires_at = tokens.get("expires_at") if tokens else None
+        if not tokens or not tokens.get("access_token"):
+            return True
+        return expires_at is not None and expires_at - time.time() <= self.refresh_margin
+    
+    @property
+    def expires_at(self):
+        """現在のアクセストークンの有効期限（UNIX時刻）"""
+        with self._lock:
+            return (self._tokens or {}).get("expires_at")
+    
+    def get_access_token(self):
+        """有効なアクセストークンを返す（期限が近い場合は更新する）"""
+        with self._lock:
+            if not self._expiring(self._tokens):
+                return self._tokens["access_token"]
+        return self.refresh()
+    
+    def refresh(self, stale_token=None):
+        """アクセストークンを更新する
+        
+        Parameters:
+        -----------
+        stale_token : str, optional
+            401が返されたアクセストークン（他のスレッド・プロセスが既に更新済みならそれを使う）
+        
+        Returns:
+        --------
+        str or None
+            アクセストークン（更新に失敗した場合はNone）
+        """
+        with self._lock:
+            with self.store.locked():
+                # ロックを待つ間に他のプロセスが更新している可能性があるため読み直す
+                latest = self.store.load()
+                if latest and latest.get("access_token") != stale_token and not self._expiring(latest):
+                    self._tokens = latest
+                    return latest["access_token"]
+                
+                refresh_token = (latest or {}).get("refresh_token")
+                if not refresh_token:
+                    print("エラー: リフレッシュトークンがありません（fitbit_token_exchange.pyを実行してください）")
+                    return None
+                
+                response = self.refresher(refresh_token, self.client_id, self.client_secret)
+                if not response:
+                    return None
+                
+                tokens = {
+                    "access_token": response["access_token"],
+                    "refresh_token": response["refresh_token"],
+                    "expires_at": time.time() + response["expires_in"],
+                }
+                self.store.save(tokens)
+                self._tokens = tokens
+                print(f"アクセストークンを更新しました（有効期限: {datetime.fromtimestamp(tokens['expires_at']).strftime('%Y-%m-%d %H:%M:%S')}）")
+                return tokens["access_token"]
@@ -0,0 +1,4 @@
+"""
+ベンチマークモジュール
+外部APIのスタブサーバーと性能計測用のスクリプトを提供
+"""
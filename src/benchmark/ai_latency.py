@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AI分析経路のレイテンシーを計測するベンチマーク
+
+ローカルのOpenAI互換スタブサーバーに対して AIAnalyzer を並行実行し、
+p50/p95/p99 レイテンシー、スループット、キャッシュヒット率を出力する。
+"""
+
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from src.benchmark.openai_stub_server import StubConfig, start_stub_server
+from src.analysis import openai_client
+from src.analysis.ai_insights import AIAnalyzer
+from src.analysis.insight_cache import InsightCache
+from src.utils.rate_limiter import AIRateLimiter
+
+def make_workload(index):
+    """ベンチマーク用の心拍数・睡眠ステージデータを生成する"""
+    rng = np.random.default_rng(index)
+    start = datetime(2025, 4, 1) + timedelta(days=index)
+    times = [start + timedelta(minutes=5 * i) for i in range(72)]
+    hr_df = pd.DataFrame({'time': times, 'heart_rate': rng.integers(50, 110, len(times))})
+    
+    stages = rng.choice(['wake', 'light', 'deep', 'rem'], size=30)
+    sleep_df = pd.DataFrame({
+        'time': times[:30],
+        'sleep_stage': stages,
+        'duration_seconds': rng.integers(60, 1800, 30)
+    })
+    return hr_df, sleep_df, start.strftime('%Y-%m-%d'), "00:00～06:00"
+
+def percentile(values, q):
+    """パーセンタイル値（ミリ秒）を返す"""
+    if not values:
+        return None
+    return round(float(np.percentile(values, q)) * 1000, 1)
+
+def run_benchmark(requests=200, concurrency=8, unique=50, config=None):
+    """ベンチマークを実行する
+    
+    Parameters:
+    -----------
+    requests : int
+        実行するリクエスト数
+    concurrency : int
+        同時実行数
+    unique : int
+        異なる入力データの種類数（それ以外はキャッシュヒットになる）
+    config : StubConfig, optional
+        スタブサーバーの設定
+    
+    Returns:
+    --------
+    dict
+        計測結果
+    """
+    server, base_url = start_stub_server(config=config)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    openai_client.circuit_breaker.record_success()
+    
+    workloads = [make_workload(i) for i in range(unique)]
+    results = []
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = InsightCache(os.path.join(temp_dir, "insight_cache.sqlite3"))
+        # スタブの性能を計測するためレート制限は実質無効にする
+        limiter = AIRateLimiter(global_per_minute=1e7, user_per_minute=1e7, max_queue=100000, max_wait=300)
+        
+        def run_one(index):
+            hr_df, sleep_df, target_date, time_range = workloads[index % unique]
+            analyzer = AIAnalyzer(cache=cache, rate_limiter=limiter, user_id=f"bench-{index}")
+            analyzer.api_key = "sk-stub"
+            started = time.perf_counter()
+            text = analyzer.generate_insights(hr_df, sleep_df, target_date, time_range)
+            elapsed = time.perf_counter() - started
+            failed = text.lstrip().startswith("**エラー**") or text.lstrip().startswith("**注意**")
+            return elapsed, analyzer.last_usage is not None, failed
+        
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(run_one, range(requests)))
+        wall = time.perf_counter() - started
+        
+        hits = cache.hits
+        misses = cache.misses
+    
+    server.shutdown()
+    
+    latencies = [elapsed for elapsed, _, _ in results]
+    api_latencies = [elapsed for elapsed, called, failed in results if called and not failed]
+    failures = sum(1 for _, _, failed in results if failed)
+    
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(requests / wall, 1) if wall else None,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "api_p50_ms": percentile(api_latencies, 50),
+        "api_p95_ms": percentile(api_latencies, 95),
+        "api_p99_ms": percentile(api_latencies, 99),
+        "cache_hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+        "failures": failures,
+        "circuit_state": openai_client.circuit_breaker.state,
+        "server": dict(server.config.stats)
+    }
+
+def run_stream_benchmark(requests=20, config=None):
+    """ストリーミング応答の最初のトークンまでの時間（TTFT）と全体時間を計測する"""
+    server, base_url = start_stub_server(config=config)
+    client = openai_client.get_openai_client("sk-stub", base_url=base_url)
+    
+    ttfts = []
+    totals = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        first = None
+        stream = client.chat.completions.create(
+            model=openai_client.DEFAULT_MODEL,
+            messages=[{"role": "user", "content": "benchmark"}],
+            stream=True
+        )
+        for chunk in stream:
+            if first is None and chunk.choices and chunk.choices[0].delta.content:
+                first = time.perf_counter() - started
+        totals.append(time.perf_counter() - started)
+        ttfts.append(first or totals[-1])
+    
+    server.shutdown()
+    return {
+        "requests": requests,
+        "ttft_p50_ms": percentile(ttfts, 50),
+        "ttft_p95_ms": percentile(ttfts, 95),
+        "total_p50_ms": percentile(totals, 50),
+        "total_p95_ms": percentile(totals, 95)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="AI分析経路のレイテンシーベンチマーク")
+    parser.add_argument("--requests", type=int, default=200, help="リクエスト数（デフォルト: 200）")
+    parser.add_argument("--concurrency", type=int, default=8, help="同時実行数（デフォルト: 8）")
+    parser.add_argument("--unique", type=int, default=50, help="異なる入力データの種類数（デフォルト: 50）")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="スタブの平均遅延（ミリ秒、デフォルト: 200）")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="スタブの遅延のばらつき（ミリ秒、デフォルト: 50）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="500エラーの発生確率（デフォルト: 0）")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="429エラーの発生確率（デフォルト: 0）")
+    parser.add_argument("--stream", action="store_true", help="ストリーミング応答のTTFTも計測する")
+    args = parser.parse_args()
+    
+    config = StubConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=0.2
+    )
+    
+    print("=== AI Latency Benchmark ===")
+    result = run_benchmark(args.requests, args.concurrency, args.unique, config)
+    for key, value in result.items():
+        print(f"{key}: {value}")
+    
+    if args.stream:
+        print("\n--- streaming ---")
+        stream_result = run_stream_benchmark(config=StubConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms))
+        for key, value in stream_result.items():
+            print(f"{key}: {value}")
+
+if __name__ == "__main__":
+    main()
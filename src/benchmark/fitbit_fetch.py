@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Fitbitデータ取得のスループットを計測するベンチマーク
+
+ローカルのFitbitモックサーバーに対して、日ごとの逐次取得・日ごとの並行取得・期間指定での一括取得で
+指定日数分（デフォルト365日）のバックフィルを実行し、所要時間・リクエスト/秒・利用枠の効率を出力する。
+モックの利用枠の時間窓は短縮しているため、実際のAPIでの所要時間は利用枠の消費量から見積もる。
+"""
+
+import io
+import math
+import time
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+
+from src.benchmark.fitbit_mock_server import MockConfig, start_mock_server
+from src.api import fitbit_data_api
+from src.api.fitbit_client import FitbitClient, set_default_client
+from src.utils.rate_limiter import FitbitRateLimiter
+
+MODES = ("serial", "concurrent", "bulk")
+
+# 実際のAPIの利用枠（1時間あたりのリクエスト数）
+FITBIT_REQUESTS_PER_HOUR = 150
+
+def run_mode(mode, days=365, workers=4, config=None):
+    """1つの取得方法でバックフィルを実行して計測する
+    
+    Parameters:
+    -----------
+    mode : str
+        取得方法（serial: 日ごとに逐次、concurrent: 日ごとに並行、bulk: 期間指定で一括）
+    days : int
+        取得する日数
+    workers : int
+        concurrent / bulk の同時リクエスト数
+    config : MockConfig, optional
+        モックサーバーの設定
+    
+    Returns:
+    --------
+    dict
+        計測結果
+    """
+    config = config or MockConfig()
+    server, base_url = start_mock_server(config=config)
+    client = FitbitClient(
+        base_url=base_url,
+        rate_limiter=FitbitRateLimiter(config.requests_per_window)
+    )
+    previous = set_default_client(client)
+    
+    end_date = datetime(2024, 12, 31)
+    start_date = end_date - timedelta(days=days - 1)
+    date_range = fitbit_data_api.get_date_range(end_date.strftime("%Y-%m-%d"), days)
+    
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            started = time.perf_counter()
+            # 日ごとの取得ログは計測の妨げになるため出力しない
+            with contextlib.redirect_stdout(io.StringIO()):
+                if mode == "bulk":
+                    result = fitbit_data_api.fetch_bulk(
+                        "mock-token", start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"),
+                        output_dir, workers=workers
+                    )
+                else:
+                    result = fitbit_data_api.fetch_date_range(
+                        "mock-token", date_range, output_dir, workers=1 if mode == "serial" else workers
+                    )
+            wall = time.perf_counter() - started
+    finally:
+        set_default_client(previous)
+        client.close()
+        server.shutdown()
+    
+    stats = dict(config.stats)
+    sent = stats["requests"]
+    ok = stats["ok"]
+    # 同じ量を実際の利用枠（150リクエスト/時）で取得した場合に必要な時間
+    real_hours = math.ceil(ok * 365 / days / FITBIT_REQUESTS_PER_HOUR) if ok else None
+    return {
+        "mode": mode,
+        "days": days,
+        "wall_seconds": round(wall, 2),
+        "wall_seconds_per_365_days": round(wall * 365 / days, 2),
+        "requests_sent": sent,
+        "requests_ok": ok,
+        "requests_per_second": round(sent / wall, 1) if wall else None,
+        "rate_limited": stats["rate_limited"],
+        "unauthorized": stats["unauthorized"],
+        "failed": len(result["failed"]),
+        "quota_windows": stats["windows"],
+        "quota_efficiency": round(ok / sent, 3) if sent else None,
+        "requests_per_day": round(sent / days, 2),
+        "estimated_hours_per_365_days": real_hours,
+        "response_bytes": stats["bytes"]
+    }
+
+def run_benchmark(days=365, workers=4, modes=MODES, config_factory=MockConfig):
+    """各取得方法でベンチマークを実行する（取得方法ごとに利用枠をリセットしたサーバーを使う）"""
+    return [run_mode(mode, days, workers, config_factory()) for mode in modes]
+
+def main():
+    parser = argparse.ArgumentParser(description="Fitbitデータ取得のスループットベンチマーク")
+    parser.add_argument("--days", type=int, default=365, help="取得する日数（デフォルト: 365）")
+    parser.add_argument("--workers", type=int, default=4, help="並行取得の同時リクエスト数（デフォルト: 4）")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"計測する取得方法（カンマ区切り、デフォルト: {','.join(MODES)}）")
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="モックの平均遅延（ミリ秒、デフォルト: 30）")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="モックの遅延のばらつき（ミリ秒、デフォルト: 10）")
+    parser.add_argument("--quota", type=int, default=150, help="時間窓あたりのリクエスト数（デフォルト: 150）")
+    parser.add_argument("--window-seconds", type=float, default=5.0, help="利用枠がリセットされる間隔（秒、デフォルト: 5）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="500エラーの発生確率（デフォルト: 0）")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="利用枠に関係ない429の発生確率（デフォルト: 0）")
+    args = parser.parse_args()
+    
+    def config_factory():
+        return MockConfig(
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            requests_per_window=args.quota,
+            window_seconds=args.window_seconds,
+            error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate
+        )
+    
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    print("=== Fitbit Fetch Benchmark ===")
+    for result in run_benchmark(args.days, args.workers, modes, config_factory):
+        print(f"\n--- {result.pop('mode')} ---")
+        for key, value in result.items():
+            print(f"{key}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Fitbit Web API互換のローカルモックサーバー
+
+実際のAPIを使わずにデータ取得の経路を計測するために使用する。
+fitbit_data_api.py と demo_FitbitAPI.py が使用するエンドポイントに日付ごとに決まった合成データを返し、
+遅延・401（トークン切れ）・429・500と fitbit-rate-limit-* ヘッダーを再現する。
+環境変数 FITBIT_API_BASE_URL にサーバーのURLを設定するとアプリから利用できる。
+"""
+
+import re
+import gzip
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 期間指定エンドポイントで1回に取得できる最大日数（Fitbit Web APIと同じ）
+RANGE_LIMITS = {"steps": 1095, "activityCalories": 1095, "heart": 365, "sleep": 100}
+
+class MockConfig:
+    """モックサーバーの動作設定"""
+    
+    def __init__(self, latency_ms=50.0, jitter_ms=20.0, requests_per_window=150, window_seconds=3600.0,
+                 unauthorized_rate=0.0, error_rate=0.0, rate_limit_rate=0.0, require_auth=True, compress=True):
+        """
+        初期化
+        
+        Parameters:
+        -----------
+        latency_ms : float
+            応答までの平均遅延（ミリ秒）
+        jitter_ms : float
+            遅延のばらつき（ミリ秒、一様分布）
+        requests_per_window : int
+            時間窓あたりに許可するリクエスト数（Fitbitの1時間あたり150リクエストに相当）
+        window_seconds : float
+            利用枠がリセットされる間隔（秒、ベンチマークでは短くして時間を縮める）
+        unauthorized_rate : float
+            401（expired_token）を返す確率
+        error_rate : float
+            500エラーを返す確率
+        rate_limit_rate : float
+            利用枠に関係なく429を返す確率
+        require_auth : bool
+            Authorizationヘッダーがない場合に401を返すかどうか
+        compress : bool
+            Accept-Encoding に gzip が含まれる場合に圧縮して返すかどうか
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.requests_per_window = requests_per_window
+        self.window_seconds = window_seconds
+        self.unauthorized_rate = unauthorized_rate
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.require_auth = require_auth
+        self.compress = compress
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._used = 0
+        self.stats = {"requests": 0, "ok": 0, "unauthorized": 0, "rate_limited": 0, "errors": 0,
+                      "not_found": 0, "bytes": 0, "windows": 1}
+    
+    def count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+    
+    def consume(self):
+        """利用枠を1回分消費する
+        
+        Returns:
+        --------
+        tuple
+            (許可されたかどうか, 残り回数, リセットまでの秒数)
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._window_start
+            if elapsed >= self.window_seconds:
+                windows = int(elapsed // self.window_seconds)
+                self._window_start += windows * self.window_seconds
+                self.stats["windows"] += windows
+                self._used = 0
+            reset = self._window_start + self.window_seconds - now
+            if self._used >= self.requests_per_window:
+                return False, 0, reset
+            self._used += 1
+            return True, self.requests_per_window - self._used, reset
+
+def _rng(date, salt):
+    """日付ごとに同じデータを返すための乱数生成器"""
+    return random.Random(f"{date}:{salt}")
+
+def _clock(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}:00"
+
+def _resting_heart_rate(date):
+    return _rng(date, "resting").randint(55, 68)
+
+def _heart_rate_zones(date):
+    rng = _rng(date, "zones")
+    return [
+        {"name": "Out of Range", "min": 30, "max": 97, "minutes": rng.randint(1000, 1300), "caloriesOut": 1500.0},
+        {"name": "Fat Burn", "min": 97, "max": 135, "minutes": rng.randint(30, 200), "caloriesOut": 400.0},
+        {"name": "Cardio", "min": 135, "max": 164, "minutes": rng.randint(0, 40), "caloriesOut": 150.0},
+        {"name": "Peak", "min": 164, "max": 220, "minutes": rng.randint(0, 10), "caloriesOut": 30.0},
+    ]
+
+def _heart_day_entry(date):
+    return {
+        "dateTime": date,
+        "value": {
+            "customHeartRateZones": [],
+            "heartRateZones": _heart_rate_zones(date),
+            "restingHeartRate": _resting_heart_rate(date)
+        }
+    }
+
+def _steps(date):
+    return _rng(date, "steps").randint(3000, 14000)
+
+def _activity_calories(date):
+    return _rng(date, "calories").randint(200, 900)
+
+def _sleep_window(date):
+    """睡眠の開始分（0時からの分数）と長さ（分）"""
+    rng = _rng(date, "sleep")
+    return rng.randint(0, 60), rng.randint(330, 450)
+
+def activity_day(date):
+    steps = _steps(date)
+    return {
+        "activities": [],
+        "goals": {"steps": 10000, "caloriesOut": 2500, "distance": 8.05, "activeMinutes": 30},
+        "summary": {
+            "steps": steps,
+            "activityCalories": _activity_calories(date),
+            "caloriesOut": 1800 + _activity_calories(date),
+            "distances": [{"activity": "total", "distance": round(steps * 0.0007, 2)}],
+            "sedentaryMinutes": 700,
+            "lightlyActiveMinutes": 180,
+            "fairlyActiveMinutes": 20,
+            "veryActiveMinutes": 15,
+            "restingHeartRate": _resting_heart_rate(date)
+        }
+    }
+
+def heart_day(date):
+    """1日分の心拍数（1分間隔の日中データを含む、ところどころ欠損あり）"""
+    rng = _rng(date, "intraday")
+    resting = _resting_heart_rate(date)
+    dataset = []
+    for minute in range(24 * 60):
+        if rng.random() < 0.03:
+            continue
+        awake = 7 * 60 <= minute < 23 * 60
+        dataset.append({"time": _clock(minute), "value": resting + (rng.randint(5, 40) if awake else rng.randint(-3, 5))})
+    return {
+        "activities-heart": [_heart_day_entry(date)],
+        "activities-heart-intraday": {"dataset": dataset, "datasetInterval": 1, "datasetType": "minute"}
+    }
+
+def _sleep_item(date):
+    """睡眠ログ（v1.2形式、睡眠ステージ付き）"""
+    rng = _rng(date, "stages")
+    start_minute, length = _sleep_window(date)
+    start = datetime.strptime(date, "%Y-%m-%d") + timedelta(minutes=start_minute)
+    data = []
+    elapsed = 0
+    summary = {}
+    while elapsed < length:
+        level = rng.choice(["light", "light", "deep", "rem", "wake"])
+        minutes = min(length - elapsed, rng.randint(5, 40))
+        data.append({
+            "dateTime": (start + timedelta(minutes=elapsed)).strftime("%Y-%m-%dT%H:%M:%S.000"),
+            "level": level,
+            "seconds": minutes * 60
+        })
+        entry = summary.setdefault(level, {"count": 0, "minutes": 0})
+        entry["count"] += 1
+        entry["minutes"] += minutes
+        elapsed += minutes
+    awake = summary.get("wake", {}).get("minutes", 0)
+    return {
+        "dateOfSleep": date,
+        "startTime": start.strftime("%Y-%m-%dT%H:%M:%S.000"),
+        "endTime": (start + timedelta(minutes=length)).strftime("%Y-%m-%dT%H:%M:%S.000"),
+        "duration": length * 60 * 1000,
+        "minutesAsleep": length - awake,
+        "minutesAwake": awake,
+        "timeInBed": length,
+        "efficiency": round(100 * (length - awake) / length),
+        "isMainSleep": True,
+        "logType": "auto_detected",
+        "type": "stages",
+        "levels": {"data": data, "summary": summary}
+    }
+
+def sleep_day(date):
+    return {"sleep": [_sleep_item(date)], "summary": {"totalSleepRecords": 1}}
+
+def sleep_day_v1(date):
+    """睡眠ログ（v1形式、1分ごとの minuteData 付き）"""
+    item = _sleep_item(date)
+    start_minute, length = _sleep_window(date)
+    levels = {"deep": "1", "light": "1", "rem": "1", "wake": "2"}
+    minute_data = []
+    minute = start_minute
+    for stage in item["levels"]["data"]:
+        for _ in range(stage["seconds"] // 60):
+            minute_data.append({"dateTime": _clock(minute), "value": levels[stage["level"]]})
+            minute += 1
+    item = {key: value for key, value in item.items() if key not in ("levels", "type")}
+    item["minuteData"] = minute_data
+    return {"sleep": [item], "summary": {"totalSleepRecords": 1}}
+
+def spo2_day(date):
+    """睡眠中の1分ごとのSpO2"""
+    rng = _rng(date, "spo2")
+    start_minute, length = _sleep_window(date)
+    return {
+        "dateTime": date,
+        "minutes": [
+            {"minute": f"{date}T{_clock(minute)}", "value": round(rng.uniform(93.0, 99.0), 1)}
+            for minute in range(start_minute, start_minute + length)
+            if rng.random() >= 0.05
+        ]
+    }
+
+def profile():
+    """プロフィール（本番APIの user と同じ主な項目）"""
+    return {
+        "user": {
+            "encodedId": "MOCK01",
+            "fullName": "Mock User",
+            "displayName": "Mock User",
+            "firstName": "Mock",
+            "lastName": "User",
+            "memberSince": "2020-01-01",
+            "timezone": "Asia/Tokyo",
+            "offsetFromUTCMillis": 9 * 60 * 60 * 1000,
+            "locale": "ja_JP",
+            "distanceUnit": "METRIC",
+            "weightUnit": "METRIC",
+            "heightUnit": "METRIC",
+        }
+    }
+
+def _dates(start, end):
+    start = datetime.strptime(start, "%Y-%m-%d")
+    end = datetime.strptime(end, "%Y-%m-%d")
+    return [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((end - start).days + 1)]
+
+def _range(resource, start, end, build):
+    dates = _dates(start, end)
+    if not dates or len(dates) > RANGE_LIMITS[resource]:
+        return None
+    return build(dates)
+
+_DATE = r"(\d{4}-\d{2}-\d{2}|today)"
+
+# (パスの正規表現, 日付を受け取ってレスポンスを返す関数)
+ROUTES = [
+    (re.compile(r"^/1/user/-/profile\.json$"), profile),
+    (re.compile(rf"^/1/user/-/activities/date/{_DATE}\.json$"), activity_day),
+    (re.compile(rf"^/1/user/-/activities/heart/date/{_DATE}/1d(?:/1min)?\.json$"), heart_day),
+    (re.compile(rf"^/1\.2/user/-/sleep/date/{_DATE}\.json$"), sleep_day),
+    (re.compile(rf"^/1/user/-/sleep/date/{_DATE}\.json$"), sleep_day_v1),
+    (re.compile(rf"^/1/user/-/spo2/date/{_DATE}/all\.json$"), spo2_day),
+    (re.compile(rf"^/1/user/-/activities/steps/date/{_DATE}/{_DATE}\.json$"),
+     lambda start, end: _range("steps", start, end, lambda dates: {
+         "activities-steps": [{"dateTime": d, "value": str(_steps(d))} for d in dates]})),
+    (re.compile(rf"^/1/user/-/activities/activityCalories/date/{_DATE}/{_DATE}\.json$"),
+     lambda start, end: _range("activityCalories", start, end, lambda dates: {
+         "activities-activityCalories": [{"dateTime": d, "value": str(_activity_calories(d))} for d in dates]})),
+    (re.compile(rf"^/1/user/-/activities/heart/date/{_DATE}/{_DATE}\.json$"),
+     lambda start, end: _range("heart", start, end, lambda dates: {
+         "activities-heart": [_heart_day_entry(d) for d in dates]})),
+    (re.compile(rf"^/1\.2/user/-/sleep/date/{_DATE}/{_DATE}\.json$"),
+     lambda start, end: _range("sleep", start, end, lambda dates: {
+         "sleep": [_sleep_item(d) for d in dates]})),
+]
+
+def _resolve(value):
+    return datetime.now().strftime("%Y-%m-%d") if value == "today" else value
+
+def _error_body(error_type, message):
+    return {"errors": [{"errorType": error_type, "message": message}], "success": False}
+
+class _MockHandler(BaseHTTPRequestHandler):
+    """Fitbit Web APIのモック"""
+    
+    protocol_version = "HTTP/1.1"
+    config = None
+    
+    def log_message(self, format, *args):
+        # 計測の妨げにならないようアクセスログは出力しない
+        pass
+    
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=UTF-8")
+        if self.config.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=5)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.config.count("bytes", len(body))
+    
+    def do_GET(self):
+        config = self.config
+        config.count("requests")
+        delay = max(0.0, config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)) / 1000
+        time.sleep(delay)
+        
+        if config.require_auth and not self.headers.get("Authorization", "").startswith("Bearer "):
+            config.count("unauthorized")
+            self._send_json(401, _error_body("invalid_token", "Access token invalid (mock)"))
+            return
+        if random.random() < config.unauthorized_rate:
+            config.count("unauthorized")
+            self._send_json(401, _error_body("expired_token", "Access token expired (mock)"))
+            return
+        
+        allowed, remaining, reset = config.consume()
+        rate_headers = {
+            "fitbit-rate-limit-limit": str(config.requests_per_window),
+            "fitbit-rate-limit-remaining": str(remaining),
+            "fitbit-rate-limit-reset": str(max(1, int(round(reset))))
+        }
+        if not allowed or random.random() < config.rate_limit_rate:
+            config.count("rate_limited")
+            rate_headers["retry-after"] = rate_headers["fitbit-rate-limit-reset"]
+            self._send_json(429, _error_body("system", "Too Many Requests (mock)"), rate_headers)
+            return
+        if random.random() < config.error_rate:
+            config.count("errors")
+            self._send_json(500, _error_body("system", "Internal server error (mock)"), rate_headers)
+            return
+        
+        path = urlparse(self.path).path
+        for pattern, build in ROUTES:
+            match = pattern.match(path)
+            if match is None:
+                continue
+            payload = build(*(_resolve(value) for value in match.groups()))
+            if payload is None:
+                config.count("errors")
+                self._send_json(400, _error_body("validation", "Invalid date range (mock)"), rate_headers)
+                return
+            config.count("ok")
+            self._send_json(200, payload, rate_headers)
+            return
+        
+        config.count("not_found")
+        self._send_json(404, _error_body("not_found", f"Unknown resource: {path}"), rate_headers)
+
+def start_mock_server(host="127.0.0.1", port=0, config=None):
+    """モックサーバーをバックグラウンドスレッドで起動する
+    
+    Parameters:
+    -----------
+    host : str
+        待ち受けるホスト
+    port : int
+        待ち受けるポート（0の場合は空いているポートを使用）
+    config : MockConfig, optional
+        動作設定
+    
+    Returns:
+    --------
+    tuple
+        (サーバー, FITBIT_API_BASE_URL に設定するURL)
+    """
+    config = config or MockConfig()
+    handler = type("MockHandler", (_MockHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.config = config
+    
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    
+    base_url = f"http://{server.server_address[0]}:{server.server_address[1]}"
+    return server, base_url
+
+def main():
+    parser = argparse.ArgumentParser(description="Fitbit Web API互換のローカルモックサーバー")
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けるホスト（デフォルト: 127.0.0.1）")
+    parser.add_argument("--port", type=int, default=8090, help="待ち受けるポート（デフォルト: 8090）")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="平均遅延（ミリ秒、デフォルト: 50）")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="遅延のばらつき（ミリ秒、デフォルト: 20）")
+    parser.add_argument("--quota", type=int, default=150, help="時間窓あたりのリクエスト数（デフォルト: 150）")
+    parser.add_argument("--window-seconds", type=float, default=3600.0, help="利用枠がリセットされる間隔（秒、デフォルト: 3600）")
+    parser.add_argument("--unauthorized-rate", type=float, default=0.0, help="401を返す確率（デフォルト: 0）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="500エラーを返す確率（デフォルト: 0）")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="利用枠に関係なく429を返す確率（デフォルト: 0）")
+    args = parser.parse_args()
+    
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        requests_per_window=args.quota,
+        window_seconds=args.window_seconds,
+        unauthorized_rate=args.unauthorized_rate,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate
+    )
+    server, base_url = start_mock_server(args.host, args.port, config)
+    print(f"Fitbitモックサーバーを起動しました: {base_url}")
+    print(f"FITBIT_API_BASE_URL={base_url} を設定するとアプリからモックを利用できます（Ctrl+Cで終了）")
+    
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"\n終了しました: {config.stats}")
+
+if __name__ == "__main__":
+    main()
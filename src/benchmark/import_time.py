@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+起動時のモジュール読み込み時間を計測するスクリプト
+
+`python -X importtime` で各対象（main.py --help、Streamlitアプリ、AI分析モジュールなど）を
+別プロセスで起動し、起動にかかった時間と、読み込みに時間のかかっているモジュールを表示する。
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 計測する対象（python の引数）
+TARGETS = {
+    "main_help": ["main.py", "--help"],
+    "app": ["app.py"],
+    "ai_insights": ["-c", "import src.analysis.ai_insights"],
+    "data_visualizer": ["-c", "import src.utils.data_visualizer"],
+    "pipeline": ["-c", "import src.pipeline"],
+}
+
+# 起動時に読み込まれていると目立つ重いパッケージ
+HEAVY_PACKAGES = ("openai", "streamlit", "plotly", "pandas", "numpy", "scipy", "pyarrow", "httpx", "requests")
+
+_LINE_PATTERN = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def parse_importtime(stderr):
+    """-X importtime の出力を (モジュール名, 自身の時間[us], 累積時間[us], 深さ) のリストに変換する"""
+    entries = []
+    for line in stderr.splitlines():
+        match = _LINE_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return entries
+
+def measure(target, repeat=3, timeout=120):
+    """対象を別プロセスで起動し、起動時間（中央値）とモジュールごとの読み込み時間を返す
+    
+    最初の1回は .pyc の作成などを含むため計測から除外する。
+    
+    Parameters:
+    -----------
+    target : str
+        TARGETS のキー
+    repeat : int
+        計測する回数
+    timeout : float
+        1回あたりのタイムアウト秒数
+    
+    Returns:
+    --------
+    dict
+        起動時間・読み込み時間の合計・重いパッケージ・累積時間の長いモジュール
+    """
+    command = [sys.executable, "-X", "importtime"] + TARGETS[target]
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR)
+    wall_times = []
+    entries = []
+    for i in range(repeat + 1):
+        started = time.perf_counter()
+        completed = subprocess.run(command, cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE, text=True, timeout=timeout)
+        elapsed = time.perf_counter() - started
+        if i == 0:
+            continue
+        wall_times.append(elapsed)
+        entries = parse_importtime(completed.stderr)
+    
+    wall_times.sort()
+    top_level = sorted((entry for entry in entries if entry[3] == 0), key=lambda entry: entry[2], reverse=True)
+    loaded = {name.split(".")[0] for name, _, _, _ in entries}
+    return {
+        "target": target,
+        "command": " ".join(TARGETS[target]),
+        "wall_seconds": round(wall_times[len(wall_times) // 2], 3),
+        "import_seconds": round(sum(entry[1] for entry in entries) / 1e6, 3),
+        "modules": len(entries),
+        "returncode": completed.returncode,
+        "heavy_packages": [name for name in HEAVY_PACKAGES if name in loaded],
+        "top": [
+            {"module": name, "cumulative_ms": round(cumulative_us / 1000, 1)}
+            for name, _, cumulative_us, _ in top_level[:10]
+        ],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="起動時のモジュール読み込み時間を計測するスクリプト")
+    parser.add_argument("--targets", default=",".join(TARGETS),
+                        help=f"計測する対象をカンマ区切りで指定（{', '.join(TARGETS)}、デフォルト: すべて）")
+    parser.add_argument("--repeat", type=int, default=3, help="各対象の計測回数（デフォルト: 3）")
+    parser.add_argument("--top", type=int, default=5, help="表示する読み込み時間の長いモジュールの数（デフォルト: 5）")
+    parser.add_argument("--json", default=None, help="結果をJSONで保存するファイル")
+    args = parser.parse_args()
+    
+    print("=== Import Time Report ===")
+    results = []
+    for target in [target.strip() for target in args.targets.split(",") if target.strip()]:
+        if target not in TARGETS:
+            print(f"Warning: 不明な対象です: {target}")
+            continue
+        try:
+            result = measure(target, max(1, args.repeat))
+        except subprocess.TimeoutExpired:
+            print(f"Warning: {target}の計測がタイムアウトしました")
+            continue
+        results.append(result)
+        
+        print(f"\n[{target}] python {result['command']}")
+        print(f"起動時間: {result['wall_seconds']}秒、モジュールの読み込み: {result['import_seconds']}秒（{result['modules']}モジュール）")
+        if result["returncode"] != 0:
+            print(f"Warning: 終了コード {result['returncode']}（途中で失敗したため読み込み時間は不完全です）")
+        print(f"読み込まれた重いパッケージ: {', '.join(result['heavy_packages']) or 'なし'}")
+        for item in result["top"][:args.top]:
+            print(f"  {item['cumulative_ms']:9.1f}ms  {item['module']}")
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n結果を {args.json} に保存しました")
+
+if __name__ == "__main__":
+    main()
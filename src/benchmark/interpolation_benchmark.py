@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分単位の時系列データの補間処理のベンチマーク
+
+欠損を含む1年分の分単位の心拍数・SpO2データを生成し、従来のスプライン補間
+（pandas の interpolate(method='spline', order=2)）と src.utils.interpolation の
+linear / pchip / previous の処理時間と、長い欠損を埋めてしまった点の数を比較する。
+スプライン補間は非常に遅い（30日分で2分程度）ため、--spline を指定した場合だけ先頭の
+--spline-days 日分で計測する。
+"""
+
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from src.utils.interpolation import interpolate_frame
+
+def make_series(days=365, gap_rate=0.02, long_gaps_per_day=2, seed=0):
+    """ベンチマーク用の分単位のデータを生成する
+    
+    Parameters:
+    -----------
+    days : int
+        日数
+    gap_rate : float
+        ランダムに欠損させる点の割合
+    long_gaps_per_day : int
+        1日あたりの長い欠損（30分～3時間、装着していない時間を想定）の数
+    seed : int
+        乱数のシード
+    
+    Returns:
+    --------
+    tuple
+        (DataFrame, 長い欠損の位置を示す真偽値配列)
+    """
+    rng = np.random.default_rng(seed)
+    n = days * 24 * 60
+    index = pd.date_range("2024-01-01", periods=n, freq="1min")
+    minutes = np.arange(n)
+    heart = 65 + 15 * np.sin(2 * np.pi * minutes / (24 * 60)) + rng.normal(0, 3, n)
+    spo2 = 96 + rng.normal(0, 1, n)
+    values = np.column_stack([heart, spo2])
+    
+    values[rng.random(n) < gap_rate] = np.nan
+    long_gap = np.zeros(n, dtype=bool)
+    for start in rng.integers(0, n, days * long_gaps_per_day):
+        long_gap[start:start + rng.integers(30, 180)] = True
+    values[long_gap] = np.nan
+    
+    return pd.DataFrame(values, index=index, columns=["heart_rate", "spo2"]), long_gap
+
+def spline_interpolate(df):
+    """従来のスプライン補間（列ごと）"""
+    result = df.copy()
+    for column in result.columns:
+        result[column] = result[column].interpolate(method="spline", order=2)
+    return result
+
+def run_benchmark(days=365, gap_rate=0.02, max_gap="15min", repeat=3, spline=False, spline_days=3):
+    """ベンチマークを実行する
+    
+    Parameters:
+    -----------
+    days : int
+        日数
+    gap_rate : float
+        ランダムに欠損させる点の割合
+    max_gap : str
+        補間する欠損の最大の長さ
+    repeat : int
+        各方法の実行回数（最小値を採用する）
+    spline : bool
+        従来のスプライン補間も計測する
+    spline_days : int
+        スプライン補間に使う日数（先頭から。日数が多いと非常に時間がかかるため）
+    
+    Returns:
+    --------
+    list
+        方法ごとの計測結果
+    """
+    df, long_gap = make_series(days, gap_rate)
+    
+    cases = []
+    if spline:
+        points = min(days, spline_days) * 24 * 60
+        cases.append(("spline(order=2)", spline_interpolate, 1, df.iloc[:points], long_gap[:points]))
+    for method in ("linear", "pchip", "previous"):
+        cases.append((method, lambda frame, method=method: interpolate_frame(frame, method, max_gap), repeat, df, long_gap))
+    
+    results = []
+    for name, func, runs, frame, gaps in cases:
+        missing = int(frame.isna().to_numpy().sum())
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            result = func(frame)
+            timings.append(time.perf_counter() - started)
+        values = result.to_numpy()
+        filled = missing - int(np.isnan(values).sum())
+        results.append({
+            "method": name,
+            "days": len(frame) // (24 * 60),
+            "seconds": round(min(timings), 3),
+            "points_per_second": round(values.size / min(timings)) if min(timings) else None,
+            "filled": filled,
+            "filled_in_long_gaps": int((~np.isnan(values[gaps])).sum())
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="分単位の時系列データの補間処理のベンチマーク")
+    parser.add_argument("--days", type=int, default=365, help="日数（デフォルト: 365）")
+    parser.add_argument("--gap-rate", type=float, default=0.02, help="ランダムに欠損させる点の割合（デフォルト: 0.02）")
+    parser.add_argument("--max-gap", default="15min", help="補間する欠損の最大の長さ（デフォルト: 15min）")
+    parser.add_argument("--repeat", type=int, default=3, help="各方法の実行回数（デフォルト: 3）")
+    parser.add_argument("--spline", action="store_true", help="従来のスプライン補間も計測する（非常に遅いため --spline-days 日分のみ）")
+    parser.add_argument("--spline-days", type=int, default=3, help="スプライン補間に使う日数（デフォルト: 3）")
+    args = parser.parse_args()
+    
+    print("=== Interpolation Benchmark ===")
+    print(f"days: {args.days}, points: {args.days * 24 * 60 * 2}, max_gap: {args.max_gap}")
+    for result in run_benchmark(args.days, args.gap_rate, args.max_gap, args.repeat, args.spline, args.spline_days):
+        print(", ".join(f"{key}: {value}" for key, value in result.items()))
+
+if __name__ == "__main__":
+    main()
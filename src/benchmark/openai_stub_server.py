@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+OpenAI互換のローカルスタブサーバー
+
+実際のAPIを使わずにAI分析の経路を計測するために使用する。
+/v1/chat/completions に対して、設定した遅延・ストリーミング・エラー・429を返す。
+"""
+
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_RESPONSE_TEXT = (
+    "- **心拍数**: この時間帯の心拍数は安定しており、安静状態が続いていたと考えられます。\n"
+    "- **睡眠**: 深い睡眠とレム睡眠のバランスは概ね良好です。\n"
+    "- **提案**: 就寝前のスクリーンタイムを控えると、さらに睡眠の質が向上する可能性があります。"
+)
+
+class StubConfig:
+    """スタブサーバーの動作設定"""
+    
+    def __init__(self, latency_ms=200.0, jitter_ms=50.0, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=1.0, stream_chunk_ms=10.0, response_text=STUB_RESPONSE_TEXT):
+        """
+        初期化
+        
+        Parameters:
+        -----------
+        latency_ms : float
+            応答までの平均遅延（ミリ秒）
+        jitter_ms : float
+            遅延のばらつき（ミリ秒、一様分布）
+        error_rate : float
+            500エラーを返す確率
+        rate_limit_rate : float
+            429エラーを返す確率
+        retry_after : float
+            429応答の retry-after ヘッダーの秒数
+        stream_chunk_ms : float
+            ストリーミング時のチャンク間隔（ミリ秒）
+        response_text : str
+            返す応答テキスト
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.stream_chunk_ms = stream_chunk_ms
+        self.response_text = response_text
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0, "streams": 0}
+    
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Chat Completions APIのスタブ"""
+    
+    protocol_version = "HTTP/1.1"
+    config = None
+    
+    def log_message(self, format, *args):
+        # 計測の妨げにならないようアクセスログは出力しない
+        pass
+    
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_POST(self):
+        config = self.config
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+        
+        config.count("requests")
+        delay = max(0.0, config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)) / 1000
+        time.sleep(delay)
+        
+        roll = random.random()
+        if roll < config.rate_limit_rate:
+            config.count("rate_limited")
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached (stub)", "type": "requests", "code": "rate_limit_exceeded"}},
+                headers={
+                    "retry-after": str(config.retry_after),
+                    "x-ratelimit-remaining-requests": "0",
+                    "x-ratelimit-reset-requests": f"{config.retry_after}s",
+                }
+            )
+            return
+        if roll < config.rate_limit_rate + config.error_rate:
+            config.count("errors")
+            self._send_json(500, {"error": {"message": "Internal server error (stub)", "type": "server_error"}})
+            return
+        
+        model = request.get("model", "stub-model")
+        prompt_tokens = sum(len(m.get("content", "")) for m in request.get("messages", []))
+        completion_tokens = len(config.response_text)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        
+        if request.get("stream"):
+            config.count("streams")
+            self._stream(completion_id, created, model)
+            return
+        
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": config.response_text},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        })
+    
+    def _stream(self, completion_id, created, model):
+        """Server-Sent Events形式でチャンクを返す"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        
+        text = self.config.response_text
+        chunk_size = 16
+        for i in range(0, len(text), chunk_size):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": text[i:i + chunk_size]}, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.config.stream_chunk_ms / 1000)
+        
+        done = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+        }
+        self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self.wfile.flush()
+        self.close_connection = True
+
+def start_stub_server(host="127.0.0.1", port=0, config=None):
+    """スタブサーバーをバックグラウンドスレッドで起動する
+    
+    Parameters:
+    -----------
+    host : str
+        待ち受けるホスト
+    port : int
+        待ち受けるポート（0の場合は空いているポートを使用）
+    config : StubConfig, optional
+        動作設定
+    
+    Returns:
+    --------
+    tuple
+        (サーバー, OpenAIクライアント用のbase_url)
+    """
+    config = config or StubConfig()
+    handler = type("StubHandler", (_StubHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.config = config
+    
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    
+    base_url = f"http://{server.server_address[0]}:{server.server_address[1]}/v1"
+    return server, base_url
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI互換のローカルスタブサーバー")
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けるホスト（デフォルト: 127.0.0.1）")
+    parser.add_argument("--port", type=int, default=8089, help="待ち受けるポート（デフォルト: 8089）")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="平均遅延（ミリ秒、デフォルト: 200）")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="遅延のばらつき（ミリ秒、デフォルト: 50）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="500エラーを返す確率（デフォルト: 0）")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="429エラーを返す確率（デフォルト: 0）")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429応答のretry-after秒数（デフォルト: 1）")
+    args = parser.parse_args()
+    
+    config = StubConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after
+    )
+    server, base_url = start_stub_server(args.host, args.port, config)
+    print(f"OpenAIスタブサーバーを起動しました: {base_url}")
+    print(f"OPENAI_BASE_URL={base_url} を設定するとアプリからスタブを利用できます（Ctrl+Cで終了）")
+    
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"\n終了しました: {config.stats}")
+
+if __name__ == "__main__":
+    main()
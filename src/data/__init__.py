@@ -0,0 +1,4 @@
+"""
+データモジュール
+取得済みのFitbitデータを読み込み・加工するための機能を提供
+"""
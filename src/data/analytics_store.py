@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+取得済みのFitbitデータを問い合わせるための組み込みデータベース（SQLite）
+
+日ごとのJSONファイル・パック形式の生データから次のテーブルを作成し、ダッシュボードや
+コマンドラインツールの読み込み・集計をSQLで行う。日付・時刻の列にはインデックスを張り、
+期間や時間帯の条件はSQLの WHERE 句で絞り込む（必要な行だけを読み込む）。
+
+- daily: 1日1行の集計（歩数・活動カロリー・睡眠時間・睡眠効率・安静時心拍数）
+- heart_rate_intraday: 1分ごとの心拍数（time が主キー）
+- sleep_stages: 睡眠ステージの区間（睡眠データの日付と開始時刻のインデックス）
+- sources: 取り込んだ生データの署名（追加・更新された日だけを取り込み直すため）
+"""
+
+import os
+import time
+import hashlib
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+
+import pandas as pd
+
+from src.data.raw_store import list_daily_sources, load_daily_record
+from src.data.fitbit_direct_process import KINDS, summarize_day
+
+# データベースの保存先（データディレクトリには書き込まない。読み取り専用のフォルダも読み込めるようにするため）
+DEFAULT_STORE_DIR = os.path.join("output", "analytics")
+SCHEMA_VERSION = 1
+
+_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def _print_warning(source, error):
+    print(f"Warning: {source}の読み込み中にエラーが発生しました: {error}")
+
+def default_db_path(data_dir):
+    """データディレクトリの絶対パスから決まるデータベースファイルのパスを返す
+    
+    保存先は環境変数 FITBIT_ANALYTICS_DIR（なければ output/analytics）。
+    """
+    absolute = os.path.abspath(data_dir)
+    digest = hashlib.sha256(absolute.encode("utf-8")).hexdigest()[:16]
+    name = os.path.basename(absolute.rstrip(os.sep)) or "data"
+    return os.path.join(os.getenv("FITBIT_ANALYTICS_DIR", DEFAULT_STORE_DIR), f"{name}-{digest}.sqlite3")
+
+def _time_bounds(target_date, start_time=None, end_time=None):
+    """対象日・時間帯（HH:MM）を time 列と比較する文字列の範囲に変換する"""
+    if start_time and end_time:
+        return f"{target_date} {start_time}:00", f"{target_date} {end_time}:00"
+    return f"{target_date} 00:00:00", f"{target_date} 23:59:59"
+
+class AnalyticsStore:
+    """生データから作成したテーブルをSQLiteで問い合わせるクラス"""
+    
+    def __init__(self, data_dir, path=None):
+        """
+        初期化
+        
+        Parameters:
+        -----------
+        data_dir : str
+            生データのディレクトリ
+        path : str, optional
+            データベースファイルのパス（未指定の場合は default_db_path(data_dir)）
+        """
+        self.data_dir = data_dir
+        self.path = path or default_db_path(data_dir)
+        self._refresh_lock = threading.Lock()
+        
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                # スキーマが変わった場合は作り直す（生データから再作成できるため）
+                for table in ("sources", "daily", "heart_rate_intraday", "sleep_stages"):
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS sources (
+                    kind TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    signature TEXT NOT NULL,
+                    PRIMARY KEY (kind, date)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS daily (
+                    date TEXT PRIMARY KEY,
+                    steps INTEGER,
+                    active_calories INTEGER,
+                    sleep_hours REAL,
+                    sleep_efficiency REAL,
+                    resting_heart_rate INTEGER
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS heart_rate_intraday (
+                    time TEXT PRIMARY KEY,
+                    heart_rate INTEGER NOT NULL
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS sleep_stages (
+                    date TEXT NOT NULL,
+                    time TEXT NOT NULL,
+                    sleep_stage TEXT NOT NULL,
+                    duration_seconds INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_sleep_stages_date_time ON sleep_stages (date, time);
+                CREATE INDEX IF NOT EXISTS idx_sleep_stages_time ON sleep_stages (time);
+                """
+            )
+    
+    @contextmanager
+    def _connect(self):
+        # 呼び出しごとに接続を作成する（sqlite3の接続はスレッド間で共有できないため）
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
+    def refresh(self, on_error=_print_warning):
+        """追加・更新・削除された日の生データをテーブルに反映する
+        
+        Parameters:
+        -----------
+        on_error : callable
+            読み込みに失敗した場合に (読み込み元, 例外) を受け取る関数
+        
+        Returns:
+        --------
+        dict
+            取り込んだ日数（updated）と削除した日数（removed）
+        """
+        with self._refresh_lock:
+            current = {}
+            for kind in KINDS:
+                for date, (signature, _) in list_daily_sources(self.data_dir, kind).items():
+                    try:
+                        datetime.strptime(date, "%Y-%m-%d")
+                    except ValueError:
+                        continue
+                    current[(kind, date)] = signature
+            
+            with self._connect() as conn:
+                stored = {(kind, date): signature for kind, date, signature in conn.execute("SELECT kind, date, signature FROM sources")}
+            # 1種類でも変わった日・なくなった日は、その日の行をすべて取り込み直す
+            changed = {date for (kind, date), signature in current.items() if stored.get((kind, date)) != signature}
+            changed |= {date for kind, date in stored if (kind, date) not in current}
+            if not changed:
+                return {"updated": 0, "removed": 0}
+            
+            updated = 0
+            removed = 0
+            for date in sorted(changed):
+                records = {}
+                try:
+                    for kind in KINDS:
+                        if (kind, date) in current:
+                            records[kind] = load_daily_record(self.data_dir, kind, date)
+                except Exception as e:
+                    # 読み込めなかった日は記録せず、次回の更新で再度取り込む
+                    on_error(f"{kind}_{date}", e)
+                    continue
+                with self._connect() as conn:
+                    self._replace_day(conn, date, records, current)
+                if records:
+                    updated += 1
+                else:
+                    removed += 1
+            return {"updated": updated, "removed": removed}
+    
+    @staticmethod
+    def _replace_day(conn, date, records, current):
+        """1日分の行を削除してから取り込み直す（1つのトランザクションで実行する）"""
+        next_date = (datetime.strptime(date, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+        conn.execute("DELETE FROM daily WHERE date = ?", (date,))
+        conn.execute("DELETE FROM heart_rate_intraday WHERE time >= ? AND time < ?", (date, next_date))
+        conn.execute("DELETE FROM sleep_stages WHERE date = ?", (date,))
+        conn.execute("DELETE FROM sources WHERE date = ?", (date,))
+        if not records:
+            return
+        
+        row = summarize_day(date, records.get("activity"), records.get("sleep"), records.get("heart_rate"))
+        conn.execute(
+            """
+            INSERT INTO daily (date, steps, active_calories, sleep_hours, sleep_efficiency, resting_heart_rate)
+            VALUES (:date, :steps, :active_calories, :sleep_hours, :sleep_efficiency, :resting_heart_rate)
+            """,
+            row
+        )
+        
+        dataset = (records.get("heart_rate") or {}).get("activities-heart-intraday", {}).get("dataset", [])
+        conn.executemany(
+            "INSERT OR REPLACE INTO heart_rate_intraday (time, heart_rate) VALUES (?, ?)",
+            ((f"{date} {point['time']}", int(point["value"])) for point in dataset if "time" in point and "value" in point)
+        )
+        
+        stages = []
+        for sleep_item in (records.get("sleep") or {}).get("sleep") or []:
+            for point in sleep_item.get("levels", {}).get("data", []):
+                if "dateTime" not in point or "level" not in point:
+                    continue
+                try:
+                    time_point = datetime.strptime(point["dateTime"], "%Y-%m-%dT%H:%M:%S.%f")
+                except ValueError:
+                    continue
+                stages.append((date, time_point.strftime(_TIME_FORMAT), point["level"], point.get("seconds", 0) or 0))
+        conn.executemany(
+            "INSERT INTO sleep_stages (date, time, sleep_stage, duration_seconds) VALUES (?, ?, ?, ?)",
+            stages
+        )
+        
+        conn.executemany(
+            "INSERT INTO sources (kind, date, signature) VALUES (?, ?, ?)",
+            [(kind, date, current[(kind, date)]) for kind in records]
+        )
+    
+    def _query(self, sql, params=(), parse_dates=None):
+        with self._connect() as conn:
+            df = pd.read_sql_query(sql, conn, params=params)
+        for column in parse_dates or []:
+            df[column] = pd.to_datetime(df[column])
+        return df
+    
+    def iter_query(self, sql, params=(), batch_size=65536):
+        """問い合わせの結果を batch_size 行ずつのリストとして返す（結果全体をメモリに載せない）"""
+        with self._connect() as conn:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+    
+    def _daily(self, columns, condition, days=None):
+        """日次の列を日付順に返す（days を指定した場合は最新の days 日分）"""
+        sql = f"SELECT date, {', '.join(columns)} FROM daily WHERE {condition} ORDER BY date DESC"
+        params = ()
+        if days:
+            sql += " LIMIT ?"
+            params = (int(days),)
+        df = self._query(sql, params, parse_dates=["date"])
+        if df.empty:
+            return pd.DataFrame()
+        return df.iloc[::-1].reset_index(drop=True)
+    
+    def load_activity_data(self, days=None):
+        """歩数・活動カロリーのDataFrame（date, steps, active_calories）"""
+        return self._daily(["steps", "active_calories"], "steps IS NOT NULL", days)
+    
+    def load_sleep_data(self, days=None):
+        """睡眠時間・睡眠効率のDataFrame（date, sleep_hours, efficiency）"""
+        return self._daily(["sleep_hours", "COALESCE(sleep_efficiency, 0) AS efficiency"], "sleep_hours IS NOT NULL", days)
+    
+    def load_heart_rate_data(self, days=None):
+        """安静時心拍数のDataFrame（date, resting_heart_rate）"""
+        return self._daily(["resting_heart_rate"], "resting_heart_rate IS NOT NULL", days)
+    
+    def summary_metrics(self, days=None):
+        """最新の days 日分（項目ごと）の平均歩数・平均睡眠時間・平均安静時心拍数を返す
+        
+        Returns:
+        --------
+        dict
+            avg_steps, avg_sleep_hours, avg_resting_heart_rate（データがない項目はNone）
+        """
+        limit = int(days) if days else -1
+        sql = """
+            SELECT
+                (SELECT AVG(steps) FROM (SELECT steps FROM daily WHERE steps IS NOT NULL ORDER BY date DESC LIMIT :limit)),
+                (SELECT AVG(sleep_hours) FROM (SELECT sleep_hours FROM daily WHERE sleep_hours IS NOT NULL ORDER BY date DESC LIMIT :limit)),
+                (SELECT AVG(resting_heart_rate) FROM (SELECT resting_heart_rate FROM daily WHERE resting_heart_rate IS NOT NULL ORDER BY date DESC LIMIT :limit))
+        """
+        with self._connect() as conn:
+            avg_steps, avg_sleep_hours, avg_resting_heart_rate = conn.execute(sql, {"limit": limit}).fetchone()
+        return {
+            "avg_steps": avg_steps,
+            "avg_sleep_hours": avg_sleep_hours,
+            "avg_resting_heart_rate": avg_resting_heart_rate,
+        }
+    
+    def available_dates(self, kind="heart_rate"):
+        """データが存在する日付（datetime）を新しい順に返す"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT date FROM sources WHERE kind = ? ORDER BY date DESC", (kind,)).fetchall()
+        return [datetime.strptime(date, "%Y-%m-%d") for date, in rows]
+    
+    def table_counts(self):
+        """テーブルごとの行数を返す"""
+        with self._connect() as conn:
+            return {
+                table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("daily", "heart_rate_intraday", "sleep_stages")
+            }
+    
+    def has_record(self, kind, date):
+        """指定日の生データを取り込んでいるかどうか"""
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM sources WHERE kind = ? AND date = ?", (kind, date)).fetchone() is not None
+    
+    def resting_heart_rate(self, date):
+        """指定日の安静時心拍数（ない場合はNone）"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT resting_heart_rate FROM daily WHERE date = ?", (date,)).fetchone()
+        return row[0] if row else None
+    
+    def intraday_heart_rate(self, target_date, start_time=None, end_time=None):
+        """特定日・特定時間帯の1分ごとの心拍数のDataFrame（time, heart_rate）"""
+        start, end = _time_bounds(target_date, start_time, end_time)
+        return self._query(
+            "SELECT time, heart_rate FROM heart_rate_intraday WHERE time >= ? AND time <= ? ORDER BY time",
+            (start, end), parse_dates=["time"]
+        )
+    
+    def has_intraday_heart_rate(self, date):
+        """指定日の1分ごとの心拍数があるかどうか"""
+        start, end = _time_bounds(date)
+        with self._connect() as conn:
+            row = conn.execute("SELECT 1 FROM heart_rate_intraday WHERE time >= ? AND time <= ? LIMIT 1", (start, end)).fetchone()
+        return row is not None
+    
+    def sleep_stages(self, target_date, start_time=None, end_time=None):
+        """特定日の睡眠データの睡眠ステージのDataFrame（time, sleep_stage, duration_seconds）
+        
+        時間帯を指定した場合は、対象日のその時間帯に始まる区間だけを返す。
+        """
+        sql = "SELECT time, sleep_stage, duration_seconds FROM sleep_stages WHERE date = ?"
+        params = (target_date,)
+        if start_time and end_time:
+            sql += " AND time >= ? AND time <= ?"
+            params += _time_bounds(target_date, start_time, end_time)
+        df = self._query(sql + " ORDER BY time", params, parse_dates=["time"])
+        return df if not df.empty else pd.DataFrame()
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_analytics_store(data_dir):
+    """データディレクトリごとにプロセス内で共有する AnalyticsStore を返す"""
+    key = os.path.abspath(data_dir)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = AnalyticsStore(data_dir)
+        return _stores[key]
+
+def main():
+    parser = argparse.ArgumentParser(description="取得済みのFitbitデータから分析用のデータベース（SQLite）を作成・更新するスクリプト")
+    parser.add_argument("--data-dir", default="data", help="生データのディレクトリ（デフォルト: data）")
+    parser.add_argument("--db", default=None, help="データベースファイルのパス（デフォルト: output/analytics/<ディレクトリ名>-<パスのハッシュ>.sqlite3）")
+    args = parser.parse_args()
+    
+    print("=== Fitbit Analytics Store ===")
+    if not os.path.isdir(args.data_dir):
+        print(f"エラー: データディレクトリ {args.data_dir} が見つかりません")
+        return
+    
+    store = AnalyticsStore(args.data_dir, args.db)
+    started = time.perf_counter()
+    result = store.refresh()
+    elapsed = time.perf_counter() - started
+    print(f"取り込み: {result['updated']}日、削除: {result['removed']}日（{elapsed:.2f}秒）")
+    for table, count in store.table_counts().items():
+        print(f"{table}: {count}行")
+    print(f"データベース: {store.path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+日次・日中のテーブルをArrow IPC形式で書き出すモジュール
+
+AnalyticsStore（SQLite）のテーブルを一定行数ずつ読み出し、RecordBatch として順に書き出す
+（テーブル全体をメモリに載せない）。出力形式は次の2つ。
+
+- feather: Arrow IPCファイル形式（Feather V2）。pyarrow.memory_map で開けばコピーなしで読み込める
+- stream: Arrow IPCストリーム形式。パイプやソケットで別のプロセス・サービスに流す場合に使う
+
+ノートブックなどからは read_table() で読み込める。
+"""
+
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from src.data.analytics_store import get_analytics_store
+
+TABLES = ("daily", "heart_rate_intraday", "sleep_stages")
+FORMATS = {"feather": ".arrow", "stream": ".arrows"}
+COMPRESSIONS = ("none", "lz4", "zstd")
+DEFAULT_BATCH_SIZE = 65536
+
+SCHEMAS = {
+    "daily": pa.schema([
+        ("date", pa.date32()),
+        ("steps", pa.int32()),
+        ("active_calories", pa.int32()),
+        ("sleep_hours", pa.float64()),
+        ("sleep_efficiency", pa.float64()),
+        ("resting_heart_rate", pa.int16()),
+    ]),
+    "heart_rate_intraday": pa.schema([
+        ("time", pa.timestamp("s")),
+        ("heart_rate", pa.int16()),
+    ]),
+    "sleep_stages": pa.schema([
+        ("date", pa.date32()),
+        ("time", pa.timestamp("s")),
+        ("sleep_stage", pa.string()),
+        ("duration_seconds", pa.int32()),
+    ]),
+}
+
+# テーブルごとの期間の絞り込みに使う列（SQLiteのインデックス・主キー）
+_RANGE_COLUMNS = {
+    "daily": "date",
+    "heart_rate_intraday": "time",
+    "sleep_stages": "date",
+}
+
+def _to_array(values, field):
+    """SQLiteから読み出した列を Arrow の配列に変換する（日付・時刻は文字列から一括で変換する）"""
+    if pa.types.is_date32(field.type):
+        return pc.strptime(pa.array(values, pa.string()), format="%Y-%m-%d", unit="s").cast(pa.date32())
+    if pa.types.is_timestamp(field.type):
+        return pc.strptime(pa.array(values, pa.string()), format="%Y-%m-%d %H:%M:%S", unit="s")
+    return pa.array(values, field.type)
+
+def iter_batches(store, table, start=None, end=None, batch_size=DEFAULT_BATCH_SIZE):
+    """テーブルを batch_size 行ずつ RecordBatch として返す
+    
+    Parameters:
+    -----------
+    store : AnalyticsStore
+        読み出し元（refresh 済みのもの）
+    table : str
+        テーブル名（daily, heart_rate_intraday, sleep_stages）
+    start, end : str, optional
+        期間（YYYY-MM-DD、両端を含む）
+    batch_size : int
+        1つの RecordBatch の行数
+    
+    Yields:
+    -------
+    pa.RecordBatch
+    """
+    schema = SCHEMAS[table]
+    column = _RANGE_COLUMNS[table]
+    conditions = []
+    params = []
+    if start:
+        conditions.append(f"{column} >= ?")
+        params.append(start)
+    if end:
+        if column == "time":
+            # time 列は "YYYY-MM-DD HH:MM:SS" のため、終了日の翌日より前を条件にする
+            conditions.append(f"{column} < ?")
+            params.append((datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d"))
+        else:
+            conditions.append(f"{column} <= ?")
+            params.append(end)
+    sql = f"SELECT {', '.join(schema.names)} FROM {table}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += f" ORDER BY {column}"
+    
+    for rows in store.iter_query(sql, params, batch_size):
+        columns = list(zip(*rows))
+        yield pa.RecordBatch.from_arrays(
+            [_to_array(values, field) for values, field in zip(columns, schema)],
+            schema=schema
+        )
+
+def _open_writer(sink, schema, fmt, compression):
+    options = pa.ipc.IpcWriteOptions(compression=None if compression == "none" else compression)
+    if fmt == "stream":
+        return pa.ipc.new_stream(sink, schema, options=options)
+    return pa.ipc.new_file(sink, schema, options=options)
+
+def write_batches(batches, sink, schema, fmt="feather", compression="none"):
+    """RecordBatch を順にIPC形式で書き出し、書き出した行数を返す
+    
+    Parameters:
+    -----------
+    batches : iterable
+        pa.RecordBatch
+    sink : str or file-like
+        出力先（ファイルパス、または sys.stdout.buffer などのバイナリストリーム）
+    schema : pa.Schema
+        スキーマ
+    fmt : str
+        feather（IPCファイル形式）または stream（IPCストリーム形式）
+    compression : str
+        none, lz4, zstd
+    """
+    rows = 0
+    with _open_writer(sink, schema, fmt, compression) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+def export_table(store, table, path, fmt="feather", compression="none", start=None, end=None, batch_size=DEFAULT_BATCH_SIZE):
+    """1つのテーブルをファイルに書き出す（一時ファイルに書いてから置き換える）
+    
+    Returns:
+    --------
+    dict
+        テーブル名・パス・行数・バイト数・所要時間
+    """
+    started = time.perf_counter()
+    temp_path = f"{path}.tmp"
+    rows = write_batches(iter_batches(store, table, start, end, batch_size), temp_path, SCHEMAS[table], fmt, compression)
+    os.replace(temp_path, path)
+    elapsed = time.perf_counter() - started
+    return {
+        "table": table,
+        "path": path,
+        "rows": rows,
+        "bytes": os.path.getsize(path),
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed) if elapsed else None,
+    }
+
+def export_tables(data_dir, output_dir, tables=TABLES, fmt="feather", compression="none",
+                  start=None, end=None, batch_size=DEFAULT_BATCH_SIZE):
+    """データディレクトリの日次・日中のテーブルをArrow IPC形式で書き出す
+    
+    Parameters:
+    -----------
+    data_dir : str
+        生データのディレクトリ（AnalyticsStore を最新の状態にしてから書き出す）
+    output_dir : str
+        出力先ディレクトリ（<テーブル名>.arrow または <テーブル名>.arrows）
+    tables : tuple
+        書き出すテーブル
+    fmt : str
+        feather または stream
+    compression : str
+        none, lz4, zstd
+    start, end : str, optional
+        期間（YYYY-MM-DD、両端を含む）
+    batch_size : int
+        1つの RecordBatch の行数
+    
+    Returns:
+    --------
+    list
+        テーブルごとの結果
+    """
+    store = get_analytics_store(data_dir)
+    store.refresh()
+    os.makedirs(output_dir, exist_ok=True)
+    return [
+        export_table(store, table, os.path.join(output_dir, f"{table}{FORMATS[fmt]}"), fmt, compression, start, end, batch_size)
+        for table in tables
+    ]
+
+def read_table(path):
+    """書き出したファイルを pyarrow.Table として読み込む
+    
+    IPCファイル形式（.arrow）はメモリマップで開くため、非圧縮であれば列のデータはコピーされない。
+    """
+    if path.endswith(FORMATS["stream"]):
+        with pa.OSFile(path, "rb") as source:
+            return pa.ipc.open_stream(source).read_all()
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+def main():
+    parser = argparse.ArgumentParser(description="日次・日中のテーブルをArrow IPC（Feather）形式で書き出すスクリプト")
+    parser.add_argument("--data-dir", default="data", help="生データのディレクトリ（デフォルト: data）")
+    parser.add_argument("--output-dir", default="output/arrow", help="出力先ディレクトリ（デフォルト: output/arrow）")
+    parser.add_argument("--tables", default=",".join(TABLES), help=f"書き出すテーブルをカンマ区切りで指定（デフォルト: {','.join(TABLES)}）")
+    parser.add_argument("--format", choices=list(FORMATS), default="feather",
+                        help="出力形式（feather: IPCファイル形式、stream: IPCストリーム形式、デフォルト: feather）")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default="none", help="圧縮形式（デフォルト: none）")
+    parser.add_argument("--start", default=None, help="期間の開始日（YYYY-MM-DD）")
+    parser.add_argument("--end", default=None, help="期間の終了日（YYYY-MM-DD）")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help=f"1バッチの行数（デフォルト: {DEFAULT_BATCH_SIZE}）")
+    parser.add_argument("--stdout", action="store_true", help="1つのテーブルをIPCストリーム形式で標準出力に書き出す（パイプ用）")
+    args = parser.parse_args()
+    
+    tables = [table.strip() for table in args.tables.split(",") if table.strip()]
+    unknown = [table for table in tables if table not in TABLES]
+    if unknown or not tables:
+        print(f"エラー: 不明なテーブルです: {', '.join(unknown) or args.tables}（{', '.join(TABLES)}）", file=sys.stderr)
+        return
+    if not os.path.isdir(args.data_dir):
+        print(f"エラー: データディレクトリ {args.data_dir} が見つかりません", file=sys.stderr)
+        return
+    
+    if args.stdout:
+        # 標準出力はデータに使うため、メッセージは表示しない
+        if len(tables) != 1:
+            print("エラー: --stdout では --tables に1つのテーブルを指定してください", file=sys.stderr)
+            return
+        store = get_analytics_store(args.data_dir)
+        store.refresh(lambda source, error: print(f"Warning: {source}の読み込み中にエラーが発生しました: {error}", file=sys.stderr))
+        batches = iter_batches(store, tables[0], args.start, args.end, args.batch_size)
+        write_batches(batches, sys.stdout.buffer, SCHEMAS[tables[0]], "stream", args.compression)
+        return
+    
+    print("=== Fitbit Arrow Export ===")
+    results = export_tables(args.data_dir, args.output_dir, tables, args.format, args.compression,
+                            args.start, args.end, args.batch_size)
+    for result in results:
+        print(f"{result['table']}: {result['rows']}行 / {result['bytes'] / 1024 / 1024:.2f}MB"
+              f"（{result['elapsed_seconds']}秒、{result['rows_per_second']}行/秒） -> {result['path']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+取得済みのFitbitの生データを分析用のテーブルに変換するバッチ処理
+
+日ごとのJSONファイル・パック形式のどちらからでも読み込み、--output-dir に次の列指向（Parquet）のテーブルを書き出す。
+
+- daily.parquet: 1日1行の集計（歩数・活動カロリー・睡眠時間・睡眠効率・安静時心拍数など）
+- heart_rate_intraday/date=YYYY-MM-DD/part-0.parquet: 1分ごとの心拍数
+- sleep_stages/date=YYYY-MM-DD/part-0.parquet: 睡眠ステージの区間
+
+日ごとの処理はプロセスプールで並列に実行する。読み込み元の署名を .process_state.json に記録し、
+2回目以降は追加・更新された日だけを処理する。
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from src.data.raw_store import list_daily_sources, load_daily_record
+
+KINDS = ("activity", "sleep", "heart_rate")
+STATE_FILENAME = ".process_state.json"
+REPORT_FILENAME = "process_report.json"
+DAILY_FILENAME = "daily.parquet"
+INTRADAY_TABLES = ("heart_rate_intraday", "sleep_stages")
+
+def summarize_day(date, activity=None, sleep=None, heart_rate=None):
+    """1日分の生データから日次の集計行を作成する
+    
+    Parameters:
+    -----------
+    date : str
+        日付（YYYY-MM-DD）
+    activity, sleep, heart_rate : dict, optional
+        各データのAPIレスポンス
+    
+    Returns:
+    --------
+    dict
+        日次の集計行（データがない項目はNone）
+    """
+    row = {
+        "date": date,
+        "steps": None,
+        "active_calories": None,
+        "sleep_hours": None,
+        "sleep_efficiency": None,
+        "resting_heart_rate": None,
+    }
+    if activity is not None:
+        summary = activity.get("summary", {})
+        row["steps"] = summary.get("steps", 0)
+        row["active_calories"] = summary.get("activityCalories", 0)
+    if sleep is not None:
+        sleep_items = sleep.get("sleep") or []
+        row["sleep_hours"] = sum(item.get("minutesAsleep", 0) for item in sleep_items) / 60
+        if sleep_items:
+            row["sleep_efficiency"] = sum(item.get("efficiency", 0) for item in sleep_items) / len(sleep_items)
+    if heart_rate is not None and heart_rate.get("activities-heart"):
+        row["resting_heart_rate"] = heart_rate["activities-heart"][0].get("value", {}).get("restingHeartRate")
+    return row
+
+def heart_rate_intraday_frame(date, heart_rate):
+    """1分ごとの心拍数のDataFrame（time, heart_rate）を作成する（日中データがない場合は空）"""
+    dataset = (heart_rate or {}).get("activities-heart-intraday", {}).get("dataset", [])
+    if not dataset:
+        return pd.DataFrame({"time": pd.Series(dtype="datetime64[ns]"), "heart_rate": pd.Series(dtype="int16")})
+    df = pd.DataFrame(dataset)
+    return pd.DataFrame({
+        "time": pd.to_datetime(date) + pd.to_timedelta(df["time"]),
+        "heart_rate": df["value"].astype("int16")
+    })
+
+def sleep_stages_frame(sleep):
+    """睡眠ステージの区間のDataFrame（time, sleep_stage, duration_seconds）を作成する"""
+    points = [
+        point
+        for item in (sleep or {}).get("sleep") or []
+        for point in item.get("levels", {}).get("data", [])
+        if "dateTime" in point and "level" in point
+    ]
+    if not points:
+        return pd.DataFrame({
+            "time": pd.Series(dtype="datetime64[ns]"),
+            "sleep_stage": pd.Series(dtype="category"),
+            "duration_seconds": pd.Series(dtype="int32")
+        })
+    df = pd.DataFrame(points)
+    return pd.DataFrame({
+        "time": pd.to_datetime(df["dateTime"], format="%Y-%m-%dT%H:%M:%S.%f", errors="coerce"),
+        "sleep_stage": df["level"].astype("category"),
+        "duration_seconds": df.get("seconds", pd.Series(0, index=df.index)).fillna(0).astype("int32")
+    }).dropna(subset=["time"])
+
+def partition_path(output_dir, table, date):
+    """日付パーティションのParquetファイルのパス"""
+    return os.path.join(output_dir, table, f"date={date}", "part-0.parquet")
+
+def _write_partition(output_dir, table, date, df):
+    """1日分のテーブルを書き込み、書き込んだバイト数を返す（行がない場合は既存のパーティションを削除する）"""
+    path = partition_path(output_dir, table, date)
+    if df.empty:
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+        return 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    df.to_parquet(temp_path, index=False)
+    os.replace(temp_path, path)
+    return os.path.getsize(path)
+
+def process_day(input_dir, output_dir, date):
+    """1日分の生データを読み込んで日中のテーブルを書き込む（プロセスプールで実行する）
+    
+    Returns:
+    --------
+    tuple
+        (日付, 日次の集計行, 書き込んだ行数, 書き込んだバイト数)
+    """
+    records = {kind: load_daily_record(input_dir, kind, date) for kind in KINDS}
+    row = summarize_day(date, records["activity"], records["sleep"], records["heart_rate"])
+    tables = {
+        "heart_rate_intraday": heart_rate_intraday_frame(date, records["heart_rate"]),
+        "sleep_stages": sleep_stages_frame(records["sleep"]),
+    }
+    rows = 1
+    written = 0
+    for table, df in tables.items():
+        written += _write_partition(output_dir, table, date, df)
+        rows += len(df)
+    return date, row, rows, written
+
+def _load_state(path, input_dir):
+    """前回の処理状態を読み込む（入力ディレクトリが異なる場合は空）"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"警告: 処理状態 {path} を読み込めませんでした（すべて処理します）: {str(e)}")
+        return {}
+    if state.get("input_dir") != input_dir:
+        return {}
+    return state.get("days", {})
+
+def _save_json(path, payload):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+def build_daily_frame(rows):
+    """日次の集計行のリストを日付順のDataFrameに変換する"""
+    df = pd.DataFrame(rows, columns=["date", "steps", "active_calories", "sleep_hours", "sleep_efficiency", "resting_heart_rate"])
+    df["date"] = pd.to_datetime(df["date"])
+    df = df.sort_values("date").reset_index(drop=True)
+    for column in ("steps", "active_calories", "resting_heart_rate"):
+        df[column] = df[column].astype("Int32")
+    for column in ("sleep_hours", "sleep_efficiency"):
+        df[column] = df[column].astype("float32")
+    return df
+
+def write_daily_table(output_dir, rows):
+    """日次の集計行をまとめて daily.parquet に書き込み、書き込んだバイト数を返す"""
+    df = build_daily_frame(rows)
+    path = os.path.join(output_dir, DAILY_FILENAME)
+    temp_path = f"{path}.tmp"
+    df.to_parquet(temp_path, index=False)
+    os.replace(temp_path, path)
+    return os.path.getsize(path)
+
+def run(input_dir, output_dir, workers=None, full=False):
+    """生データを分析用のテーブルに変換する
+    
+    Parameters:
+    -----------
+    input_dir : str
+        生データのディレクトリ
+    output_dir : str
+        テーブルの保存先ディレクトリ
+    workers : int, optional
+        並列に処理するプロセス数（未指定の場合はCPU数）
+    full : bool
+        処理状態を無視してすべての日を処理する
+    
+    Returns:
+    --------
+    dict
+        処理結果のレポート
+    """
+    started = time.perf_counter()
+    input_dir = os.path.abspath(input_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    state_path = os.path.join(output_dir, STATE_FILENAME)
+    previous = {} if full else _load_state(state_path, input_dir)
+    
+    # 日付ごとの読み込み元の署名（前回から変わった日だけを処理する）
+    signatures = {}
+    input_bytes = {}
+    for kind in KINDS:
+        for date, (signature, size) in list_daily_sources(input_dir, kind).items():
+            try:
+                datetime.strptime(date, "%Y-%m-%d")
+            except ValueError:
+                continue
+            signatures.setdefault(date, {})[kind] = signature
+            input_bytes[date] = input_bytes.get(date, 0) + size
+    
+    changed = sorted(date for date, sources in signatures.items() if previous.get(date, {}).get("sources") != sources)
+    removed = sorted(set(previous) - set(signatures))
+    
+    days = {date: entry for date, entry in previous.items() if date in signatures}
+    rows_written = 0
+    bytes_written = 0
+    failed = []
+    if changed:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(process_day, input_dir, output_dir, date): date for date in changed}
+            for future in as_completed(futures):
+                date = futures[future]
+                try:
+                    _, row, rows, written = future.result()
+                except Exception as e:
+                    print(f"{date}の処理中にエラーが発生しました: {str(e)}")
+                    failed.append(date)
+                    days.pop(date, None)
+                    continue
+                days[date] = {"sources": signatures[date], "row": row}
+                rows_written += rows
+                bytes_written += written
+    
+    for date in removed:
+        for table in INTRADAY_TABLES:
+            shutil.rmtree(os.path.dirname(partition_path(output_dir, table, date)), ignore_errors=True)
+    
+    if changed or removed or not os.path.exists(os.path.join(output_dir, DAILY_FILENAME)):
+        bytes_written += write_daily_table(output_dir, [entry["row"] for entry in days.values()])
+    _save_json(state_path, {"version": 1, "input_dir": input_dir, "days": days})
+    
+    elapsed = time.perf_counter() - started
+    processed_bytes = sum(input_bytes[date] for date in changed)
+    report = {
+        "input_dir": input_dir,
+        "output_dir": os.path.abspath(output_dir),
+        "days_total": len(signatures),
+        "days_processed": len(changed) - len(failed),
+        "days_skipped": len(signatures) - len(changed),
+        "days_removed": len(removed),
+        "failed": sorted(failed),
+        "rows_written": rows_written,
+        "bytes_read": processed_bytes,
+        "bytes_written": bytes_written,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(rows_written / elapsed, 1) if elapsed else None,
+        "mb_read_per_second": round(processed_bytes / 1024 / 1024 / elapsed, 2) if elapsed else None,
+        "finished_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    _save_json(os.path.join(output_dir, REPORT_FILENAME), report)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="取得済みのFitbitの生データを分析用のテーブルに変換するスクリプト")
+    parser.add_argument("--input-dir", default="data", help="処理するデータのディレクトリ（デフォルト: data）")
+    parser.add_argument("--output-dir", default="output", help="処理結果の保存先ディレクトリ（デフォルト: output）")
+    parser.add_argument("--workers", type=int, default=None, help="並列に処理するプロセス数（デフォルト: CPU数）")
+    parser.add_argument("--full", action="store_true", help="前回の処理状態を無視してすべての日を処理する")
+    args = parser.parse_args()
+    
+    print("=== Fitbit Data Processor ===")
+    if not os.path.isdir(args.input_dir):
+        print(f"エラー: 入力ディレクトリ {args.input_dir} が見つかりません")
+        return
+    
+    report = run(args.input_dir, args.output_dir, args.workers, args.full)
+    
+    print(f"\n{report['days_total']}日分のうち{report['days_processed']}日分を処理しました"
+          f"（変更なし: {report['days_skipped']}日、削除: {report['days_removed']}日）")
+    print(f"書き込み: {report['rows_written']}行 / {report['bytes_written'] / 1024 / 1024:.2f}MB、"
+          f"読み込み: {report['bytes_read'] / 1024 / 1024:.2f}MB")
+    print(f"所要時間: {report['elapsed_seconds']}秒（{report['rows_per_second']}行/秒、{report['mb_read_per_second']}MB/秒）")
+    if report["failed"]:
+        print(f"処理に失敗した日: {', '.join(report['failed'])}")
+    print(f"テーブルは {args.output_dir} に保存されています（レポート: {REPORT_FILENAME}）")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+取得済みのFitbitデータをDataFrameとして読み込むモジュール
+Streamlitアプリとコマンドラインツールの両方から利用する
+"""
+
+import pandas as pd
+import numpy as np
+from datetime import datetime
+
+from src.data.analytics_store import get_analytics_store
+
+class FitbitDataLoader:
+    """Fitbitデータの読み込みを行うクラス
+    
+    読み込み・集計は生データから作成した AnalyticsStore（SQLite）への問い合わせで行う。
+    """
+    
+    def __init__(self, data_dir, days_to_show=None, on_error=None):
+        """
+        初期化
+        
+        Parameters:
+        -----------
+        data_dir : str
+            データディレクトリのパス
+        days_to_show : int, optional
+            日次データとして返す最新の日数（未指定の場合は全期間）
+        on_error : callable, optional
+            生データの読み込みに失敗した場合に (読み込み元, 例外) を受け取る関数
+        """
+        self.data_dir = data_dir
+        self.days_to_show = days_to_show
+        self.on_error = on_error
+        self._store = None
+    
+    @property
+    def store(self):
+        """テーブルを最新の状態にした AnalyticsStore（最初の問い合わせの前に生データとの差分を取り込む）"""
+        if self._store is None:
+            store = get_analytics_store(self.data_dir)
+            if self.on_error is not None:
+                store.refresh(self.on_error)
+            else:
+                store.refresh()
+            self._store = store
+        return self._store
+    
+    def load_activity_data(self):
+        """アクティビティデータをロードしてDataFrameに変換する"""
+        return self.store.load_activity_data(self.days_to_show)
+    
+    def load_sleep_data(self):
+        """睡眠データをロードしてDataFrameに変換する"""
+        return self.store.load_sleep_data(self.days_to_show)
+    
+    def load_heart_rate_data(self):
+        """心拍数データをロードしてDataFrameに変換する"""
+        return self.store.load_heart_rate_data(self.days_to_show)
+    
+    def summary_metrics(self):
+        """最新の days_to_show 日分の平均歩数・平均睡眠時間・平均安静時心拍数を返す"""
+        return self.store.summary_metrics(self.days_to_show)
+    
+    def get_available_dates(self):
+        """心拍数データが存在する日付を新しい順に返す
+        
+        Returns:
+        --------
+        list of datetime
+            利用可能な日付のリスト
+        """
+        return self.store.available_dates('heart_rate')
+    
+    def _resolve_target_date(self, target_date):
+        """日付が指定されていない場合は最新の日付を返す"""
+        if target_date is not None:
+            return target_date
+        dates = self.get_available_dates()
+        if not dates:
+            return None
+        return dates[0].strftime('%Y-%m-%d')
+    
+    @staticmethod
+    def _filter_time_range(df, target_date, start_time, end_time):
+        """時間帯でフィルタリングする"""
+        if df.empty or not (start_time and end_time):
+            return df
+        start_dt = datetime.strptime(f"{target_date} {start_time}", '%Y-%m-%d %H:%M')
+        end_dt = datetime.strptime(f"{target_date} {end_time}", '%Y-%m-%d %H:%M')
+        return df[(df['time'] >= start_dt) & (df['time'] <= end_dt)]
+    
+    @staticmethod
+    def simulate_intraday_heart_rate(target_date, base_hr=70):
+        """安静時心拍数を基準に1日の心拍数変動をシミュレートする
+        
+        Fitbitのエクスポートデータにはintraday情報が含まれない場合が多いため、
+        その場合に使用する。同じ日付に対しては常に同じ結果を返す。
+        
+        Parameters:
+        -----------
+        target_date : str
+            対象日 (YYYY-MM-DD形式)
+        base_hr : int
+            基準となる安静時心拍数
+        
+        Returns:
+        --------
+        pd.DataFrame
+            5分間隔の心拍数データ
+        """
+        date_obj = datetime.strptime(target_date, '%Y-%m-%d')
+        rng = np.random.default_rng(int(date_obj.strftime('%Y%m%d')))
+        
+        time_points = []
+        heart_rates = []
+        for hour in range(24):
+            for minute in range(0, 60, 5):  # 5分間隔でサンプリング
+                # 時間帯による心拍数の変化をシミュレート
+                if 0 <= hour < 6:  # 深夜から早朝（睡眠中）
+                    hr = base_hr - 10 + rng.integers(-5, 5)
+                elif 6 <= hour < 9:  # 朝（起床時）
+                    hr = base_hr + 10 + rng.integers(-8, 15)
+                elif 9 <= hour < 12:  # 午前（活動時）
+                    hr = base_hr + 15 + rng.integers(-5, 10)
+                elif 12 <= hour < 14:  # 昼（食後）
+                    hr = base_hr + 5 + rng.integers(-3, 8)
+                elif 14 <= hour < 18:  # 午後（活動時）
+                    hr = base_hr + 15 + rng.integers(-7, 12)
+                elif 18 <= hour < 21:  # 夕方（食後・活動時）
+                    hr = base_hr + 10 + rng.integers(-5, 10)
+                else:  # 夜（リラックス時）
+                    hr = base_hr + rng.integers(-8, 5)
+                
+                # 特定の時間帯（21:55-22:05）は特徴的なパターンを示す
+                if hour == 21 and minute >= 55:
+                    hr = base_hr + 25 + rng.integers(-3, 3)  # 特定のイベント発生
+                elif hour == 22 and minute < 5:
+                    hr = base_hr + 20 + rng.integers(-5, 5)  # 継続的な変化
+                
+                time_points.append(datetime(date_obj.year, date_obj.month, date_obj.day, hour, minute))
+                heart_rates.append(max(int(hr), 45))  # 心拍数が極端に低くならないように
+        
+        return pd.DataFrame({'time': time_points, 'heart_rate': heart_rates})
+    
+    def load_intraday_heart_rate_data(self, target_date=None, start_time=None, end_time=None):
+        """特定日・特定時間帯の心拍数詳細データをロードする
+        
+        Parameters:
+        -----------
+        target_date : str, optional
+            対象日 (YYYY-MM-DD形式)
+        start_time : str, optional
+            開始時間 (HH:MM形式)
+        end_time : str, optional
+            終了時間 (HH:MM形式)
+        
+        Returns:
+        --------
+        pd.DataFrame
+            時間帯別の心拍数データ
+        """
+        target_date = self._resolve_target_date(target_date)
+        if target_date is None:
+            return pd.DataFrame()
+        
+        try:
+            store = self.store
+            if not store.has_record('heart_rate', target_date):
+                return pd.DataFrame()
+            
+            if store.has_intraday_heart_rate(target_date):
+                # APIから取得したintradayデータがあれば時間帯で絞り込んで読み込む
+                return store.intraday_heart_rate(target_date, start_time, end_time)
+            
+            base_hr = store.resting_heart_rate(target_date) or 70
+            df = self.simulate_intraday_heart_rate(target_date, base_hr)
+            return self._filter_time_range(df, target_date, start_time, end_time)
+        
+        except Exception as e:
+            print(f"Warning: {target_date}の心拍数データの読み込み中にエラーが発生しました: {e}")
+            return pd.DataFrame()
+    
+    def load_sleep_stages_data(self, target_date=None, start_time=None, end_time=None):
+        """特定日・特定時間帯の睡眠ステージデータをロードする
+        
+        Parameters:
+        -----------
+        target_date : str, optional
+            対象日 (YYYY-MM-DD形式)
+        start_time : str, optional
+            開始時間 (HH:MM形式)
+        end_time : str, optional
+            終了時間 (HH:MM形式)
+        
+        Returns:
+        --------
+        pd.DataFrame
+            睡眠ステージデータ（time, sleep_stage, duration_seconds）
+        """
+        target_date = self._resolve_target_date(target_date)
+        if target_date is None:
+            return pd.DataFrame()
+        
+        try:
+            return self.store.sleep_stages(target_date, start_time, end_time)
+        
+        except Exception as e:
+            print(f"Warning: {target_date}の睡眠データの読み込み中にエラーが発生しました: {e}")
+            return pd.DataFrame()
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分単位の履歴データを固定長・メモリマップの配列として保存するモジュール
+
+心拍数・SpO2・睡眠ステージをそれぞれ1つのファイルに保存する。ファイルでは基準時刻（origin）からの
+経過分数を添字として、1分に1要素を割り当てる。データのない分は欠損値
+（心拍数・SpO2はNaN、睡眠ステージは-1）のままにする。
+任意の時間帯は添字の計算だけで求まり、np.memmap のスライス（コピーなし）として返す。
+
+<store-dir>/
+    meta.json          基準時刻・要素数・取り込み済みの生データの署名と書き込んだ範囲
+    heart_rate.f32     float32（bpm）
+    spo2.f32           float32（%）
+    sleep_stage.i8     int8（SLEEP_STAGE_CODES の値）
+"""
+
+import os
+import json
+import time
+import math
+import argparse
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from src.data.raw_store import list_daily_sources, load_daily_record
+
+DEFAULT_STORE_DIR = os.path.join("output", "minute_store")
+DEFAULT_ORIGIN = "2010-01-01 00:00"
+META_FILENAME = "meta.json"
+MINUTES_PER_DAY = 24 * 60
+
+# チャンネルごとの (ファイル名, 型, 欠損値)
+CHANNELS = {
+    "heart_rate": ("heart_rate.f32", np.float32, np.nan),
+    "spo2": ("spo2.f32", np.float32, np.nan),
+    "sleep_stage": ("sleep_stage.i8", np.int8, -1),
+}
+
+SLEEP_STAGE_CODES = {
+    "wake": 0,
+    "awake": 0,
+    "light": 1,
+    "deep": 2,
+    "rem": 3,
+    "restless": 4,
+    "asleep": 5,
+}
+
+# 生データの種類と取り込み先のチャンネル
+RAW_KINDS = {
+    "heart_rate": "heart_rate",
+    "spo2": "spo2",
+    "sleep": "sleep_stage",
+}
+
+def _spo2_points(content):
+    """SpO2のAPIレスポンスから (時刻, 値) のリストを返す"""
+    return [(point["minute"], point["value"]) for point in (content or {}).get("minutes", []) if "minute" in point and "value" in point]
+
+def _sleep_segments(content):
+    """睡眠のAPIレスポンスの levels.data から (開始時刻, 分数, ステージのコード) を順に返す"""
+    for sleep_item in (content or {}).get("sleep") or []:
+        for point in sleep_item.get("levels", {}).get("data", []):
+            code = SLEEP_STAGE_CODES.get(point.get("level"))
+            if code is None or "dateTime" not in point:
+                continue
+            try:
+                start = datetime.strptime(point["dateTime"], "%Y-%m-%dT%H:%M:%S.%f")
+            except ValueError:
+                continue
+            yield start, int(math.ceil(point.get("seconds", 0) / 60)), code
+
+class MinuteStore:
+    """基準時刻からの経過分数を添字とするメモリマップの配列ストア"""
+    
+    def __init__(self, root=DEFAULT_STORE_DIR, origin=DEFAULT_ORIGIN):
+        """
+        初期化
+        
+        Parameters:
+        -----------
+        root : str
+            保存先ディレクトリ
+        origin : str
+            基準時刻（YYYY-MM-DD HH:MM、既存のストアでは meta.json の値を使う）
+        """
+        self.root = root
+        self._lock = threading.Lock()
+        self._arrays = {}
+        os.makedirs(root, exist_ok=True)
+        
+        meta_path = os.path.join(root, META_FILENAME)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+            if self.meta.get("version", 1) < 2:
+                # 書き込んだ範囲を記録していない形式のため、生データをすべて取り込み直す
+                self.meta["version"] = 2
+                self.meta["sources"] = {}
+        else:
+            self.meta = {"version": 2, "origin": origin, "minutes": 0, "sources": {}}
+        self.origin = np.datetime64(datetime.strptime(self.meta["origin"], "%Y-%m-%d %H:%M"), "m")
+    
+    @property
+    def minutes(self):
+        """保存されている要素数（分）"""
+        return self.meta["minutes"]
+    
+    def _path(self, channel):
+        return os.path.join(self.root, CHANNELS[channel][0])
+    
+    def _save_meta(self):
+        path = os.path.join(self.root, META_FILENAME)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(temp_path, path)
+    
+    def index(self, timestamp):
+        """時刻（文字列・datetime・datetime64）を基準時刻からの経過分数に変換する"""
+        return int((np.datetime64(timestamp, "m") - self.origin).astype(np.int64))
+    
+    def timestamp(self, index):
+        """経過分数を時刻（datetime64[m]）に変換する"""
+        return self.origin + np.timedelta64(int(index), "m")
+    
+    def array(self, channel):
+        """チャンネル全体のメモリマップ（読み取り専用）を返す"""
+        with self._lock:
+            array = self._arrays.get(channel)
+            if array is None or len(array) != self.minutes:
+                _, dtype, _ = CHANNELS[channel]
+                if self.minutes == 0 or not os.path.exists(self._path(channel)):
+                    array = np.full(self.minutes, CHANNELS[channel][2], dtype=dtype)
+                else:
+                    array = np.memmap(self._path(channel), dtype=dtype, mode="r", shape=(self.minutes,))
+                self._arrays[channel] = array
+            return array
+    
+    def _grow(self, minutes):
+        """すべてのチャンネルのファイルを1日単位で拡張し、追加した部分を欠損値で埋める"""
+        minutes = int(math.ceil(minutes / MINUTES_PER_DAY) * MINUTES_PER_DAY)
+        if minutes <= self.minutes:
+            return
+        for channel, (_, dtype, missing) in CHANNELS.items():
+            path = self._path(channel)
+            current = os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0
+            with open(path, "ab") as f:
+                # 1日ずつ書き込み、大きな一時配列を作らない
+                for start in range(current, minutes, MINUTES_PER_DAY):
+                    np.full(min(MINUTES_PER_DAY, minutes - start), missing, dtype=dtype).tofile(f)
+        with self._lock:
+            self._arrays.clear()
+        self.meta["minutes"] = minutes
+        self._save_meta()
+    
+    def write(self, channel, times, values):
+        """時刻と値の組をチャンネルに書き込む
+        
+        Parameters:
+        -----------
+        channel : str
+            チャンネル名（heart_rate, spo2, sleep_stage）
+        times : array-like
+            時刻（分未満は切り捨てる）
+        values : array-like
+            値
+        
+        Returns:
+        --------
+        int
+            書き込んだ要素数
+        """
+        times = np.asarray(times, dtype="datetime64[m]")
+        if len(times) == 0:
+            return 0
+        indexes = (times - self.origin).astype(np.int64)
+        if indexes.min() < 0:
+            raise ValueError(f"基準時刻 {self.meta['origin']} より前のデータは保存できません: {times.min()}")
+        self._grow(int(indexes.max()) + 1)
+        
+        _, dtype, _ = CHANNELS[channel]
+        array = np.memmap(self._path(channel), dtype=dtype, mode="r+", shape=(self.minutes,))
+        array[indexes] = np.asarray(values, dtype=dtype)
+        array.flush()
+        del array
+        return len(indexes)
+    
+    def fill(self, channel, start, minutes, value):
+        """start から minutes 分間を同じ値で埋める（睡眠ステージの区間など）"""
+        index = self.index(start)
+        if index < 0:
+            raise ValueError(f"基準時刻 {self.meta['origin']} より前のデータは保存できません: {start}")
+        if minutes <= 0:
+            return 0
+        self._grow(index + minutes)
+        _, dtype, _ = CHANNELS[channel]
+        array = np.memmap(self._path(channel), dtype=dtype, mode="r+", shape=(self.minutes,))
+        array[index:index + minutes] = value
+        array.flush()
+        del array
+        return minutes
+    
+    def clear(self, channel, start, end):
+        """[start, end) の範囲を欠損値に戻す（日ごとのデータを取り込み直す前に使う）"""
+        self._clear_indexes(channel, self.index(start), self.index(end))
+    
+    def _clear_indexes(self, channel, begin, stop):
+        """添字の範囲 [begin, stop) を欠損値に戻す"""
+        begin = max(0, begin)
+        stop = min(self.minutes, stop)
+        if stop <= begin:
+            return
+        _, dtype, missing = CHANNELS[channel]
+        array = np.memmap(self._path(channel), dtype=dtype, mode="r+", shape=(self.minutes,))
+        array[begin:stop] = missing
+        array.flush()
+        del array
+    
+    def window(self, channel, start, end):
+        """[start, end) の時間帯の配列をコピーせずに返す
+        
+        添字の計算だけで位置が決まるため、保存期間の長さに関係なく一定の時間で返る。
+        保存されている範囲外の部分は切り詰める。
+        
+        Returns:
+        --------
+        np.ndarray
+            メモリマップのスライス（先頭の時刻は max(start, 基準時刻)）
+        """
+        begin = min(max(0, self.index(start)), self.minutes)
+        stop = min(max(begin, self.index(end)), self.minutes)
+        return self.array(channel)[begin:stop]
+    
+    def frame(self, start, end, channels=None):
+        """時間帯のデータをDataFrame（1分ごとのDatetimeIndex）として返す（値はコピーされる）"""
+        import pandas as pd
+        
+        channels = channels or list(CHANNELS)
+        begin = min(max(0, self.index(start)), self.minutes)
+        stop = min(max(begin, self.index(end)), self.minutes)
+        index = pd.date_range(pd.Timestamp(self.timestamp(begin)), periods=stop - begin, freq="min")
+        return pd.DataFrame({channel: self.array(channel)[begin:stop] for channel in channels}, index=index)
+    
+    def ingest_heart_rate(self, date, content):
+        """心拍数のAPIレスポンス（activities-heart-intraday）を取り込む"""
+        dataset = (content or {}).get("activities-heart-intraday", {}).get("dataset", [])
+        points = [(f"{date}T{point['time']}", point["value"]) for point in dataset if "time" in point and "value" in point]
+        if not points:
+            return 0
+        times, values = zip(*points)
+        return self.write("heart_rate", times, values)
+    
+    def ingest_spo2(self, content):
+        """SpO2のAPIレスポンス（/spo2/date/{date}/all.json の minutes）を取り込む"""
+        points = _spo2_points(content)
+        if not points:
+            return 0
+        times, values = zip(*points)
+        return self.write("spo2", times, values)
+    
+    def ingest_sleep(self, content):
+        """睡眠のAPIレスポンス（levels.data の区間）を睡眠ステージとして取り込む"""
+        written = 0
+        for start, minutes, code in _sleep_segments(content):
+            written += self.fill("sleep_stage", start, minutes, code)
+        return written
+    
+    def _record_ranges(self, kind, date, content):
+        """1日分の生データが書き込む添字の範囲 [begin, stop) のリストを返す（隣接する範囲はまとめる）"""
+        if kind == "heart_rate":
+            begin = self.index(date)
+            return [[begin, begin + MINUTES_PER_DAY]]
+        if kind == "spo2":
+            indexes = [self.index(minute) for minute, _ in _spo2_points(content)]
+            return [[min(indexes), max(indexes) + 1]] if indexes else []
+        
+        ranges = []
+        for begin, stop in sorted((self.index(start), self.index(start) + minutes) for start, minutes, _ in _sleep_segments(content)):
+            if stop <= begin:
+                continue
+            if ranges and begin <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], stop)
+            else:
+                ranges.append([begin, stop])
+        return ranges
+    
+    def ingest_raw(self, data_dir, on_error=None):
+        """データディレクトリの生データのうち、追加・更新された日だけを取り込む
+        
+        日ごとに署名と書き込んだ添字の範囲を meta.json に記録し、取り込み直す場合はその範囲だけを
+        欠損値に戻す（睡眠・SpO2は日付をまたぐため、日付から範囲を決めると隣の日のデータを消してしまう）。
+        
+        Returns:
+        --------
+        dict
+            種類ごとの取り込んだ日数
+        """
+        sources = self.meta.setdefault("sources", {})
+        counts = {}
+        for kind, channel in RAW_KINDS.items():
+            ingested = sources.setdefault(kind, {})
+            counts[kind] = 0
+            for date, (signature, _) in sorted(list_daily_sources(data_dir, kind).items()):
+                previous = ingested.get(date) or {}
+                if previous.get("signature") == signature:
+                    continue
+                try:
+                    content = load_daily_record(data_dir, kind, date)
+                    if content is None:
+                        continue
+                    ranges = self._record_ranges(kind, date, content)
+                    for begin, stop in previous.get("ranges", []):
+                        self._clear_indexes(channel, begin, stop)
+                    if kind == "heart_rate":
+                        self._clear_indexes(channel, *ranges[0])
+                        self.ingest_heart_rate(date, content)
+                    elif kind == "spo2":
+                        self.ingest_spo2(content)
+                    else:
+                        self.ingest_sleep(content)
+                except Exception as e:
+                    if on_error is not None:
+                        on_error(f"{kind}_{date}", e)
+                    else:
+                        print(f"Warning: {kind}_{date}の取り込み中にエラーが発生しました: {e}")
+                    continue
+                ingested[date] = {"signature": signature, "ranges": ranges}
+                counts[kind] += 1
+        self._save_meta()
+        return counts
+    
+    def disk_bytes(self):
+        """ファイルの合計サイズ"""
+        return sum(os.path.getsize(self._path(channel)) for channel in CHANNELS if os.path.exists(self._path(channel)))
+
+def main():
+    parser = argparse.ArgumentParser(description="分単位の心拍数・SpO2・睡眠ステージをメモリマップの配列に保存するスクリプト")
+    parser.add_argument("--data-dir", default="data", help="生データのディレクトリ（デフォルト: data）")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR, help=f"保存先ディレクトリ（デフォルト: {DEFAULT_STORE_DIR}）")
+    parser.add_argument("--origin", default=DEFAULT_ORIGIN, help=f"新しく作成する場合の基準時刻（デフォルト: {DEFAULT_ORIGIN}）")
+    parser.add_argument("--start", default=None, help="取り込み後に読み出す時間帯の開始（例: 2025-04-01 06:00）")
+    parser.add_argument("--end", default=None, help="取り込み後に読み出す時間帯の終了（例: 2025-04-01 12:00）")
+    args = parser.parse_args()
+    
+    print("=== Fitbit Minute Store ===")
+    if not os.path.isdir(args.data_dir):
+        print(f"エラー: データディレクトリ {args.data_dir} が見つかりません")
+        return
+    
+    store = MinuteStore(args.store_dir, args.origin)
+    started = time.perf_counter()
+    counts = store.ingest_raw(args.data_dir)
+    elapsed = time.perf_counter() - started
+    print(f"取り込み: {', '.join(f'{kind} {count}日' for kind, count in counts.items())}（{elapsed:.2f}秒）")
+    print(f"基準時刻: {store.meta['origin']}、要素数: {store.minutes}（{store.minutes // MINUTES_PER_DAY}日分）、"
+          f"サイズ: {store.disk_bytes() / 1024 / 1024:.1f}MB")
+    
+    if args.start and args.end:
+        started = time.perf_counter()
+        window = store.window("heart_rate", args.start, args.end)
+        elapsed = (time.perf_counter() - started) * 1000
+        valid = window[~np.isnan(window)]
+        print(f"\n{args.start}〜{args.end}: {len(window)}分（データあり: {len(valid)}分、読み出し: {elapsed:.3f}ms）")
+        if len(valid):
+            print(f"心拍数 平均: {valid.mean():.1f} bpm、最小: {valid.min():.0f} bpm、最大: {valid.max():.0f} bpm")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+取得した生データを月ごとの圧縮セグメントにまとめて保存するモジュール
+
+データの種類ごとに packed/{種類}/{YYYY-MM}.ndjson.gz（zstandardがインストールされていれば .zst）へ
+1日分のレスポンスを1つの圧縮フレームとして追記し、packed/index.ndjson に
+(種類, 日付, セグメント, オフセット, 長さ) を記録する。
+同じ日を再取得した場合は新しいフレームを追記し、インデックスは後の行が優先される。
+1日分だけ読む場合はインデックスのオフセットから該当フレームだけを展開する。
+追記・書き直しは packed/index.ndjson.lock のファイルロックで、取得処理とWebhookなど
+複数のプロセスの間でも排他的に行う。
+"""
+
+import os
+import json
+import glob
+import gzip
+import argparse
+import threading
+from datetime import datetime
+
+from src.utils.file_lock import file_lock
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PACKED_DIRNAME = "packed"
+INDEX_FILENAME = "index.ndjson"
+
+_EXTENSIONS = {"gzip": ".ndjson.gz", "zstd": ".ndjson.zst"}
+
+def _compress(codec, payload):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(payload)
+    return gzip.compress(payload, compresslevel=6)
+
+def _decompress(codec, payload):
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return gzip.decompress(payload)
+
+def _codec_of(segment):
+    return "zstd" if segment.endswith(_EXTENSIONS["zstd"]) else "gzip"
+
+class RawStore:
+    """月ごとの圧縮NDJSONセグメントとインデックスによる生データストア"""
+    
+    def __init__(self, root, codec=None):
+        """
+        初期化
+        
+        Parameters:
+        -----------
+        root : str
+            データディレクトリ（この下の packed/ に保存する）
+        codec : str, optional
+            新しく書き込む際の圧縮形式（gzip または zstd、未指定の場合は利用可能なら zstd）
+        """
+        self.root = os.path.join(root, PACKED_DIRNAME)
+        if codec is None:
+            codec = "zstd" if zstandard is not None else "gzip"
+        if codec == "zstd" and zstandard is None:
+            raise ImportError("zstd形式を使用するには zstandard パッケージをインストールしてください")
+        self.codec = codec
+        self._lock = threading.Lock()
+        self._index = None
+        self._index_stat = None
+    
+    @staticmethod
+    def exists(root):
+        """データディレクトリにパック形式のデータがあるかどうか"""
+        return os.path.exists(os.path.join(root, PACKED_DIRNAME, INDEX_FILENAME))
+    
+    @property
+    def index_path(self):
+        return os.path.join(self.root, INDEX_FILENAME)
+    
+    def _load_index(self):
+        # 他のプロセスが追記・書き直した場合はインデックスファイルが変わるため読み直す
+        try:
+            stat = os.stat(self.index_path)
+            stat = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            stat = None
+        if self._index is not None and stat == self._index_stat:
+            return self._index
+        index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 書き込み途中で中断された行は無視する
+                        continue
+                    index.setdefault(entry["kind"], {})[entry["date"]] = (
+                        entry["segment"], entry["offset"], entry["length"]
+                    )
+        self._index = index
+        self._index_stat = stat
+        return index
+    
+    def put(self, kind, date, data):
+        """1日分のデータを保存する
+        
+        Parameters:
+        -----------
+        kind : str
+            データの種類（activity, sleep, heart_rate など）
+        date : str
+            日付（YYYY-MM-DD）
+        data : dict
+            APIのレスポンス
+        """
+        record = json.dumps({"date": date, "data": data}, ensure_ascii=False, separators=(",", ":"))
+        frame = _compress(self.codec, (record + "\n").encode("utf-8"))
+        segment = f"{kind}/{date[:7]}{_EXTENSIONS[self.codec]}"
+        path = os.path.join(self.root, segment)
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock, file_lock(self.index_path):
+            with open(path, "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(frame)
+            # セグメントへの書き込みが終わってからインデックスに追記する
+            entry = {"kind": kind, "date": date, "segment": segment, "offset": offset, "length": len(frame)}
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            # 他のプロセスの追記も含めて、次に参照するときに読み直す
+            self._index = None
+    
+    def dates(self, kind):
+        """保存されている日付を古い順に返す"""
+        with self._lock:
+            return sorted(self._load_index().get(kind, {}))
+    
+    def locations(self, kind):
+        """日付ごとの (セグメント, オフセット, 長さ) を返す"""
+        with self._lock:
+            return dict(self._load_index().get(kind, {}))
+    
+    def get(self, kind, date):
+        """1日分のデータを返す（存在しない場合はNone）"""
+        with self._lock:
+            location = self._load_index().get(kind, {}).get(date)
+        if location is None:
+            return None
+        segment, offset, length = location
+        with open(os.path.join(self.root, segment), "rb") as f:
+            f.seek(offset)
+            frame = f.read(length)
+        return json.loads(_decompress(_codec_of(segment), frame))["data"]
+    
+    def iter(self, kind):
+        """(日付, データ) を日付順に返す（セグメントごとに1回だけファイルを開く）"""
+        with self._lock:
+            entries = dict(self._load_index().get(kind, {}))
+        
+        by_segment = {}
+        for date, (segment, offset, length) in entries.items():
+            by_segment.setdefault(segment, []).append((date, offset, length))
+        
+        for segment in sorted(by_segment):
+            with open(os.path.join(self.root, segment), "rb") as f:
+                content = f.read()
+            codec = _codec_of(segment)
+            for date, offset, length in sorted(by_segment[segment]):
+                yield date, json.loads(_decompress(codec, content[offset:offset + length]))["data"]
+    
+    def compact(self):
+        """再取得で古くなったフレームを取り除き、セグメントとインデックスを書き直す
+        
+        書き直している間は他のプロセスの追記を待たせる（ファイルロック）。読み込み中の
+        プロセスが古いオフセットを使わないよう、取得処理やWebhookが動いていないときに実行する。
+        
+        Returns:
+        --------
+        int
+            削減したバイト数
+        """
+        with self._lock, file_lock(self.index_path):
+            self._index = None
+            index = self._load_index()
+            before = sum(os.path.getsize(p) for p in glob.glob(os.path.join(self.root, "*", "*")))
+            new_index = {}
+            lines = []
+            for kind in sorted(index):
+                by_segment = {}
+                for date, location in index[kind].items():
+                    by_segment.setdefault(location[0], []).append((date, location))
+                for segment, items in by_segment.items():
+                    path = os.path.join(self.root, segment)
+                    with open(path, "rb") as f:
+                        content = f.read()
+                    temp_path = f"{path}.tmp"
+                    with open(temp_path, "wb") as f:
+                        for date, (_, offset, length) in sorted(items):
+                            new_offset = f.tell()
+                            f.write(content[offset:offset + length])
+                            new_index.setdefault(kind, {})[date] = (segment, new_offset, length)
+                            lines.append({"kind": kind, "date": date, "segment": segment, "offset": new_offset, "length": length})
+                    os.replace(temp_path, path)
+            temp_index = f"{self.index_path}.tmp"
+            with open(temp_index, "w", encoding="utf-8") as f:
+                for entry in lines:
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(temp_index, self.index_path)
+            self._index = None
+            after = sum(os.path.getsize(p) for p in glob.glob(os.path.join(self.root, "*", "*")))
+        return before - after
+
+def _json_files(data_dir, kind):
+    """日ごとのJSONファイルを検索する（raw/daily_json/ を優先し、なければ直下）"""
+    files = glob.glob(os.path.join(data_dir, f"raw/daily_json/{kind}_*.json"))
+    if not files:
+        files = glob.glob(os.path.join(data_dir, f"{kind}_*.json"))
+    return files
+
+def _print_warning(source, error):
+    print(f"Warning: {source}の読み込み中にエラーが発生しました: {error}")
+
+def iter_daily_records(data_dir, kind, on_error=_print_warning):
+    """日ごとのJSONファイルとパック形式の両方から (日付, 内容) を返す
+    
+    同じ日付が両方にある場合はパック形式を優先する。
+    
+    Parameters:
+    -----------
+    data_dir : str
+        データディレクトリ
+    kind : str
+        データの種類（activity, sleep, heart_rate）
+    on_error : callable
+        読み込みに失敗した場合に (読み込み元, 例外) を受け取る関数
+    
+    Yields:
+    -------
+    tuple
+        (datetime, dict)
+    """
+    packed_dates = set()
+    if RawStore.exists(data_dir):
+        try:
+            for date_str, content in RawStore(data_dir, codec="gzip").iter(kind):
+                packed_dates.add(date_str)
+                yield datetime.strptime(date_str, "%Y-%m-%d"), content
+        except Exception as e:
+            on_error(os.path.join(data_dir, PACKED_DIRNAME), e)
+    
+    for file in _json_files(data_dir, kind):
+        date_str = os.path.basename(file).replace(f"{kind}_", "").replace(".json", "")
+        if date_str in packed_dates:
+            continue
+        try:
+            with open(file, "r", encoding="utf-8") as f:
+                content = json.load(f)
+            date = datetime.strptime(date_str, "%Y-%m-%d")
+        except Exception as e:
+            on_error(file, e)
+            continue
+        yield date, content
+
+def list_daily_dates(data_dir, kind):
+    """データが存在する日付（datetime）を新しい順に返す"""
+    dates = set()
+    if RawStore.exists(data_dir):
+        dates.update(RawStore(data_dir, codec="gzip").dates(kind))
+    for file in _json_files(data_dir, kind):
+        dates.add(os.path.basename(file).replace(f"{kind}_", "").replace(".json", ""))
+    
+    result = []
+    for date_str in dates:
+        try:
+            result.append(datetime.strptime(date_str, "%Y-%m-%d"))
+        except ValueError:
+            continue
+    return sorted(result, reverse=True)
+
+def list_daily_sources(data_dir, kind):
+    """日付ごとに変更検出用の署名と読み込むバイト数を返す（パック形式を優先）
+    
+    Parameters:
+    -----------
+    data_dir : str
+        データディレクトリ
+    kind : str
+        データの種類（activity, sleep, heart_rate）
+    
+    Returns:
+    --------
+    dict
+        日付（YYYY-MM-DD）から (署名, バイト数) への辞書
+    """
+    sources = {}
+    for file in _json_files(data_dir, kind):
+        date_str = os.path.basename(file).replace(f"{kind}_", "").replace(".json", "")
+        stat = os.stat(file)
+        sources[date_str] = (f"json:{file}:{stat.st_mtime_ns}:{stat.st_size}", stat.st_size)
+    if RawStore.exists(data_dir):
+        for date_str, (segment, offset, length) in RawStore(data_dir, codec="gzip").locations(kind).items():
+            sources[date_str] = (f"packed:{segment}:{offset}:{length}", length)
+    return sources
+
+def load_daily_record(data_dir, kind, date):
+    """指定日の内容を返す（パック形式を優先し、なければJSONファイル。存在しない場合はNone）"""
+    if RawStore.exists(data_dir):
+        content = RawStore(data_dir, codec="gzip").get(kind, date)
+        if content is not None:
+            return content
+    for path in (os.path.join(data_dir, f"raw/daily_json/{kind}_{date}.json"),
+                 os.path.join(data_dir, f"{kind}_{date}.json")):
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="パック形式の生データ（packed/）の状態を表示・書き直すスクリプト")
+    parser.add_argument("--data-dir", default="data", help="データディレクトリ（デフォルト: data）")
+    parser.add_argument("--compact", action="store_true", help="再取得で古くなったフレームを取り除いて書き直す")
+    args = parser.parse_args()
+    
+    print("=== Fitbit Raw Store ===")
+    if not RawStore.exists(args.data_dir):
+        print(f"エラー: {os.path.join(args.data_dir, PACKED_DIRNAME)} にパック形式のデータがありません")
+        return
+    
+    store = RawStore(args.data_dir, codec="gzip")
+    with store._lock:
+        index = store._load_index()
+    for kind in sorted(index):
+        print(f"{kind}: {len(index[kind])}日")
+    if args.compact:
+        removed = store.compact()
+        print(f"書き直しました（{removed / 1024:.1f}KB削減）")
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,10 @@ import seaborn as sns
 import matplotlib.pyplot as plt
 import os
 import matplotlib.dates as mdates
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+from src.api.fitbit_client import get_default_client
+from src.utils.interpolation import resample_interpolate
 
 # 設定ファイルのパス
 CONFIG_FILE = "fitbit-token.json"
@@ -66,14 +70,15 @@ def is_token_expired(response_data):
 
 def make_api_request(url, headers):
     """APIリクエストを実行する"""
-    response = requests.get(url, headers=headers)
+    client = get_default_client()
+    response = client.get(url, headers=headers)
     data = response.json()
 
     if is_token_expired(data):
         config = load_config()
         if refresh_access_token(config):
             headers = create_auth_header(config["access_token"])
-            response = requests.get(url, headers=headers)
+            response = client.get(url, headers=headers)
         else:
             print("アクセストークンの更新に失敗したため、リクエストを中止します。")
             exit(1)
@@ -94,32 +99,26 @@ def get_latest_csv_in_folder(folder_path, date_str):
     latest_csv = max(csv_files)
     return os.path.join(folder_path, latest_csv)
 
-def process_data(date):
-    date_str = date.strftime("%Y-%m-%d")
-    folder_path = f"Datasets/Day/{date_str}"
-    os.makedirs(folder_path, exist_ok=True)
+# APIパス（ベースURLは環境変数 FITBIT_API_BASE_URL で変更できる）
+HEART_RATE_URL = "/1/user/-/activities/heart/date/{date}/1d.json"
+SPO2_URL = "/1/user/-/spo2/date/{date}/all.json"
+SLEEP_URL = "/1/user/-/sleep/date/{date}.json"
 
-    latest_csv = get_latest_csv_in_folder(folder_path, date_str)
-    if latest_csv:
-        latest_data = pd.read_csv(latest_csv)
-        latest_datetime = pd.to_datetime(latest_data['datetime'].max())
-        if latest_datetime.time() >= pd.to_datetime('23:45').time():
-            print(f"Skipping {date_str} data retrieval. Data already exists after 23:45.")
-            return latest_data
-
-    heart_rate_url = "https://api.fitbit.com/1/user/-/activities/heart/date/{date}/1d.json"
-    spo2_url = "https://api.fitbit.com/1/user/-/spo2/date/{date}/all.json"
-    sleep_url = "https://api.fitbit.com/1/user/-/sleep/date/{date}.json"
+DATASET_DIR = "Datasets/fitbit_dataset"
 
-    response_heart = get_data(heart_rate_url, date_str)
-    response_spo2 = get_data(spo2_url, date_str)
-    response_sleep = get_data(sleep_url, date_str)
+# 補間する欠損の最大の長さ
+MAX_GAP = "15min"
 
-    data_heart = response_heart.json()
-    data_spo2 = response_spo2.json()
-    data_sleep = response_sleep.json()
-    # print(data_sleep)
+def fetch_day(date_str):
+    """心拍数・SpO2・睡眠の3つのエンドポイントを並行して取得する"""
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        heart = executor.submit(get_data, HEART_RATE_URL, date_str)
+        spo2 = executor.submit(get_data, SPO2_URL, date_str)
+        sleep = executor.submit(get_data, SLEEP_URL, date_str)
+        return heart.result().json(), spo2.result().json(), sleep.result().json()
 
+def transform_day(date, data_heart, data_spo2, data_sleep):
+    """1日分のAPIレスポンスを1分間隔のDataFrameに変換する"""
     df_spo2 = pd.DataFrame(data_spo2["minutes"])
     df_sleep = pd.DataFrame([{'dateTime': data['dateTime'], 'value': int(data['value'])} for data in data_sleep['sleep'][0]['minuteData']])
     df_heart = pd.DataFrame(data_heart["activities-heart-intraday"]["dataset"])
@@ -132,45 +131,134 @@ def process_data(date):
     df_sleep = df_sleep[['datetime', 'value']]
     df_heart = df_heart[['datetime', 'value']]
 
+    # 欠損はMAX_GAPまでだけ補間し、装着していない時間などの長い欠損は残す（最後に-1で埋める）
     df_spo2.set_index('datetime', inplace=True)
-    df_spo2 = df_spo2.resample('1min').mean()
-    df_spo2['value'] = df_spo2['value'].interpolate(method='spline', order=2)
+    df_spo2 = resample_interpolate(df_spo2, '1min', method='pchip', max_gap=MAX_GAP)
 
     df_sleep.set_index('datetime', inplace=True)
-    df_sleep = df_sleep.resample('1min').interpolate(method='spline', order=2)
+    df_sleep = resample_interpolate(df_sleep, '1min', method='previous', max_gap=MAX_GAP)
 
     df_heart.set_index('datetime', inplace=True)
-    df_heart = df_heart.resample('1min').mean()
-    df_heart['value'] = df_heart['value'].interpolate(method='spline', order=2)
+    df_heart = resample_interpolate(df_heart, '1min', method='pchip', max_gap=MAX_GAP)
 
     merged_data = pd.concat([df_spo2, df_sleep, df_heart], axis=1)
     merged_data.columns = ['spo2', 'sleep', 'heart_rate']
     merged_data = merged_data.reset_index()
     merged_data = merged_data.fillna(-1)
+    return merged_data
+
+def process_data(date):
+    date_str = date.strftime("%Y-%m-%d")
+    folder_path = f"Datasets/Day/{date_str}"
+    os.makedirs(folder_path, exist_ok=True)
+
+    latest_csv = get_latest_csv_in_folder(folder_path, date_str)
+    if latest_csv:
+        latest_data = pd.read_csv(latest_csv)
+        latest_datetime = pd.to_datetime(latest_data['datetime'].max())
+        if latest_datetime.time() >= pd.to_datetime('23:45').time():
+            print(f"Skipping {date_str} data retrieval. Data already exists after 23:45.")
+            return latest_data
+
+    data_heart, data_spo2, data_sleep = fetch_day(date_str)
+    merged_data = transform_day(date, data_heart, data_spo2, data_sleep)
 
     os.makedirs(folder_path, exist_ok=True)
     merged_data.to_csv(f"{folder_path}/{date_str}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv", index=False)
 
     return merged_data
 
+def partition_path(dataset_dir, date_str):
+    """日付パーティションのParquetファイルのパス"""
+    return os.path.join(dataset_dir, f"date={date_str}", "part-0.parquet")
+
+def is_partition_complete(dataset_dir, date_str):
+    """23:45以降のデータまで保存済みの日はTrue"""
+    path = partition_path(dataset_dir, date_str)
+    if not os.path.exists(path):
+        return False
+    latest = pd.read_parquet(path, columns=['datetime'])['datetime'].max()
+    return pd.notna(latest) and latest.time() >= pd.to_datetime('23:45').time()
+
+def write_partition(date_str, data_heart, data_spo2, data_sleep, dataset_dir=DATASET_DIR):
+    """1日分を変換して日付パーティションに書き込む（プロセスプールで実行する）"""
+    merged_data = transform_day(pd.to_datetime(date_str), data_heart, data_spo2, data_sleep)
+    path = partition_path(dataset_dir, date_str)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    merged_data.to_parquet(temp_path, index=False)
+    os.replace(temp_path, path)
+    return date_str, len(merged_data)
+
+def run_pipeline(start_date, end_date, dataset_dir=DATASET_DIR, fetch_workers=4, processes=None):
+    """複数日のデータを取得・変換し、日付でパーティション分割したParquetデータセットに保存する
+
+    取得（I/O）はスレッドで並行し、リサンプリング・補間などの変換（CPU）はプロセスプールで日ごとに並列に実行する。
+    保存済みで23:45以降のデータまである日は取得しない。
+
+    Parameters:
+    -----------
+    start_date : datetime
+        開始日
+    end_date : datetime
+        終了日
+    dataset_dir : str
+        Parquetデータセットの保存先
+    fetch_workers : int
+        同時に取得する日数
+    processes : int, optional
+        変換に使用するプロセス数（未指定の場合はCPU数）
+
+    Returns:
+    --------
+    dict
+        処理した日数・スキップした日数・失敗した日付
+    """
+    dates = [(start_date + timedelta(days=x)).strftime("%Y-%m-%d") for x in range((end_date - start_date).days + 1)]
+    pending = []
+    for date_str in dates:
+        if is_partition_complete(dataset_dir, date_str):
+            print(f"Skipping {date_str} data retrieval. Data already exists after 23:45.")
+        else:
+            pending.append(date_str)
+
+    written = []
+    failed = []
+    with ProcessPoolExecutor(max_workers=processes) as process_pool, \
+            ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool:
+        fetches = {fetch_pool.submit(fetch_day, date_str): date_str for date_str in pending}
+        transforms = {}
+        for future in as_completed(fetches):
+            date_str = fetches[future]
+            try:
+                data_heart, data_spo2, data_sleep = future.result()
+            except Exception as e:
+                print(f"{date_str}のデータ取得に失敗しました: {e}")
+                failed.append(date_str)
+                continue
+            transforms[process_pool.submit(write_partition, date_str, data_heart, data_spo2, data_sleep, dataset_dir)] = date_str
+
+        for future in as_completed(transforms):
+            date_str = transforms[future]
+            try:
+                _, rows = future.result()
+                print(f"{date_str}: {rows}行を保存しました")
+                written.append(date_str)
+            except Exception as e:
+                print(f"{date_str}のデータ変換に失敗しました: {e}")
+                failed.append(date_str)
+
+    return {"written": sorted(written), "skipped": len(dates) - len(pending), "failed": sorted(failed)}
+
 if __name__ == "__main__":
 
     start_date = datetime(2024, 3, 20)
     end_date = datetime(2024, 3, 23)
-    date_range = [start_date + timedelta(days=x) for x in range((end_date - start_date).days + 1)]
 
-    # merged_data_list = []
+    result = run_pipeline(start_date, end_date)
+    print(f"saved: {len(result['written'])} days, skipped: {result['skipped']} days, failed: {result['failed']}")
 
-    # for date in date_range:
-    #     merged_data = process_data(date)
-    #     if merged_data is not None:
-    #         merged_data_list.append(merged_data)
-
-    # final_merged_data = pd.concat(merged_data_list, ignore_index=True)
-    # final_merged_data.to_csv('Datasets/fitbit_data.csv', index=False)
-
-
-    final_merged_data = pd.read_csv('Datasets/fitbit_data.csv')
+    final_merged_data = pd.read_parquet(DATASET_DIR).sort_values('datetime')
     print(final_merged_data.head())
 
     final_merged_data['datetime'] = final_merged_data['datetime'].astype(str)
@@ -191,7 +279,7 @@ if __name__ == "__main__":
     axes[0].set_title('SpO2')
     axes[0].set_ylabel('SpO2 (%)')
     axes[0].xaxis.set_major_locator(mdates.HourLocator(interval = 10000))
-    
+
     # 睡眠のグラフをプロット
     sns.lineplot(x='datetime', y='sleep', data=final_merged_data, ax=axes[1])
     axes[1].xaxis.set_major_locator(mdates.HourLocator(interval = 10000))
@@ -215,4 +303,4 @@ if __name__ == "__main__":
     print("save.....")
     # グラフを表示
     plt.savefig('output/TOTAL-heart_rate-sleep-spo2.png')
-    print("fin.....")
\ No newline at end of file
+    print("fin.....")
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+データ取得・正規化・可視化を1つのプロセスで実行するパイプライン
+
+各ステージの結果はメモリ上のデータ（APIレスポンス・DataFrame）のまま次のステージに渡し、
+前のステージが書き出したファイルを読み直さない。取得した生データは従来どおりデータディレクトリにも保存する。
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from src.api import fitbit_data_api
+from src.api.fetch_manifest import FetchManifest
+from src.data.raw_store import load_daily_record
+from src.data.fitbit_direct_process import (
+    KINDS, summarize_day, heart_rate_intraday_frame, sleep_stages_frame, build_daily_frame
+)
+from src.utils.data_visualizer import create_visualizations
+
+# 正規化したテーブルの保存先（output_dir からの相対パス）。main.py process が全期間を管理する
+# output/daily.parquet などを、パイプラインの期間だけのテーブルで上書きしないように分ける
+TABLES_SUBDIR = "pipeline"
+
+# データの種類ごとの取得関数
+GETTERS = {
+    "activity": fitbit_data_api.get_activity_data,
+    "sleep": fitbit_data_api.get_sleep_data,
+    "heart_rate": fitbit_data_api.get_heart_rate_data,
+}
+
+class StageTimer:
+    """ステージごとの所要時間を計測する"""
+    
+    def __init__(self):
+        self.timings = []
+    
+    @contextmanager
+    def stage(self, name):
+        print(f"\n[{name}] 開始")
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.timings.append((name, elapsed))
+            print(f"[{name}] {elapsed:.2f}秒")
+    
+    def report(self):
+        """ステージごとの所要時間と割合を表示する"""
+        total = sum(elapsed for _, elapsed in self.timings)
+        print("\n=== ステージごとの所要時間 ===")
+        for name, elapsed in self.timings:
+            share = elapsed / total * 100 if total else 0.0
+            print(f"{name:<10} {elapsed:8.2f}秒 ({share:5.1f}%)")
+        print(f"{'合計':<10} {total:8.2f}秒")
+
+def fetch_records(access_token, date_range, data_dir, workers=4):
+    """APIからデータを並行して取得し、(データの種類, 日付) ごとのレスポンスを返す
+    
+    取得したデータはデータディレクトリにも保存し、マニフェストに記録する。
+    
+    Returns:
+    --------
+    tuple
+        ({(データの種類, 日付): レスポンス}, 取得に失敗した (データの種類, 日付) のリスト)
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    manifest = FetchManifest(data_dir)
+    records = {}
+    failed = []
+    
+    def fetch(kind, date):
+        data = GETTERS[kind](access_token, date)
+        if data is not None:
+            fitbit_data_api.save_daily(data, kind, date, data_dir)
+        return data
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(fetch, kind, date): (kind, date)
+            for date in date_range for kind in KINDS
+        }
+        for future in as_completed(futures):
+            kind, date = futures[future]
+            try:
+                data = future.result()
+            except Exception as e:
+                print(f"{date}の{kind}データの取得中に例外が発生しました: {str(e)}")
+                data = None
+            if data is None:
+                failed.append((kind, date))
+                continue
+            records[(kind, date)] = data
+            manifest.record(kind, date)
+    manifest.save()
+    return records, sorted(failed)
+
+def load_records(date_range, data_dir):
+    """取得済みの生データを (データの種類, 日付) ごとに読み込む（--no-fetch の場合）"""
+    records = {}
+    for date in date_range:
+        for kind in KINDS:
+            data = load_daily_record(data_dir, kind, date)
+            if data is not None:
+                records[(kind, date)] = data
+    return records
+
+def normalize(records):
+    """生データを日次・日中のDataFrameに変換する
+    
+    Returns:
+    --------
+    dict
+        daily（1日1行）・heart_rate_intraday・sleep_stages のDataFrame
+    """
+    dates = sorted({date for _, date in records})
+    rows = []
+    heart_frames = []
+    sleep_frames = []
+    for date in dates:
+        activity = records.get(("activity", date))
+        sleep = records.get(("sleep", date))
+        heart_rate = records.get(("heart_rate", date))
+        rows.append(summarize_day(date, activity, sleep, heart_rate))
+        heart_frames.append(heart_rate_intraday_frame(date, heart_rate))
+        sleep_frames.append(sleep_stages_frame(sleep))
+    
+    return {
+        "daily": build_daily_frame(rows),
+        "heart_rate_intraday": pd.concat(heart_frames, ignore_index=True) if heart_frames else heart_rate_intraday_frame(None, None),
+        "sleep_stages": pd.concat(sleep_frames, ignore_index=True) if sleep_frames else sleep_stages_frame(None),
+    }
+
+def visualize(daily, output_dir):
+    """日次のDataFrameからグラフを作成する（data_visualizer と同じグラフ）"""
+    def column(name):
+        df = daily[["date", name]].dropna().copy()
+        df[name] = df[name].astype(float)
+        return df
+    
+    create_visualizations(column("steps"), column("sleep_hours"), column("resting_heart_rate"), output_dir)
+
+def run_pipeline(date="today", days=7, data_dir="data", output_dir="output", workers=4, fetch=True, save_tables=False):
+    """取得・正規化・可視化を順に実行する
+    
+    Parameters:
+    -----------
+    date : str
+        取得する最後の日付（YYYY-MM-DD または today）
+    days : int
+        取得する日数
+    data_dir : str
+        生データの保存先ディレクトリ
+    output_dir : str
+        可視化結果（と正規化したテーブル）の保存先ディレクトリ
+    workers : int
+        同時に実行するリクエスト数
+    fetch : bool
+        APIから取得するかどうか（Falseの場合はデータディレクトリの生データを使用する）
+    save_tables : bool
+        正規化したテーブルをParquetで保存するかどうか（<output_dir>/pipeline/ に保存する）
+    
+    Returns:
+    --------
+    dict
+        ステージごとの所要時間（秒）と件数
+    """
+    timer = StageTimer()
+    date_range = fitbit_data_api.get_date_range(date, days)
+    failed = []
+    
+    with timer.stage("fetch"):
+        if fetch:
+            access_token = fitbit_data_api.prepare_access_token()
+            if not access_token:
+                return None
+            records, failed = fetch_records(access_token, date_range, data_dir, workers)
+        else:
+            records = load_records(date_range, data_dir)
+        print(f"{len(records)}件のデータ（{date_range[-1]}から{date_range[0]}まで）")
+    
+    with timer.stage("normalize"):
+        frames = normalize(records)
+        print(f"日次: {len(frames['daily'])}行、心拍数: {len(frames['heart_rate_intraday'])}行、"
+              f"睡眠ステージ: {len(frames['sleep_stages'])}行")
+        if save_tables:
+            tables_dir = os.path.join(output_dir, TABLES_SUBDIR)
+            os.makedirs(tables_dir, exist_ok=True)
+            for name, df in frames.items():
+                df.to_parquet(os.path.join(tables_dir, f"{name}.parquet"), index=False)
+            print(f"正規化したテーブルを {tables_dir} に保存しました")
+    
+    with timer.stage("visualize"):
+        visualize(frames["daily"], os.path.join(output_dir, "visualization"))
+    
+    timer.report()
+    if failed:
+        print(f"取得に失敗したデータ: {len(failed)}件")
+    
+    result = {name: round(elapsed, 3) for name, elapsed in timer.timings}
+    result.update({"records": len(records), "failed": failed, "daily_rows": len(frames["daily"])})
+    return result
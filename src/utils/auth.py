@@ -36,6 +36,33 @@ class AuthManager:
         if 'max_api_uses' not in st.session_state:
             st.session_state.max_api_uses = max_api_uses
     
+    @staticmethod
+    def get_client_id():
+        """プロセス全体のレート制限で使用するユーザー識別子を取得する
+        
+        新しいタブや利用回数のリセットで制限を回避できないよう、可能であれば
+        接続元のIPアドレスを使用し、取得できない場合はセッションIDを使用する。
+        
+        Returns:
+        --------
+        str
+            ユーザー識別子
+        """
+        try:
+            from streamlit.runtime import get_instance
+            from streamlit.runtime.scriptrunner import get_script_run_ctx
+            
+            ctx = get_script_run_ctx()
+            if ctx is None:
+                return "local"
+            client = get_instance().get_client(ctx.session_id)
+            remote_ip = getattr(getattr(client, "request", None), "remote_ip", None)
+            if remote_ip:
+                return f"ip:{remote_ip}"
+            return f"session:{ctx.session_id}"
+        except Exception:
+            return "local"
+    
     def is_authenticated(self):
         """認証済みかどうかを確認する"""
         return st.session_state.authenticated
@@ -9,12 +9,15 @@ Plotlyを使用して過去30日分のデータをグラフ化する
 import os
 import json
 import glob
+import time
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
 import argparse
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 def load_activity_data(data_dir):
     """アクティビティデータをロードしてDataFrameに変換する"""
@@ -25,7 +28,7 @@ def load_activity_data(data_dir):
         try:
             with open(file, 'r', encoding='utf-8') as f:
                 content = json.load(f)
-                
+            
             # ファイル名から日付を抽出
             date_str = os.path.basename(file).replace('activity_', '').replace('.json', '')
             date = datetime.strptime(date_str, '%Y-%m-%d')
@@ -120,104 +123,97 @@ def load_heart_rate_data(data_dir):
     
     return df
 
-def create_visualizations(activity_df, sleep_df, heart_rate_df, output_dir):
-    """データを可視化してグラフを保存する"""
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # 日付を文字列に変換（グラフ表示用）
-    if not activity_df.empty:
-        activity_df['date_str'] = activity_df['date'].dt.strftime('%Y-%m-%d')
-    if not sleep_df.empty:
-        sleep_df['date_str'] = sleep_df['date'].dt.strftime('%Y-%m-%d')
-    if not heart_rate_df.empty:
-        heart_rate_df['date_str'] = heart_rate_df['date'].dt.strftime('%Y-%m-%d')
-    
-    # 1. 歩数の可視化
-    if not activity_df.empty:
-        fig_steps = px.bar(
-            activity_df, 
-            x='date_str', 
-            y='steps',
-            title='過去30日間の歩数',
-            labels={'date_str': '日付', 'steps': '歩数'},
-            color='steps',
-            color_continuous_scale='Viridis'
-        )
-        fig_steps.update_layout(
-            xaxis_title='日付',
-            yaxis_title='歩数',
-            xaxis={'categoryorder': 'category ascending'},
-            yaxis={'rangemode': 'tozero'}
-        )
-        # 目標歩数（10,000歩）の線を追加
-        fig_steps.add_shape(type="line",
-            xref="paper", yref="y",
-            x0=0, y0=10000, x1=1, y1=10000,
-            line=dict(color="red", width=2, dash="dash")
-        )
-        fig_steps.add_annotation(
-            x=0.5, y=10000,
-            xref="paper", yref="y",
-            text="目標: 10,000歩",
-            showarrow=False,
-            yshift=10,
-            font=dict(color="red")
-        )
-        fig_steps.write_html(os.path.join(output_dir, 'daily_steps.html'))
-    
-    # 2. 睡眠時間の可視化
-    if not sleep_df.empty:
-        fig_sleep = px.bar(
-            sleep_df, 
-            x='date_str', 
-            y='sleep_hours',
-            title='過去30日間の睡眠時間',
-            labels={'date_str': '日付', 'sleep_hours': '睡眠時間 (時間)'},
-            color='sleep_hours',
-            color_continuous_scale='Turbo'
-        )
-        fig_sleep.update_layout(
-            xaxis_title='日付',
-            yaxis_title='睡眠時間 (時間)',
-            xaxis={'categoryorder': 'category ascending'},
-            yaxis={'rangemode': 'tozero'}
-        )
-        # 推奨睡眠時間（7-9時間）のゾーンを追加
-        fig_sleep.add_shape(type="rect",
-            xref="paper", yref="y",
-            x0=0, y0=7, x1=1, y1=9,
-            fillcolor="rgba(0,255,0,0.2)",
-            line_width=0
-        )
-        fig_sleep.add_annotation(
-            x=0.5, y=8,
-            xref="paper", yref="y",
-            text="推奨睡眠時間: 7-9時間",
-            showarrow=False,
-            font=dict(color="green")
-        )
-        fig_sleep.write_html(os.path.join(output_dir, 'daily_sleep.html'))
-    
-    # 3. 安静時心拍数の可視化
-    if not heart_rate_df.empty:
-        fig_hr = px.line(
-            heart_rate_df, 
-            x='date_str', 
-            y='resting_heart_rate',
-            title='過去30日間の安静時心拍数',
-            labels={'date_str': '日付', 'resting_heart_rate': '安静時心拍数 (bpm)'},
-            markers=True
-        )
-        fig_hr.update_layout(
-            xaxis_title='日付',
-            yaxis_title='安静時心拍数 (bpm)',
-            xaxis={'categoryorder': 'category ascending'},
-            yaxis={'rangemode': 'tozero'}
-        )
-        fig_hr.write_html(os.path.join(output_dir, 'daily_heart_rate.html'))
-    
-    # 4. 総合ダッシュボード
-    # 3つのグラフを組み合わせた総合グラフを作成
+# プロットの書き出しに使用する plotly.js のファイル名（出力ディレクトリに1つだけ置き、各HTMLから参照する）
+# plotly を更新した後に古い plotly.js を参照しないよう、ファイル名にバージョンを含める
+PLOTLYJS_FILENAME = "plotly-{version}.min.js"
+REPORT_FILENAME = "fitbit_report.html"
+
+def _steps_figure(activity_df):
+    """歩数の推移"""
+    fig_steps = px.bar(
+        activity_df,
+        x='date_str',
+        y='steps',
+        title='過去30日間の歩数',
+        labels={'date_str': '日付', 'steps': '歩数'},
+        color='steps',
+        color_continuous_scale='Viridis'
+    )
+    fig_steps.update_layout(
+        xaxis_title='日付',
+        yaxis_title='歩数',
+        xaxis={'categoryorder': 'category ascending'},
+        yaxis={'rangemode': 'tozero'}
+    )
+    # 目標歩数（10,000歩）の線を追加
+    fig_steps.add_shape(type="line",
+        xref="paper", yref="y",
+        x0=0, y0=10000, x1=1, y1=10000,
+        line=dict(color="red", width=2, dash="dash")
+    )
+    fig_steps.add_annotation(
+        x=0.5, y=10000,
+        xref="paper", yref="y",
+        text="目標: 10,000歩",
+        showarrow=False,
+        yshift=10,
+        font=dict(color="red")
+    )
+    return fig_steps
+
+def _sleep_figure(sleep_df):
+    """睡眠時間の推移"""
+    fig_sleep = px.bar(
+        sleep_df,
+        x='date_str',
+        y='sleep_hours',
+        title='過去30日間の睡眠時間',
+        labels={'date_str': '日付', 'sleep_hours': '睡眠時間 (時間)'},
+        color='sleep_hours',
+        color_continuous_scale='Turbo'
+    )
+    fig_sleep.update_layout(
+        xaxis_title='日付',
+        yaxis_title='睡眠時間 (時間)',
+        xaxis={'categoryorder': 'category ascending'},
+        yaxis={'rangemode': 'tozero'}
+    )
+    # 推奨睡眠時間（7-9時間）のゾーンを追加
+    fig_sleep.add_shape(type="rect",
+        xref="paper", yref="y",
+        x0=0, y0=7, x1=1, y1=9,
+        fillcolor="rgba(0,255,0,0.2)",
+        line_width=0
+    )
+    fig_sleep.add_annotation(
+        x=0.5, y=8,
+        xref="paper", yref="y",
+        text="推奨睡眠時間: 7-9時間",
+        showarrow=False,
+        font=dict(color="green")
+    )
+    return fig_sleep
+
+def _heart_rate_figure(heart_rate_df):
+    """安静時心拍数の推移"""
+    fig_hr = px.line(
+        heart_rate_df,
+        x='date_str',
+        y='resting_heart_rate',
+        title='過去30日間の安静時心拍数',
+        labels={'date_str': '日付', 'resting_heart_rate': '安静時心拍数 (bpm)'},
+        markers=True
+    )
+    fig_hr.update_layout(
+        xaxis_title='日付',
+        yaxis_title='安静時心拍数 (bpm)',
+        xaxis={'categoryorder': 'category ascending'},
+        yaxis={'rangemode': 'tozero'}
+    )
+    return fig_hr
+
+def _dashboard_figure(activity_df, sleep_df, heart_rate_df):
+    """3つのグラフを組み合わせた総合グラフ"""
     fig_combined = make_subplots(
         rows=3, cols=1,
         subplot_titles=('歩数', '睡眠時間 (時間)', '安静時心拍数 (bpm)'),
@@ -228,7 +224,7 @@ def create_visualizations(activity_df, sleep_df, heart_rate_df, output_dir):
     if not activity_df.empty:
         fig_combined.add_trace(
             go.Bar(
-                x=activity_df['date_str'], 
+                x=activity_df['date_str'],
                 y=activity_df['steps'],
                 name='歩数',
                 marker_color='purple'
@@ -238,7 +234,7 @@ def create_visualizations(activity_df, sleep_df, heart_rate_df, output_dir):
         # 目標歩数（10,000歩）の線を追加
         fig_combined.add_shape(type="line",
             xref="x", yref="y",
-            x0=activity_df['date_str'].iloc[0], y0=10000, 
+            x0=activity_df['date_str'].iloc[0], y0=10000,
             x1=activity_df['date_str'].iloc[-1], y1=10000,
             line=dict(color="red", width=2, dash="dash"),
             row=1, col=1
@@ -248,7 +244,7 @@ def create_visualizations(activity_df, sleep_df, heart_rate_df, output_dir):
     if not sleep_df.empty:
         fig_combined.add_trace(
             go.Bar(
-                x=sleep_df['date_str'], 
+                x=sleep_df['date_str'],
                 y=sleep_df['sleep_hours'],
                 name='睡眠時間',
                 marker_color='blue'
@@ -258,7 +254,7 @@ def create_visualizations(activity_df, sleep_df, heart_rate_df, output_dir):
         # 推奨睡眠時間（7-9時間）のゾーンを追加
         fig_combined.add_shape(type="rect",
             xref="x2", yref="y2",
-            x0=sleep_df['date_str'].iloc[0], y0=7, 
+            x0=sleep_df['date_str'].iloc[0], y0=7,
             x1=sleep_df['date_str'].iloc[-1], y1=9,
             fillcolor="rgba(0,255,0,0.2)",
             line_width=0,
@@ -269,7 +265,7 @@ def create_visualizations(activity_df, sleep_df, heart_rate_df, output_dir):
     if not heart_rate_df.empty:
         fig_combined.add_trace(
             go.Scatter(
-                x=heart_rate_df['date_str'], 
+                x=heart_rate_df['date_str'],
                 y=heart_rate_df['resting_heart_rate'],
                 name='安静時心拍数',
                 mode='lines+markers',
@@ -292,52 +288,180 @@ def create_visualizations(activity_df, sleep_df, heart_rate_df, output_dir):
     fig_combined.update_yaxes(title_text='歩数', row=1, col=1)
     fig_combined.update_yaxes(title_text='睡眠時間 (時間)', row=2, col=1)
     fig_combined.update_yaxes(title_text='心拍数 (bpm)', row=3, col=1)
+    return fig_combined
+
+def _correlation_figure(activity_df, sleep_df):
+    """睡眠時間と次の日の歩数の相関（対応する日がない場合はNone）"""
+    # 他のグラフと並行して作成するため、元のDataFrameは変更しない
+    sleep_df = sleep_df.assign(next_day=sleep_df['date'] + pd.Timedelta(days=1))
+    merged_df = pd.merge(
+        sleep_df,
+        activity_df,
+        left_on='next_day',
+        right_on='date',
+        suffixes=('_sleep', '_steps')
+    )
+    if merged_df.empty:
+        return None
+    
+    fig_corr = px.scatter(
+        merged_df,
+        x='sleep_hours',
+        y='steps',
+        title='睡眠時間と翌日の歩数の関係',
+        labels={
+            'sleep_hours': '睡眠時間 (時間)',
+            'steps': '翌日の歩数'
+        },
+        trendline='ols',
+        trendline_color_override='red'
+    )
+    
+    fig_corr.update_layout(
+        xaxis_title='睡眠時間 (時間)',
+        yaxis_title='翌日の歩数',
+        xaxis={'rangemode': 'tozero'},
+        yaxis={'rangemode': 'tozero'}
+    )
+    return fig_corr
+
+def _plotlyjs_filename():
+    """同梱の plotly.js のバージョンを含むファイル名"""
+    return PLOTLYJS_FILENAME.format(version=get_plotlyjs_version())
+
+def _write_plotlyjs(output_dir):
+    """plotly.js を出力ディレクトリに1つだけ書き出す（同じバージョンのものが既にあれば何もしない）
     
-    # 総合グラフを保存
-    fig_combined.write_html(os.path.join(output_dir, 'fitbit_dashboard.html'))
+    Returns:
+    --------
+    str
+        ファイル名
+    """
+    filename = _plotlyjs_filename()
+    path = os.path.join(output_dir, filename)
+    if os.path.exists(path):
+        return filename
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(get_plotlyjs())
+    os.replace(temp_path, path)
+    return filename
+
+def _write_report(figures, output_dir, include_plotlyjs):
+    """すべてのグラフを1ページにまとめたHTMLを書き出す（plotly.js の読み込みは1回だけ）"""
+    if include_plotlyjs == 'directory':
+        script = f'<script src="{_plotlyjs_filename()}" charset="utf-8"></script>'
+    elif include_plotlyjs == 'cdn':
+        # plotly-latest.min.js は plotly.js 1.x で更新が止まっているため、同梱版と同じバージョンを指定する
+        script = f'<script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js" charset="utf-8"></script>'
+    else:
+        script = f'<script type="text/javascript">{get_plotlyjs()}</script>'
+    sections = "\n".join(
+        f'<section id="{name}">{fig.to_html(full_html=False, include_plotlyjs=False)}</section>'
+        for name, fig in figures
+    )
+    html = (
+        '<!DOCTYPE html>\n<html lang="ja">\n<head>\n<meta charset="utf-8">\n'
+        f'<title>Fitbit データレポート</title>\n{script}\n</head>\n<body>\n{sections}\n</body>\n</html>\n'
+    )
+    path = os.path.join(output_dir, REPORT_FILENAME)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(html)
+    return path
+
+def figure_builders(activity_df, sleep_df, heart_rate_df):
+    """作成するグラフの一覧を返す（データがないグラフは含めない）
     
-    # 5. 相関分析グラフ
-    # 睡眠時間と次の日の歩数の相関
+    Returns:
+    --------
+    list
+        (グラフ名, グラフを作成する関数) のリスト。相関グラフの関数は対応する日がない場合にNoneを返す
+    """
+    # 日付を文字列に変換（グラフ表示用）
+    if not activity_df.empty:
+        activity_df['date_str'] = activity_df['date'].dt.strftime('%Y-%m-%d')
+    if not sleep_df.empty:
+        sleep_df['date_str'] = sleep_df['date'].dt.strftime('%Y-%m-%d')
+    if not heart_rate_df.empty:
+        heart_rate_df['date_str'] = heart_rate_df['date'].dt.strftime('%Y-%m-%d')
+    
+    builders = []
+    if not activity_df.empty:
+        builders.append(('daily_steps', lambda: _steps_figure(activity_df)))
+    if not sleep_df.empty:
+        builders.append(('daily_sleep', lambda: _sleep_figure(sleep_df)))
+    if not heart_rate_df.empty:
+        builders.append(('daily_heart_rate', lambda: _heart_rate_figure(heart_rate_df)))
+    builders.append(('fitbit_dashboard', lambda: _dashboard_figure(activity_df, sleep_df, heart_rate_df)))
     if not sleep_df.empty and not activity_df.empty:
-        # データフレームをマージ
-        sleep_df['next_day'] = sleep_df['date'] + pd.Timedelta(days=1)
-        merged_df = pd.merge(
-            sleep_df, 
-            activity_df,
-            left_on='next_day',
-            right_on='date',
-            suffixes=('_sleep', '_steps')
-        )
-        
-        if not merged_df.empty:
-            fig_corr = px.scatter(
-                merged_df, 
-                x='sleep_hours', 
-                y='steps',
-                title='睡眠時間と翌日の歩数の関係',
-                labels={
-                    'sleep_hours': '睡眠時間 (時間)', 
-                    'steps': '翌日の歩数'
-                },
-                trendline='ols',
-                trendline_color_override='red'
-            )
-            
-            fig_corr.update_layout(
-                xaxis_title='睡眠時間 (時間)',
-                yaxis_title='翌日の歩数',
-                xaxis={'rangemode': 'tozero'},
-                yaxis={'rangemode': 'tozero'}
-            )
-            
-            fig_corr.write_html(os.path.join(output_dir, 'sleep_steps_correlation.html'))
+        builders.append(('sleep_steps_correlation', lambda: _correlation_figure(activity_df, sleep_df)))
+    return builders
+
+def create_visualizations(activity_df, sleep_df, heart_rate_df, output_dir, workers=4, include_plotlyjs='directory', report=False):
+    """データを可視化してグラフを保存する
+    
+    グラフの作成とHTMLの書き出しはスレッドで並行して行う。
+    include_plotlyjs='directory' の場合は plotly.js（約3.5MB）を出力ディレクトリに1つだけ置き、
+    各HTMLはそれを参照する（HTMLごとに埋め込まない）。
+    
+    Parameters:
+    -----------
+    activity_df, sleep_df, heart_rate_df : pd.DataFrame
+        日次のデータ
+    output_dir : str
+        グラフの保存先ディレクトリ
+    workers : int
+        並行して作成するグラフの数
+    include_plotlyjs : str
+        plotly.js の読み込み方法（directory: 共有ファイル、cdn: CDN、inline: 各HTMLに埋め込み）
+    report : bool
+        すべてのグラフを1ページにまとめた fitbit_report.html も書き出すかどうか
+    
+    Returns:
+    --------
+    dict
+        書き出したファイル数・合計サイズ（バイト）・所要時間（秒）
+    """
+    started = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    builders = figure_builders(activity_df, sleep_df, heart_rate_df)
+    
+    if include_plotlyjs == 'directory':
+        plotlyjs = _write_plotlyjs(output_dir)
+    else:
+        plotlyjs = 'cdn' if include_plotlyjs == 'cdn' else True
+    
+    def build_and_write(name, build):
+        fig = build()
+        if fig is not None:
+            fig.write_html(os.path.join(output_dir, f"{name}.html"), include_plotlyjs=plotlyjs)
+        return fig
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [(name, executor.submit(build_and_write, name, build)) for name, build in builders]
+        figures = [(name, future.result()) for name, future in futures]
+    figures = [(name, fig) for name, fig in figures if fig is not None]
+    
+    written = [os.path.join(output_dir, f"{name}.html") for name, _ in figures]
+    if report:
+        written.append(_write_report(figures, output_dir, include_plotlyjs))
+    if include_plotlyjs == 'directory':
+        written.append(os.path.join(output_dir, plotlyjs))
     
-    print(f"可視化が完了しました。グラフは {output_dir} ディレクトリに保存されています。")
+    total_bytes = sum(os.path.getsize(path) for path in written)
+    elapsed = time.perf_counter() - started
+    print(f"可視化が完了しました。グラフは {output_dir} ディレクトリに保存されています。"
+          f"（{len(written)}ファイル, {total_bytes / 1024 / 1024:.1f}MB, {elapsed:.2f}秒）")
+    return {"files": len(written), "bytes": total_bytes, "elapsed_seconds": round(elapsed, 3)}
 
 def main():
     parser = argparse.ArgumentParser(description="Fitbitデータを可視化するスクリプト")
     parser.add_argument("--input-dir", default="data", help="入力データのディレクトリ（デフォルト: data）")
     parser.add_argument("--output-dir", default="output/visualization", help="出力グラフの保存先ディレクトリ（デフォルト: output/visualization）")
+    parser.add_argument("--workers", type=int, default=4, help="並行して作成するグラフの数（デフォルト: 4）")
+    parser.add_argument("--plotlyjs", choices=["directory", "cdn", "inline"], default="directory",
+                        help="plotly.jsの読み込み方法（directory: 出力ディレクトリに1つだけ置いて共有、cdn: CDN、inline: 各HTMLに埋め込み、デフォルト: directory）")
+    parser.add_argument("--report", action="store_true", help="すべてのグラフを1ページにまとめた fitbit_report.html も出力する")
     args = parser.parse_args()
     
     print("=== Fitbit Data Visualizer ===")
@@ -357,7 +481,7 @@ def main():
     
     # 可視化を作成
     print("\nデータの可視化を行っています...")
-    create_visualizations(activity_df, sleep_df, heart_rate_df, args.output_dir)
+    create_visualizations(activity_df, sleep_df, heart_rate_df, args.output_dir, args.workers, args.plotlyjs, args.report)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+等間隔にリサンプリングした時系列データの欠損を補間するモジュール
+
+- linear: 前後の観測値を結ぶ線形補間（NumPyのみで全列をまとめて計算）
+- pchip: 区分的3次エルミート補間（オーバーシュートしない滑らかな補間）
+- previous: 直前の観測値で埋める（睡眠ステージのような状態の系列向け）
+
+スプライン補間と違い系列全体を1つの式で当てはめないため、長い系列でも高速で、
+max_gap より長い欠損（装着していない時間など）は補間せず欠損のまま残す。
+系列の先頭・末尾の欠損も外挿せずに残す。
+"""
+
+import numpy as np
+import pandas as pd
+
+METHODS = ("linear", "pchip", "previous")
+
+def _neighbors(isnan):
+    """各位置について直前・直後の観測値のインデックスを返す（2次元配列は列ごと）"""
+    n = isnan.shape[0]
+    positions = np.arange(n).reshape((n,) + (1,) * (isnan.ndim - 1))
+    prev_valid = np.maximum.accumulate(np.where(~isnan, positions, -1), axis=0)
+    next_valid = np.flip(np.minimum.accumulate(np.flip(np.where(~isnan, positions, n), axis=0), axis=0), axis=0)
+    return prev_valid, next_valid
+
+def fillable_mask(values, max_gap=None):
+    """補間対象の欠損位置を返す
+    
+    Parameters:
+    -----------
+    values : np.ndarray
+        1次元または2次元（行が時刻、列が系列）の配列
+    max_gap : int, optional
+        補間する欠損の最大の長さ（サンプル数）。これより長い欠損は残す
+    
+    Returns:
+    --------
+    np.ndarray
+        補間する位置がTrueの真偽値配列
+    """
+    values = np.asarray(values, dtype=float)
+    isnan = np.isnan(values)
+    prev_valid, next_valid = _neighbors(isnan)
+    n = values.shape[0]
+    # 前後の両方に観測値がある欠損だけを対象にする（外挿しない）
+    mask = isnan & (prev_valid >= 0) & (next_valid < n)
+    if max_gap is not None:
+        mask &= (next_valid - prev_valid - 1) <= max_gap
+    return mask
+
+def interpolate_array(values, method="linear", max_gap=None):
+    """配列の欠損を補間する
+    
+    Parameters:
+    -----------
+    values : array-like
+        1次元または2次元（行が時刻、列が系列）の配列
+    method : str
+        補間方法（linear, pchip, previous）
+    max_gap : int, optional
+        補間する欠損の最大の長さ（サンプル数）
+    
+    Returns:
+    --------
+    np.ndarray
+        補間後の配列（float64のコピー）
+    """
+    if method not in METHODS:
+        raise ValueError(f"未対応の補間方法です: {method}（{', '.join(METHODS)} のいずれかを指定してください）")
+    
+    result = np.array(values, dtype=float, copy=True)
+    if result.size == 0:
+        return result
+    squeeze = result.ndim == 1
+    if squeeze:
+        result = result[:, None]
+    
+    isnan = np.isnan(result)
+    mask = fillable_mask(result, max_gap)
+    if not mask.any():
+        return result[:, 0] if squeeze else result
+    
+    prev_valid, next_valid = _neighbors(isnan)
+    rows, cols = np.nonzero(mask)
+    prev_rows = prev_valid[rows, cols]
+    next_rows = next_valid[rows, cols]
+    
+    if method == "previous":
+        result[rows, cols] = result[prev_rows, cols]
+    elif method == "linear":
+        left = result[prev_rows, cols]
+        right = result[next_rows, cols]
+        weight = (rows - prev_rows) / (next_rows - prev_rows)
+        result[rows, cols] = left + (right - left) * weight
+    else:
+        from scipy.interpolate import PchipInterpolator
+        
+        for col in np.unique(cols):
+            valid = np.flatnonzero(~isnan[:, col])
+            targets = rows[cols == col]
+            if valid.size < 2:
+                continue
+            interpolator = PchipInterpolator(valid, result[valid, col], extrapolate=False)
+            result[targets, col] = interpolator(targets)
+    
+    return result[:, 0] if squeeze else result
+
+def _gap_in_samples(max_gap, index):
+    """'15min' などの時間で指定された最大欠損長をサンプル数に変換する"""
+    if max_gap is None or isinstance(max_gap, (int, np.integer)):
+        return max_gap
+    step = pd.Timedelta(index.freq) if index.freq is not None else index[1] - index[0]
+    return int(pd.Timedelta(max_gap) / step)
+
+def interpolate_frame(df, method="linear", max_gap=None, columns=None):
+    """DataFrameの指定列をまとめて補間する
+    
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        等間隔のインデックスを持つDataFrame
+    method : str
+        補間方法（linear, pchip, previous）
+    max_gap : int or str or pd.Timedelta, optional
+        補間する欠損の最大の長さ（サンプル数、または '15min' などの時間）
+    columns : list, optional
+        補間する列（未指定の場合は数値列すべて）
+    
+    Returns:
+    --------
+    pd.DataFrame
+        補間後のDataFrame
+    """
+    columns = list(columns) if columns is not None else list(df.select_dtypes(include="number").columns)
+    result = df.copy()
+    if not columns or len(df) < 2:
+        return result
+    gap = _gap_in_samples(max_gap, df.index) if isinstance(df.index, pd.DatetimeIndex) else max_gap
+    result[columns] = interpolate_array(df[columns].to_numpy(dtype=float), method, gap)
+    return result
+
+def resample_interpolate(df, rule="1min", method="linear", max_gap=None, columns=None):
+    """時刻インデックスのDataFrameを等間隔に平均でリサンプリングしてから補間する
+    
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        DatetimeIndexを持つDataFrame
+    rule : str
+        リサンプリング間隔
+    method : str
+        補間方法（linear, pchip, previous）
+    max_gap : int or str or pd.Timedelta, optional
+        補間する欠損の最大の長さ
+    columns : list, optional
+        補間する列
+    
+    Returns:
+    --------
+    pd.DataFrame
+        リサンプリング・補間後のDataFrame
+    """
+    resampled = df.resample(rule).mean()
+    return interpolate_frame(resampled, method, max_gap, columns)
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+トークンバケット方式のレート制限を提供するモジュール
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+class TokenBucket:
+    """スレッドセーフなトークンバケット
+    
+    capacity 個までトークンを蓄え、1秒あたり rate 個の割合で補充する。
+    """
+    
+    def __init__(self, rate, capacity):
+        """
+        初期化
+        
+        Parameters:
+        -----------
+        rate : float
+            1秒あたりに補充されるトークン数
+        capacity : float
+            バケットに蓄えられる最大トークン数
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._cond = threading.Condition()
+    
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+    
+    @property
+    def available(self):
+        """現在利用可能なトークン数"""
+        with self._cond:
+            self._refill()
+            return self._tokens
+    
+    def try_acquire(self, amount=1):
+        """待機せずにトークンの取得を試みる
+        
+        Returns:
+        --------
+        bool
+            取得できた場合はTrue
+        """
+        with self._cond:
+            self._refill()
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return True
+            return False
+    
+    def acquire(self, amount=1, timeout=None):
+        """トークンを取得できるまで待機する
+        
+        バケット容量を超える量を要求した場合は容量分が溜まった時点で取得する。
+        
+        Parameters:
+        -----------
+        amount : float
+            取得するトークン数
+        timeout : float, optional
+            最大待機秒数（未指定の場合は無制限）
+        
+        Returns:
+        --------
+        bool
+            取得できた場合はTrue、タイムアウトした場合はFalse
+        """
+        needed = min(amount, self.capacity)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        
+        with self._cond:
+            while True:
+                self._refill()
+                if self._tokens >= needed:
+                    self._tokens -= amount
+                    return True
+                
+                wait = (needed - self._tokens) / self.rate if self.rate > 0 else 1.0
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    wait = min(wait, remaining)
+                self._cond.wait(wait)
+    
+    def adjust(self, amount):
+        """トークン数を増減する（見積もりと実績の差分の精算などに使用）
+        
+        Parameters:
+        -----------
+        amount : float
+            正の値で返却、負の値で追加消費
+        """
+        with self._cond:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + amount)
+            self._cond.notify_all()
+
+class RateLimitExceeded(Exception):
+    """レート制限により処理を実行できなかったことを示す例外"""
+    
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AIRateLimiter:
+    """プロセス全体で共有するAI呼び出しのレート制限
+    
+    ユーザーごとのトークンバケットと全体のトークンバケットの2段階で制限する。
+    全体の枠が空くのを待つリクエストは先着順の待ち行列に並び、
+    待ち行列が一杯の場合や待機がタイムアウトした場合は RateLimitExceeded を送出する。
+    ユーザーごとのバケットは max_users 個を超えると、満杯に戻ったもの（新しく作るのと同じ状態）を
+    最後に使われた時刻が古い順に削除する。
+    """
+    
+    def __init__(self, global_per_minute=30, user_per_minute=3, max_queue=20, max_wait=30.0, max_users=1000):
+        """
+        初期化
+        
+        Parameters:
+        -----------
+        global_per_minute : float
+            プロセス全体で1分あたりに許可する呼び出し数
+        user_per_minute : float
+            1ユーザーあたり1分間に許可する呼び出し数
+        max_queue : int
+            全体の枠を待つリクエストの最大数
+        max_wait : float
+            全体の枠を待つ最大秒数
+        max_users : int
+            保持するユーザーごとのバケット数の目安（超えた場合は満杯のバケットを削除する）
+        """
+        self.global_bucket = TokenBucket(rate=global_per_minute / 60.0, capacity=max(1, global_per_minute / 6.0))
+        self.user_per_minute = user_per_minute
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_users = max_users
+        self._user_buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._queue = []
+        self._next_ticket = 0
+    
+    def _user_bucket(self, user_id):
+        with self._lock:
+            bucket = self._user_buckets.get(user_id)
+            if bucket is None:
+                if len(self._user_buckets) >= self.max_users:
+                    self._evict_idle_buckets()
+                bucket = TokenBucket(rate=self.user_per_minute / 60.0, capacity=max(1, self.user_per_minute))
+                self._user_buckets[user_id] = bucket
+            else:
+                self._user_buckets.move_to_end(user_id)
+            return bucket
+    
+    def _evict_idle_buckets(self):
+        """最後に使われた時刻が古い順に、満杯に戻ったバケットを削除する（self._lock を取得した状態で呼ぶ）
+        
+        満杯のバケットは新しく作るのと同じ状態のため、削除しても制限は緩まない。
+        満杯でないバケットに達した時点で止める（そのバケットも補充周期のうちに満杯に戻る）。
+        """
+        while self._user_buckets:
+            user_id, bucket = next(iter(self._user_buckets.items()))
+            if bucket.available < bucket.capacity:
+                break
+            del self._user_buckets[user_id]
+    
+    @property
+    def user_count(self):
+        """保持しているユーザーごとのバケット数"""
+        with self._lock:
+            return len(self._user_buckets)
+    
+    @property
+    def queue_length(self):
+        """全体の枠を待っているリクエスト数"""
+        with self._lock:
+            return len(self._queue)
+    
+    def acquire(self, user_id):
+        """AI呼び出しの実行枠を取得する
+        
+        Parameters:
+        -----------
+        user_id : str
+            ユーザーを識別する文字列
+        
+        Raises:
+        -------
+        RateLimitExceeded
+            ユーザーごとの上限に達した場合、待ち行列が一杯の場合、待機がタイムアウトした場合
+        """
+        user_bucket = self._user_bucket(user_id)
+        if not user_bucket.try_acquire():
+            retry_after = (1 - user_bucket.available) / user_bucket.rate if user_bucket.rate > 0 else None
+            raise RateLimitExceeded("ユーザーごとのAI分析の利用上限に達しました", retry_after)
+        
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                user_bucket.adjust(1)
+                raise RateLimitExceeded("AI分析の待ち行列が混雑しています", self.max_wait)
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._queue.append(ticket)
+        
+        deadline = time.monotonic() + self.max_wait
+        try:
+            with self._cond:
+                while True:
+                    # 先頭のリクエストだけが全体の枠を取得できる（先着順）
+                    if self._queue[0] == ticket and self.global_bucket.try_acquire():
+                        return
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        user_bucket.adjust(1)
+                        raise RateLimitExceeded("AI分析が混雑しているため待機がタイムアウトしました", self.max_wait)
+                    self._cond.wait(min(remaining, 0.25))
+        finally:
+            with self._cond:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+
+_ai_rate_limiter = None
+_ai_rate_limiter_lock = threading.Lock()
+
+def get_ai_rate_limiter():
+    """プロセス全体で共有する AIRateLimiter を返す
+    
+    設定は環境変数 AI_GLOBAL_PER_MINUTE, AI_USER_PER_MINUTE, AI_MAX_QUEUE, AI_MAX_WAIT, AI_MAX_USERS で変更できる。
+    """
+    global _ai_rate_limiter
+    with _ai_rate_limiter_lock:
+        if _ai_rate_limiter is None:
+            _ai_rate_limiter = AIRateLimiter(
+                global_per_minute=float(os.getenv("AI_GLOBAL_PER_MINUTE", "30")),
+                user_per_minute=float(os.getenv("AI_USER_PER_MINUTE", "3")),
+                max_queue=int(os.getenv("AI_MAX_QUEUE", "20")),
+                max_wait=float(os.getenv("AI_MAX_WAIT", "30")),
+                max_users=int(os.getenv("AI_MAX_USERS", "1000")),
+            )
+        return _ai_rate_limiter
+
+class FitbitRateLimiter:
+    """Fitbit Web APIのユーザーごとの利用枠（デフォルト150リクエスト/時）に合わせたスケジューラー
+    
+    トークンバケットで送信を制御し、レスポンスの fitbit-rate-limit-* ヘッダーを受け取るたびに
+    サーバー側の残り回数に合わせて補正する。残り回数を使い切った場合はリセット時刻まで待機する。
+    """
+    
+    def __init__(self, requests_per_hour=150):
+        """
+        初期化
+        
+        Parameters:
+        -----------
+        requests_per_hour : int
+            1時間あたりに許可されるリクエスト数
+        """
+        self.requests_per_hour = requests_per_hour
+        self.bucket = TokenBucket(rate=requests_per_hour / 3600.0, capacity=requests_per_hour)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._reset_at = None
+        self.limit = None
+        self.remaining = None
+    
+    def _seconds_until_reset(self):
+        with self._lock:
+            if self._reset_at is None:
+                return None
+            return self._reset_at - time.monotonic()
+    
+    def acquire(self):
+        """リクエストの送信枠を取得できるまで待機する"""
+        while True:
+            until_reset = self._seconds_until_reset()
+            if until_reset is not None and until_reset <= 0:
+                # サーバー側の枠がリセットされたのでバケットを満たす
+                with self._lock:
+                    self._reset_at = None
+                self.bucket.adjust(self.bucket.capacity)
+                continue
+            
+            if self.bucket.try_acquire():
+                with self._lock:
+                    self._in_flight += 1
+                return
+            
+            if self.bucket.rate > 0:
+                wait = (1 - self.bucket.available) / self.bucket.rate
+                if until_reset is not None:
+                    wait = min(wait, until_reset)
+            else:
+                wait = until_reset if until_reset is not None else 1.0
+            time.sleep(max(0.05, min(wait, 60.0)))
+    
+    def release(self):
+        """送信したリクエストが完了したことを記録する"""
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+    
+    def observe(self, headers, status_code=None):
+        """レスポンスヘッダーからサーバー側の残り回数とリセットまでの秒数を反映する
+        
+        Parameters:
+        -----------
+        headers : Mapping
+            レスポンスヘッダー
+        status_code : int, optional
+            HTTPステータスコード（429の場合はRetry-Afterも参照する）
+        """
+        try:
+            limit = int(headers.get("fitbit-rate-limit-limit")) if headers.get("fitbit-rate-limit-limit") else None
+            remaining = int(headers.get("fitbit-rate-limit-remaining")) if headers.get("fitbit-rate-limit-remaining") else None
+            reset = float(headers.get("fitbit-rate-limit-reset")) if headers.get("fitbit-rate-limit-reset") else None
+        except (TypeError, ValueError):
+            return
+        
+        if status_code == 429:
+            remaining = 0
+            retry_after = headers.get("retry-after")
+            if retry_after and retry_after.replace(".", "", 1).isdigit():
+                reset = float(retry_after)
+        
+        with self._lock:
+            if limit:
+                self.limit = limit
+            if remaining is not None:
+                self.remaining = remaining
+            if reset is not None:
+                self._reset_at = time.monotonic() + reset
+            in_flight = self._in_flight
+        
+        if limit:
+            self.bucket.capacity = float(limit)
+        if reset is not None:
+            # サーバーの枠は時間窓ごとに一括でリセットされるため、以降は少しずつ補充せず
+            # リセット時刻にまとめて補充する
+            self.bucket.rate = 0.0
+        
+        if remaining is not None:
+            # 送信中のリクエストの分を差し引いた残り回数にバケットを合わせる
+            target = max(0, remaining - in_flight)
+            self.bucket.adjust(target - self.bucket.available)
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ダッシュボードのグラフを静的な画像（PNG/PDF）のレポートとして一括出力するスクリプト
+
+kaleido による画像の書き出しはプロセスごとに Chromium を起動するため、1枚ずつ書き出すと遅い。
+このスクリプトでは起動済み（ウォームアップ済み）の kaleido を持つワーカープロセスのプールに
+期間・ユーザーごとのジョブを振り分け、ジョブごとに画像をまとめたZIPを出力する。
+"""
+
+import os
+import json
+import time
+import zipfile
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import plotly.graph_objects as go
+
+from src.utils.data_visualizer import (
+    load_activity_data, load_sleep_data, load_heart_rate_data, figure_builders
+)
+
+FORMATS = ("png", "pdf")
+METRICS_FILENAME = "render_metrics.json"
+
+# ワーカープロセスごとの状態（ウォームアップの所要時間と読み込み済みのデータ）
+_warmup_seconds = None
+_warmup_reported = False
+_data_cache = {}
+
+def _warm_up(width, height, scale):
+    """ワーカープロセスで kaleido を起動しておく（プロセスプールの initializer）"""
+    global _warmup_seconds
+    started = time.perf_counter()
+    # 最初の書き出しで Chromium が起動し、以降の書き出しでは使い回される
+    go.Figure(go.Scatter(x=[0, 1], y=[0, 1])).to_image(format="png", width=width, height=height, scale=scale, engine="kaleido")
+    _warmup_seconds = time.perf_counter() - started
+
+def _load_frames(input_dir):
+    """入力ディレクトリのデータを読み込む（同じワーカーでは1回だけ読み込む）"""
+    if input_dir not in _data_cache:
+        _data_cache[input_dir] = (
+            load_activity_data(input_dir),
+            load_sleep_data(input_dir),
+            load_heart_rate_data(input_dir),
+        )
+    return _data_cache[input_dir]
+
+def _select(df, start, end):
+    """期間内の行だけを取り出す"""
+    if df.empty:
+        return df.copy()
+    mask = (df['date'] >= start) & (df['date'] <= end)
+    return df[mask].reset_index(drop=True)
+
+def render_job(job, output_dir, formats=FORMATS, width=1200, height=700, scale=1.0):
+    """1つのジョブ（ユーザー・期間）のグラフを画像にしてZIPにまとめる
+    
+    Parameters:
+    -----------
+    job : dict
+        name（出力名）・input_dir・start・end（YYYY-MM-DD）
+    output_dir : str
+        ZIPの保存先ディレクトリ
+    formats : tuple
+        出力する形式（png, pdf）
+    width, height : int
+        画像のサイズ（ピクセル）
+    scale : float
+        画像の拡大率
+    
+    Returns:
+    --------
+    dict
+        ジョブの結果（画像数・サイズ・所要時間など）
+    """
+    global _warmup_reported
+    started = time.perf_counter()
+    start = datetime.strptime(job["start"], "%Y-%m-%d")
+    end = datetime.strptime(job["end"], "%Y-%m-%d")
+    activity_df, sleep_df, heart_rate_df = (_select(df, start, end) for df in _load_frames(job["input_dir"]))
+    
+    images = 0
+    render_seconds = 0.0
+    path = os.path.join(output_dir, f"{job['name']}.zip")
+    temp_path = f"{path}.tmp"
+    with zipfile.ZipFile(temp_path, "w", compression=zipfile.ZIP_DEFLATED) as bundle:
+        for name, build in figure_builders(activity_df, sleep_df, heart_rate_df):
+            fig = build()
+            if fig is None:
+                continue
+            for fmt in formats:
+                render_started = time.perf_counter()
+                content = fig.to_image(format=fmt, width=width, height=height, scale=scale, engine="kaleido")
+                render_seconds += time.perf_counter() - render_started
+                # PNGは圧縮済みのため、そのまま格納する
+                compress_type = zipfile.ZIP_STORED if fmt == "png" else zipfile.ZIP_DEFLATED
+                bundle.writestr(f"{name}.{fmt}", content, compress_type=compress_type)
+                images += 1
+        bundle.writestr("job.json", json.dumps(job, ensure_ascii=False, indent=2))
+    os.replace(temp_path, path)
+    
+    # ウォームアップの所要時間は各ワーカーの最初のジョブでだけ報告する
+    warmup = None
+    if not _warmup_reported:
+        warmup = _warmup_seconds
+        _warmup_reported = True
+    
+    return {
+        "name": job["name"],
+        "path": path,
+        "days": len(activity_df),
+        "images": images,
+        "bytes": os.path.getsize(path),
+        "render_seconds": round(render_seconds, 3),
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        "warmup_seconds": round(warmup, 3) if warmup is not None else None,
+        "pid": os.getpid(),
+    }
+
+def build_jobs(input_dirs, ranges=None, end=None, window_days=30, windows=1):
+    """ユーザー（入力ディレクトリ）と期間の組み合わせからジョブを作成する
+    
+    Parameters:
+    -----------
+    input_dirs : list
+        入力ディレクトリのリスト（ディレクトリ名をユーザー名として使う）
+    ranges : list, optional
+        (開始日, 終了日) のリスト。指定しない場合は end から遡る window_days 日ごとの期間を windows 個作る
+    end : str, optional
+        最後の期間の終了日（YYYY-MM-DD、デフォルト: 今日）
+    window_days : int
+        1つの期間の日数
+    windows : int
+        期間の数
+    
+    Returns:
+    --------
+    list
+        ジョブのリスト
+    """
+    if not ranges:
+        last = datetime.strptime(end, "%Y-%m-%d") if end else datetime.now()
+        ranges = []
+        for i in range(windows):
+            window_end = last - timedelta(days=window_days * i)
+            window_start = window_end - timedelta(days=window_days - 1)
+            ranges.append((window_start.strftime("%Y-%m-%d"), window_end.strftime("%Y-%m-%d")))
+    
+    jobs = []
+    for input_dir in input_dirs:
+        user = os.path.basename(os.path.normpath(input_dir)) or "data"
+        for start, stop in ranges:
+            jobs.append({
+                "name": f"{user}_{start}_{stop}",
+                "input_dir": os.path.abspath(input_dir),
+                "start": start,
+                "end": stop,
+            })
+    return jobs
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(q / 100 * (len(values) - 1)))))
+    return values[index]
+
+def render_reports(jobs, output_dir, workers=None, formats=FORMATS, width=1200, height=700, scale=1.0):
+    """ジョブをウォームアップ済みのワーカープロセスで並列に実行する
+    
+    Parameters:
+    -----------
+    jobs : list
+        build_jobs で作成したジョブのリスト
+    output_dir : str
+        ZIPとメトリクスの保存先ディレクトリ
+    workers : int, optional
+        ワーカープロセス数（未指定の場合はCPU数とジョブ数の小さい方）
+    formats : tuple
+        出力する形式（png, pdf）
+    width, height : int
+        画像のサイズ（ピクセル）
+    scale : float
+        画像の拡大率
+    
+    Returns:
+    --------
+    dict
+        スループットなどのメトリクス
+    """
+    started = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs) or 1))
+    
+    results = []
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_warm_up, initargs=(width, height, scale)) as executor:
+        futures = {
+            executor.submit(render_job, job, output_dir, tuple(formats), width, height, scale): job["name"]
+            for job in jobs
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"{name}の出力中にエラーが発生しました: {str(e)}")
+                failed.append(name)
+                continue
+            print(f"{name}: {result['images']}枚 / {result['elapsed_seconds']}秒")
+            results.append(result)
+    
+    elapsed = time.perf_counter() - started
+    images = sum(result["images"] for result in results)
+    job_seconds = [result["elapsed_seconds"] for result in results]
+    warmups = [result["warmup_seconds"] for result in results if result["warmup_seconds"] is not None]
+    metrics = {
+        "output_dir": os.path.abspath(output_dir),
+        "workers": workers,
+        "formats": list(formats),
+        "jobs": len(jobs),
+        "jobs_rendered": len(results),
+        "failed": sorted(failed),
+        "images": images,
+        "bytes": sum(result["bytes"] for result in results),
+        "elapsed_seconds": round(elapsed, 3),
+        "jobs_per_second": round(len(results) / elapsed, 2) if elapsed else None,
+        "images_per_second": round(images / elapsed, 2) if elapsed else None,
+        "job_seconds_p50": _percentile(job_seconds, 50),
+        "job_seconds_p95": _percentile(job_seconds, 95),
+        "render_seconds": round(sum(result["render_seconds"] for result in results), 3),
+        "warmup_seconds_max": max(warmups) if warmups else None,
+        "results": sorted(results, key=lambda result: result["name"]),
+        "finished_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    
+    path = os.path.join(output_dir, METRICS_FILENAME)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(metrics, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+    return metrics
+
+def _parse_ranges(value):
+    """"開始日:終了日" のカンマ区切りを (開始日, 終了日) のリストに変換する"""
+    ranges = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        start, _, end = item.partition(":")
+        for date in (start, end):
+            datetime.strptime(date, "%Y-%m-%d")
+        ranges.append((start, end))
+    return ranges
+
+def main():
+    parser = argparse.ArgumentParser(description="ダッシュボードのグラフをPNG/PDFのレポートとして一括出力するスクリプト")
+    parser.add_argument("--input-dir", action="append", default=None,
+                        help="入力データのディレクトリ（複数指定でユーザーごとに出力、デフォルト: data）")
+    parser.add_argument("--output-dir", default="output/reports", help="レポートの保存先ディレクトリ（デフォルト: output/reports）")
+    parser.add_argument("--ranges", default=None, help="期間をカンマ区切りで指定（例: 2025-03-01:2025-03-31,2025-04-01:2025-04-30）")
+    parser.add_argument("--end", default=None, help="--ranges未指定時の最後の期間の終了日（デフォルト: 今日）")
+    parser.add_argument("--window-days", type=int, default=30, help="--ranges未指定時の1期間の日数（デフォルト: 30）")
+    parser.add_argument("--windows", type=int, default=1, help="--ranges未指定時の期間の数（デフォルト: 1）")
+    parser.add_argument("--formats", default="png,pdf", help="出力する形式をカンマ区切りで指定（png, pdf、デフォルト: png,pdf）")
+    parser.add_argument("--workers", type=int, default=None, help="ワーカープロセス数（デフォルト: CPU数）")
+    parser.add_argument("--width", type=int, default=1200, help="画像の幅（デフォルト: 1200）")
+    parser.add_argument("--height", type=int, default=700, help="画像の高さ（デフォルト: 700）")
+    parser.add_argument("--scale", type=float, default=1.0, help="画像の拡大率（デフォルト: 1.0）")
+    args = parser.parse_args()
+    
+    print("=== Fitbit Report Renderer ===")
+    formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in FORMATS]
+    if unknown or not formats:
+        print(f"エラー: 対応していない形式です: {', '.join(unknown) or args.formats}（png, pdf のみ）")
+        return
+    
+    try:
+        ranges = _parse_ranges(args.ranges) if args.ranges else None
+    except ValueError:
+        print(f"エラー: 期間の形式が正しくありません: {args.ranges}（YYYY-MM-DD:YYYY-MM-DD）")
+        return
+    
+    input_dirs = args.input_dir or ["data"]
+    missing = [input_dir for input_dir in input_dirs if not os.path.isdir(input_dir)]
+    if missing:
+        print(f"エラー: 入力ディレクトリ {', '.join(missing)} が見つかりません")
+        return
+    
+    jobs = build_jobs(input_dirs, ranges, args.end, args.window_days, args.windows)
+    print(f"{len(jobs)}件のレポートを出力します（形式: {', '.join(formats)}）")
+    metrics = render_reports(jobs, args.output_dir, args.workers, formats, args.width, args.height, args.scale)
+    
+    print(f"\n{metrics['jobs_rendered']}/{metrics['jobs']}件・{metrics['images']}枚を出力しました"
+          f"（{metrics['bytes'] / 1024 / 1024:.2f}MB、ワーカー: {metrics['workers']}）")
+    print(f"所要時間: {metrics['elapsed_seconds']}秒（{metrics['images_per_second']}枚/秒、{metrics['jobs_per_second']}件/秒）")
+    print(f"ジョブの所要時間: p50 {metrics['job_seconds_p50']}秒 / p95 {metrics['job_seconds_p95']}秒、"
+          f"kaleidoの起動: 最大{metrics['warmup_seconds_max']}秒")
+    if metrics["failed"]:
+        print(f"出力に失敗したレポート: {', '.join(metrics['failed'])}")
+    print(f"レポートは {args.output_dir} に保存されています（メトリクス: {METRICS_FILENAME}）")
+
+if __name__ == "__main__":
+    main()